@@ -0,0 +1,128 @@
+# alignment.py
+# Input-output correspondence for faithfulness constraints.
+# Every (input, output) pair is aligned once, with dynamic programming, into the smallest number
+# of deletions and insertions that turns the input into the output. The alignment is cached, so
+# every faithfulness constraint that looks at the same pair reads its violations off the same
+# alignment instead of comparing the two words again in its own way.
+
+from functools import lru_cache
+
+MATCH = 'match'    # An input segment that comes out unchanged
+DELETE = 'delete'  # An input segment with nothing in the output
+INSERT = 'insert'  # An output segment with nothing in the input
+
+# How many alignments are kept around
+cache_size = 100000
+
+
+class Alignment:
+    """
+    A minimal alignment of an input with an output.
+
+    ops is a tuple of (operation, input position, output position) steps from left to right.
+    A DELETE step has no output position and an INSERT step has no input position (None).
+    When several alignments are equally small, segments are matched as early as possible.
+    """
+
+    def __init__(self, input_word, output_word, ops):
+        self.input_word = input_word
+        self.output_word = output_word
+        self.ops = ops
+
+    def __iter__(self):
+        return iter(self.ops)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return f"Alignment({self.input_word!r}, {self.output_word!r}, {self.ops!r})"
+
+    def deleted(self):
+        """The input positions that have nothing in the output."""
+        return [i for op, i, _ in self.ops if op == DELETE]
+
+    def inserted(self):
+        """The output positions that have nothing in the input."""
+        return [j for op, _, j in self.ops if op == INSERT]
+
+    def count(self, op, segments=None):
+        """
+        Counts the steps of one kind, optionally only those whose segment is in 'segments'.
+
+        Args:
+            op (str): MATCH, DELETE or INSERT.
+            segments (collection of str): Segments to count (compared in lower case), or None for every segment.
+
+        Returns:
+            int: The number of matching steps.
+        """
+        total = 0
+        for step, i, j in self.ops:
+            if step != op:
+                continue
+            segment = self.output_word[j] if step == INSERT else self.input_word[i]
+            if segments is None or segment.lower() in segments:
+                total += 1
+        return total
+
+    def is_faithful(self):
+        """True when the output is the input unchanged."""
+        return all(op == MATCH for op, _, _ in self.ops)
+
+
+@lru_cache(maxsize=cache_size)
+def align(input_word, output_word):
+    """
+    Aligns an input with an output using the fewest deletions and insertions.
+
+    Works on anything indexable with comparable items, so strings of segments and tuples of
+    IPA sounds are both fine. Results are cached per pair.
+
+    Args:
+        input_word (str or tuple): The input.
+        output_word (str or tuple): The output.
+
+    Returns:
+        Alignment: The alignment of the two.
+    """
+    n, m = len(input_word), len(output_word)
+    # A shared start is always matched straight through, so the table only has to cover the rest.
+    # Candidates usually differ from their input in just a spot or two, which keeps it small
+    start = 0
+    while start < n and start < m and input_word[start] == output_word[start]:
+        start += 1
+
+    # common[i][j] is the longest common subsequence of input_word[start + i:] and output_word[start + j:]
+    rows, columns = n - start, m - start
+    common = [[0] * (columns + 1) for _ in range(rows + 1)]
+    for i in range(rows - 1, -1, -1):
+        row, below = common[i], common[i + 1]
+        segment = input_word[start + i]
+        for j in range(columns - 1, -1, -1):
+            if segment == output_word[start + j]:
+                row[j] = below[j + 1] + 1
+            else:
+                row[j] = max(below[j], row[j + 1])
+
+    # Walk forwards, matching whenever that still leads to a minimal alignment
+    ops = [(MATCH, k, k) for k in range(start)]
+    i = j = 0
+    while i < rows and j < columns:
+        if input_word[start + i] == output_word[start + j] and common[i][j] == common[i + 1][j + 1] + 1:
+            ops.append((MATCH, start + i, start + j))
+            i += 1
+            j += 1
+        elif common[i + 1][j] >= common[i][j + 1]:
+            ops.append((DELETE, start + i, None))
+            i += 1
+        else:
+            ops.append((INSERT, None, start + j))
+            j += 1
+    ops += [(DELETE, start + k, None) for k in range(i, rows)]
+    ops += [(INSERT, None, start + k) for k in range(j, columns)]
+    return Alignment(input_word, output_word, tuple(ops))
+
+
+def clear_cache():
+    align.cache_clear()
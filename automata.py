@@ -0,0 +1,163 @@
+# automata.py
+# Compiles declarative markedness constraints into a single transition table.
+# A pattern such as "C C V" or "V V" is a sequence of segment classes. Every pattern
+# selected at the same time is merged into one automaton, so a word is scored against
+# all of them in one pass over its characters instead of one pass per constraint.
+
+import numpy as np
+
+BOUNDARY = '#'
+
+
+def parse_pattern(pattern):
+    """
+    Splits a pattern into its tokens.
+
+    Tokens are separated by spaces. A token is either the name of a segment class
+    (for example 'C' or 'V'), a literal segment (for example 's'), or '#' for a word edge.
+
+    Args:
+        pattern (str): The pattern to split, e.g. "C C V".
+
+    Returns:
+        tuple: The tokens of the pattern.
+    """
+    tokens = tuple(pattern.split())
+    if not tokens:
+        raise ValueError("A pattern needs at least one token.")
+    return tokens
+
+
+class PatternAutomaton:
+    """
+    A deterministic automaton that counts the matches of several patterns at once.
+
+    Each state remembers how far every pattern has got, and the table maps a state and a
+    character class to the next state. Reaching the end of a pattern adds one violation for
+    that pattern. Overlapping matches are all counted, so "V V" is violated twice by "aaa".
+    """
+
+    def __init__(self, patterns, classes):
+        """
+        Args:
+            patterns (list of str): The patterns to compile, one per constraint.
+            classes (dict): Maps a class name such as 'C' to the segments it contains.
+        """
+        self.patterns = [parse_pattern(p) for p in patterns]
+        self.classes = {name: {seg.lower() for seg in segments} for name, segments in classes.items()}
+        self._build_symbols()
+        self._build_table()
+
+    def _matches(self, token, segment):
+        if token in self.classes:
+            return segment in self.classes[token]
+        return token.lower() == segment
+
+    def _build_symbols(self):
+        # Segments that match exactly the same tokens behave the same way in every state,
+        # so they share one column of the transition table
+        tokens = sorted({token for pattern in self.patterns for token in pattern})
+        segments = set()
+        for members in self.classes.values():
+            segments |= members
+        segments |= {t.lower() for t in tokens if t not in self.classes and t != BOUNDARY}
+
+        signatures = {}
+        self.symbol_of = {}
+        # Symbol 0 is any segment no token mentions, symbol 1 is the word edge
+        signatures[()] = 0
+        signatures[(BOUNDARY,)] = 1
+        for segment in sorted(segments):
+            signature = tuple(t for t in tokens if t != BOUNDARY and self._matches(t, segment))
+            if signature not in signatures:
+                signatures[signature] = len(signatures)
+            self.symbol_of[segment] = signatures[signature]
+            self.symbol_of[segment.upper()] = signatures[signature]
+        self.symbols = [set(signature) for signature in signatures]
+
+    def _build_table(self):
+        # Subset construction. A state is the set of (pattern, tokens matched so far)
+        # partial matches that are still alive, plus the patterns just completed.
+        start = (frozenset(), ())
+        states = {start: 0}
+        order = [start]
+        transitions = []
+        emits = []
+
+        i = 0
+        while i < len(order):
+            alive, _ = order[i]
+            row = []
+            for symbol in self.symbols:
+                advanced = set()
+                completed = []
+                # Every pattern can also start fresh at this character
+                candidates = set(alive) | {(p, 0) for p in range(len(self.patterns))}
+                for p, k in candidates:
+                    if self.patterns[p][k] in symbol:
+                        if k + 1 == len(self.patterns[p]):
+                            completed.append(p)
+                        else:
+                            advanced.add((p, k + 1))
+                state = (frozenset(advanced), tuple(sorted(completed)))
+                if state not in states:
+                    states[state] = len(order)
+                    order.append(state)
+                row.append(states[state])
+            transitions.append(row)
+            i += 1
+
+        for _, completed in order:
+            emits.append(completed)
+
+        self.transitions = np.array(transitions, dtype=np.int32)
+        self.emits = emits
+        # Plain lists are faster to index from the Python scoring loop
+        self._rows = [list(row) for row in transitions]
+
+    @property
+    def state_count(self):
+        return len(self._rows)
+
+    def score(self, word):
+        """
+        Counts the violations of every pattern in a word in a single pass.
+
+        Args:
+            word (str): The word to be scored.
+
+        Returns:
+            list of int: The number of violations of each pattern, in the order they were compiled.
+        """
+        counts = [0] * len(self.patterns)
+        rows = self._rows
+        emits = self.emits
+        symbol_of = self.symbol_of
+
+        state = rows[0][1]
+        for p in emits[state]:
+            counts[p] += 1
+        for char in word:
+            state = rows[state][symbol_of.get(char, 0)]
+            for p in emits[state]:
+                counts[p] += 1
+        state = rows[state][1]
+        for p in emits[state]:
+            counts[p] += 1
+        return counts
+
+    def score_many(self, words):
+        """
+        Scores a list of words against every pattern.
+
+        Args:
+            words (list of str): The words to be scored.
+
+        Returns:
+            numpy.ndarray: An int matrix with one row per word and one column per pattern.
+        """
+        words = list(words)
+        matrix = np.zeros((len(words), len(self.patterns)), dtype=np.int32)
+        for i, word in enumerate(words):
+            matrix[i] = self.score(word)
+        return matrix
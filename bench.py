@@ -0,0 +1,269 @@
+# bench.py
+# Benchmarks for the main code paths: each constraint function, gen(), Recursive Constraint
+# Demotion, filling the GUI tables and how long the GUI and the CLI take to start cold. Everything runs on a synthetic lexicon so the numbers
+# can be compared between revisions. Results are written as JSON.
+#
+# Examples:
+#   python bench.py --output before.json
+#   python bench.py --output after.json --compare before.json
+#   python bench.py --words 500 --length 8 --skip-gui
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import alignment
+import constraints
+
+
+def make_lexicon(size, length, seed=0):
+    """
+    Builds a reproducible list of made-up words.
+
+    Each word is 'length' segments long and mixes consonant clusters with vowels,
+    so the constraints have something to find.
+
+    Args:
+        size (int): The number of words.
+        length (int): The number of segments in each word.
+        seed (int): The random seed.
+
+    Returns:
+        list of str: The words.
+    """
+    rng = random.Random(seed)
+    words = []
+    for _ in range(size):
+        word = ''
+        while len(word) < length:
+            # Mostly consonants, with a vowel now and then, gives clusters as well as diphthongs
+            word += rng.choice(constraints.vowels if rng.random() < 0.4 else constraints.consonants)
+        words.append(word)
+    return words
+
+
+def time_it(func, repeat):
+    """Runs func 'repeat' times and returns the best and the median time in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times), statistics.median(times)
+
+
+def record(results, name, func, repeat, items):
+    best, median = time_it(func, repeat)
+    results.append({
+        'name': name,
+        'items': items,
+        'best_seconds': best,
+        'median_seconds': median,
+        'microseconds_per_item': best / items * 1e6 if items else None,
+    })
+    print(f"{name:<40} {best * 1000:10.2f} ms  ({items} items)", file=sys.stderr)
+
+
+def clear_caches():
+    """Empties every cache the constraints keep, so a run starts cold even when it isn't the first."""
+    if constraints.evaluation_cache is not None:
+        constraints.evaluation_cache.clear()
+    constraints.syllabifier.clear_cache()
+    alignment.clear_cache()
+
+
+def bench_constraints(results, lexicon, repeat):
+    """Times every registered constraint called directly, without any batching or caching."""
+    pairs = [(word, candidate) for word in lexicon for candidate in constraints.gen(word, limit=10)]
+    outputs = [candidate for _, candidate in pairs]
+    for func in constraints.get_constraint_functions():
+        # Syllabification and alignments are cached per word, so every run starts from empty caches
+        if constraints.constraint_arity[func] == 1:
+            run = lambda: (clear_caches(), [func(w) for w in outputs])
+            record(results, f"constraint.{func.__name__}", run, repeat, len(outputs))
+        else:
+            run = lambda: (clear_caches(), [func(i, o) for i, o in pairs])
+            record(results, f"constraint.{func.__name__}", run, repeat, len(pairs))
+
+
+def bench_gen(results, lengths, size, depth, repeat):
+    """Times gen() on words of each length."""
+    for length in lengths:
+        words = make_lexicon(size, length, seed=length)
+        count = sum(1 for word in words for _ in constraints.gen(word, depth))
+        record(results, f"gen.length{length}.depth{depth}",
+               lambda: [list(constraints.gen(word, depth)) for word in words], repeat, count)
+
+
+def bench_rcd(results, lexicon, pair_counts, repeat):
+    """Times RCD (building the ERC matrix and ranking) on growing numbers of winner-loser pairs."""
+    all_pairs = []
+    for word in lexicon:
+        # The faithful candidate wins, every other candidate loses
+        all_pairs += [(word, word, loser) for loser in constraints.gen(word) if loser != word]
+    functions = constraints.get_constraint_functions()
+    for count in pair_counts:
+        pairs = (all_pairs * (count // max(len(all_pairs), 1) + 1))[:count]
+        record(results, f"rcd.pairs{count}",
+               lambda: constraints.recursive_constraint_demotion(pairs, functions), repeat, count)
+        erc = constraints.erc_matrix(pairs, functions)
+        record(results, f"rcd.ranking_only.pairs{count}", lambda: constraints.rcd(erc), repeat, count)
+
+
+def bench_gui(results, lexicon, repeat):
+    """Times filling both GUI tables offscreen for a gen() tableau of the longest word."""
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    try:
+        from PyQt5.QtWidgets import QApplication
+        import opti_gui
+    except ImportError as e:
+        print(f"Skipping the GUI benchmark: {e}", file=sys.stderr)
+        return
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = opti_gui.OTTableWindow()
+    window.selected_constraints = [func.__name__ for func in constraints.get_constraint_functions()]
+
+    input_word = max(lexicon, key=len)
+    window.inputWords = input_word
+    window.outputWords = list(constraints.gen(input_word, 2))
+    window.winnerModel.setWords(window.outputWords)
+    window.winnerSelection.setCurrentIndex(0)
+
+    def fill():
+        # Start cold every time, otherwise the caches would answer everything after the first run
+        clear_caches()
+        window.updateTable()
+        window.updateWLTable()
+        window.tableModel.waitForDone()
+
+    record(results, f"gui.tableau.rows{len(window.outputWords)}", fill, repeat, len(window.outputWords))
+    window.close()
+    app.processEvents()
+
+
+# Started in a fresh interpreter each time, so nothing is imported or cached yet
+startup_scripts = {
+    'startup.cli': "import sys, opti_cli; opti_cli.main([sys.argv[1]])",
+    'startup.gui': ("import os; os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')\n"
+                    "from PyQt5.QtWidgets import QApplication\n"
+                    "app = QApplication([])\n"
+                    "import opti_gui\n"
+                    "window = opti_gui.OTTableWindow()\n"
+                    "window.show()\n"
+                    "window.tableModel.waitForDone()\n"
+                    "app.processEvents()"),
+}
+
+
+def bench_startup(results, repeat, skip_gui=False):
+    """
+    Times starting a new interpreter that scores a couple of pairs with the CLI, and one that opens
+    the GUI window (offscreen) until its first table is filled in.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as f:
+        f.write("snow,sno\nski,si\n")
+    try:
+        for name, script in startup_scripts.items():
+            if skip_gui and name == 'startup.gui':
+                continue
+            command = [sys.executable, '-c', script, f.name]
+            if subprocess.run(command, cwd=here, capture_output=True).returncode != 0:
+                print(f"Skipping the {name} benchmark, it didn't run", file=sys.stderr)
+                continue
+            record(results, name, lambda: subprocess.run(command, cwd=here, capture_output=True), repeat, 1)
+    finally:
+        os.remove(f.name)
+
+
+def revision():
+    """Returns the current git commit, if there is one."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """
+    Prints how each benchmark changed against an earlier results file.
+
+    Returns:
+        list of str: The names of the benchmarks that got slower by more than the threshold.
+    """
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {entry['name']: entry for entry in json.load(f)['results']}
+
+    regressions = []
+    print(f"\nCompared with {baseline_path}:", file=sys.stderr)
+    for entry in results:
+        old = baseline.get(entry['name'])
+        if old is None or not old['best_seconds']:
+            continue
+        ratio = entry['best_seconds'] / old['best_seconds']
+        flag = ''
+        if ratio > threshold:
+            flag = '  <-- slower'
+            regressions.append(entry['name'])
+        print(f"{entry['name']:<40} {ratio:6.2f}x{flag}", file=sys.stderr)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark constraints, gen(), RCD and the GUI tables.")
+    parser.add_argument('--words', type=int, default=200, help="number of words in the synthetic lexicon")
+    parser.add_argument('--length', type=int, default=6, help="length of the words in the lexicon")
+    parser.add_argument('--gen-lengths', default='4,8,12,16', help="comma separated word lengths to run gen() on")
+    parser.add_argument('--depth', type=int, default=1, help="edit depth for the gen() benchmark")
+    parser.add_argument('--pairs', default='1000,10000,50000', help="comma separated winner-loser pair counts for RCD")
+    parser.add_argument('--repeat', type=int, default=3, help="how many times each benchmark is run")
+    parser.add_argument('--skip-gui', action='store_true', help="leave out the GUI table benchmark")
+    parser.add_argument('--output', help="file to write the JSON results to (defaults to stdout)")
+    parser.add_argument('--compare', metavar='BASELINE', help="an earlier results file to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio that counts as a regression when comparing")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    lexicon = make_lexicon(args.words, args.length)
+    results = []
+
+    bench_constraints(results, lexicon, args.repeat)
+    bench_gen(results, [int(n) for n in args.gen_lengths.split(',')], max(args.words // 10, 1), args.depth, args.repeat)
+    bench_rcd(results, lexicon, [int(n) for n in args.pairs.split(',')], args.repeat)
+    if not args.skip_gui:
+        bench_gui(results, lexicon, args.repeat)
+    bench_startup(results, max(args.repeat, 5), args.skip_gui)
+
+    report = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': vars(args),
+        'results': results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
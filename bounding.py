@@ -0,0 +1,138 @@
+# bounding.py
+# Finds the candidates in a tableau that can never win under any ranking.
+# A candidate is simply harmonically bounded when some other candidate does at least as
+# well on every constraint and strictly better on one. It is collectively bounded when
+# no ranking at all makes it optimal, even though no single candidate beats it everywhere.
+# Dropping both kinds leaves only the real contenders for the tableaux and for RCD.
+
+import numpy as np
+
+
+def harmonically_bounded(matrix):
+    """
+    Finds the candidates that are simply harmonically bounded by another candidate.
+
+    Candidates with the same violation profile are collapsed first, since they are either all
+    bounded or none of them are. The distinct profiles are then swept in order of total violations:
+    a profile can only be bounded by one with fewer violations in total, so each one only has to be
+    compared against the unbounded profiles already seen (the skyline).
+
+    Args:
+        matrix (numpy.ndarray): A violation matrix with one row per candidate and one column per constraint.
+
+    Returns:
+        numpy.ndarray: A boolean array that is True for every bounded candidate.
+    """
+    matrix = np.asarray(matrix)
+    if matrix.shape[0] == 0:
+        return np.zeros(0, dtype=bool)
+    if matrix.shape[1] == 0:
+        return np.zeros(matrix.shape[0], dtype=bool)
+
+    # Violation counts are small, so narrow ints keep the comparisons below cheap
+    dtype = np.int16 if matrix.max() < 2 ** 15 else matrix.dtype
+    profiles, inverse = np.unique(matrix.astype(dtype), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    order = np.lexsort(profiles.T[::-1])
+    order = order[np.argsort(profiles[order].sum(axis=1), kind='stable')]
+
+    bounded = np.zeros(len(profiles), dtype=bool)
+    skyline = profiles[:0]
+    start = 0
+    while start < len(order):
+        # Compare a whole block of profiles at once, keeping the comparison arrays at a few million cells
+        size = max(1, min(4096, 4000000 // (len(skyline) + 1)))
+        block = order[start:start + size]
+        start += size
+        candidates = profiles[block]
+
+        # Profiles are distinct, so "no worse anywhere" already means "better somewhere"
+        beaten = np.zeros(len(block), dtype=bool)
+        if len(skyline):
+            beaten = no_worse(skyline, candidates).any(axis=1)
+
+        # Bounding is transitive, so anything beaten by a block member that the skyline beats is
+        # already caught above. Only the block members left standing need comparing with each other.
+        left = np.flatnonzero(~beaten)
+        within = no_worse(candidates[left], candidates[left])
+        np.fill_diagonal(within, False)
+        beaten[left] = within.any(axis=1)
+
+        bounded[block] = beaten
+        skyline = np.concatenate([skyline, candidates[~beaten]])
+
+    return bounded[inverse]
+
+
+def no_worse(a, b):
+    """
+    Returns a boolean matrix that is True where row j of 'a' has no more violations
+    than row i of 'b' on every constraint, with one row per row of 'b'.
+    """
+    # Going one constraint at a time keeps the intermediate arrays two dimensional
+    result = np.ones((len(b), len(a)), dtype=bool)
+    for column in range(a.shape[1]):
+        result &= a[None, :, column] <= b[:, None, column]
+    return result
+
+
+def can_win(matrix, index):
+    """
+    Checks whether the candidate at 'index' is optimal under at least one ranking.
+
+    The candidate is treated as the winner against every other candidate, and the resulting
+    winner-loser comparisons are checked for consistency the same way RCD does it.
+
+    Args:
+        matrix (numpy.ndarray): A violation matrix with one row per candidate.
+        index (int): The row of the candidate to check.
+
+    Returns:
+        bool: True if some ranking makes this candidate (one of) the winners.
+    """
+    matrix = np.asarray(matrix)
+    # ERC rows: +1 where the constraint prefers this candidate, -1 where it prefers the other one
+    erc = np.sign(matrix - matrix[index])
+    prefers_winner = erc > 0
+    prefers_loser = erc < 0
+
+    remaining = np.ones(matrix.shape[1], dtype=bool)
+    active = prefers_loser.any(axis=1)
+    while active.any():
+        placeable = remaining & ~prefers_loser[active].any(axis=0)
+        if not placeable.any():
+            return False
+        remaining &= ~placeable
+        active &= ~prefers_winner[:, placeable].any(axis=1)
+    return True
+
+
+def contenders(matrix, collective=False, keep=()):
+    """
+    Finds the candidates that aren't harmonically bounded.
+
+    Args:
+        matrix (numpy.ndarray): A violation matrix with one row per candidate and one column per constraint.
+        collective (bool): Also drop candidates that are collectively bounded, i.e. can't win under any ranking.
+                           This runs a consistency check per remaining candidate, so it is done after the
+                           cheaper simple bounding pass.
+        keep (iterable of int): Rows to keep no matter what, such as the chosen winner.
+
+    Returns:
+        numpy.ndarray: A boolean array that is True for every contender.
+    """
+    matrix = np.asarray(matrix)
+    mask = ~harmonically_bounded(matrix)
+
+    if collective:
+        # Bounded candidates can't change whether another candidate is able to win, so only the
+        # survivors need to be compared against each other
+        survivors = np.flatnonzero(mask)
+        sub = matrix[survivors]
+        for k, row in enumerate(survivors):
+            if not can_win(sub, k):
+                mask[row] = False
+
+    for row in keep:
+        mask[row] = True
+    return mask
@@ -4,23 +4,442 @@
 # The second section is intended to provide a Winners/Losers table for user.
 # The final section uses Recursive Constraint Demotion to rank Constraints into Stratas
 
-import eng_to_ipa as e2i
-import inspect
+from collections import OrderedDict, deque, namedtuple
+from itertools import islice
+import os
+import threading
+import time
+import types
+# NumPy and the modules built on it (automata, bounding, segments) are imported where they are
+# first needed, so scripts that only list or call constraints start without them
+import ipa
+from alignment import align, DELETE, INSERT
+from syllables import Syllabifier
 
 # Static Variables
 consonants = ['b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm', 
               'n', 'p', 'q', 'r', 's', 't', 'v', 'x', 'y', 'z']
 vowels = ['a', 'e', 'i', 'o', 'u', 'w']
 
+# Segment classes that declarative constraint patterns can refer to
+segment_classes = {'C': consonants, 'V': vowels}
+
 constraint_functions = []
+constraint_arity = {}
+
+# The shared result cache. Stays None (no caching) until enable_cache() is called.
+evaluation_cache = None
+
+# Per-constraint timings. Stays None (nothing is timed) until enable_profiling() is called.
+profiler = None
 
 def constraint(func):
-    constraint_functions.append(func)
+    for i, registered in enumerate(constraint_functions):
+        if registered.__name__ == func.__name__:
+            # Re-registering a constraint replaces the old version and forgets its cached results
+            constraint_functions[i] = func
+            constraint_arity.pop(registered, None)
+            if evaluation_cache is not None:
+                evaluation_cache.invalidate(func.__name__)
+            break
+    else:
+        constraint_functions.append(func)
+    # Look the signature up once here instead of on every evaluation
+    constraint_arity[func] = _arity(func)
     return func
 
+def _arity(func):
+    # How many words a constraint takes. Plain functions give it straight from their code object,
+    # which saves importing inspect (and ast with it) for every constraint defined at startup.
+    # 0x0C are the *args and **kwargs flags, which only inspect counts the same way
+    code = getattr(func, '__code__', None)
+    if isinstance(func, types.FunctionType) and not code.co_flags & 0x0C and not code.co_kwonlyargcount \
+            and not hasattr(func, '__wrapped__'):
+        return code.co_argcount
+    import inspect
+    return len(inspect.signature(func).parameters)
+
 def get_constraint_functions():
     return constraint_functions
 
+def get_constraint(name):
+    """Looks up a registered constraint function by its name, loading its plugin first if it comes from one."""
+    for func in constraint_functions:
+        if func.__name__ == name:
+            return func
+    if name in discover_plugins() and load_plugin(name):
+        return get_constraint(name)
+    raise KeyError(f"No constraint named {name} has been registered.")
+
+# Directories searched for constraint plugins: the plugins folder next to this file, then any listed
+# in OPTIMALITY_PLUGINS (separated like PATH). Every .py file in them is a plugin module whose
+# constraints are registered with @constraint or markedness() like the ones in this file.
+plugin_dirs = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'plugins')] + \
+              [path for path in os.environ.get('OPTIMALITY_PLUGINS', '').split(os.pathsep) if path]
+
+_plugins = None         # Constraint name -> the plugin file it is defined in, found without importing anything
+_loaded_plugins = set()
+_plugin_lock = threading.Lock()
+
+def discover_plugins():
+    """
+    Finds the constraints every plugin file defines without running any of them.
+
+    The files are only parsed, so a plugin's own imports (and whatever they cost) wait until
+    one of its constraints is actually used. Discovery only runs once, rescan() makes it look again.
+
+    Returns:
+        dict: Constraint name -> plugin file path, in the order they were found.
+    """
+    global _plugins
+    if _plugins is None:
+        _plugins = {}
+        for directory in plugin_dirs:
+            if not os.path.isdir(directory):
+                continue
+            for filename in sorted(os.listdir(directory)):
+                if filename.endswith('.py') and not filename.startswith('_'):
+                    path = os.path.join(directory, filename)
+                    for name in _declared_constraints(path):
+                        _plugins.setdefault(name, path)
+    return _plugins
+
+def rescan():
+    """Forgets what discover_plugins() found, so plugin files added since are picked up."""
+    global _plugins
+    _plugins = None
+
+def _declared_constraints(path):
+    import ast
+
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+
+    def called(node, name):
+        return isinstance(node, ast.Call) and (getattr(node.func, 'id', None) == name
+                                               or getattr(node.func, 'attr', None) == name)
+
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef):
+            # @constraint or @constraints.constraint
+            if any(getattr(d, 'id', None) == 'constraint' or getattr(d, 'attr', None) == 'constraint'
+                   for d in node.decorator_list):
+                names.append(node.name)
+        elif isinstance(node, (ast.Assign, ast.Expr)) and called(node.value, 'markedness'):
+            # markedness('name', 'pattern')
+            args = node.value.args
+            if args and isinstance(args[0], ast.Constant) and isinstance(args[0].value, str):
+                names.append(args[0].value)
+    return names
+
+def load_plugin(name):
+    """
+    Imports the plugin that defines a constraint, which registers every constraint in it.
+
+    Returns:
+        bool: True if the plugin was loaded now or had been already, False if no plugin defines the name.
+    """
+    path = discover_plugins().get(name)
+    if path is None:
+        return False
+    # The GUI scores on worker threads, so two of them could ask for the same plugin at once
+    with _plugin_lock:
+        if path not in _loaded_plugins:
+            import importlib.util
+
+            module_name = 'optimality_plugin_' + os.path.splitext(os.path.basename(path))[0]
+            spec = importlib.util.spec_from_file_location(module_name, path)
+            spec.loader.exec_module(importlib.util.module_from_spec(spec))
+            _loaded_plugins.add(path)
+    return True
+
+def available_constraints():
+    """
+    Names every constraint that can be used: the registered ones, then those plugins define
+    that haven't been loaded yet. Nothing gets imported to find them.
+    """
+    names = [func.__name__ for func in constraint_functions]
+    return names + [name for name in discover_plugins() if name not in names]
+
+class EvaluationCache:
+    """
+    A size-bounded LRU cache of constraint results.
+
+    Entries are keyed by (constraint name, input word, output word), with the input left as
+    None for markedness constraints since they only look at the output. Once the cache is
+    full the least recently used entry is evicted.
+    """
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # The GUI scores tables from worker threads, so every access goes through the lock
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached violation count for a key, or None if it isn't cached."""
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Stores a violation count, evicting the least recently used entry if the cache is full."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def resize(self, maxsize):
+        """Changes the size bound, evicting old entries straight away if the cache is now too big."""
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, name):
+        """Drops every cached result of the constraint with this name."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == name]:
+                del self._entries[key]
+
+    def clear(self):
+        """Drops every cached result and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Returns the hit and miss counters along with the current size."""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+        }
+
+def enable_cache(maxsize=100000):
+    """
+    Turns on the shared result cache used by evaluate_tableau, and with it the GUI tables and RCD.
+
+    Args:
+        maxsize (int): The largest number of results to keep before evicting old ones.
+
+    Returns:
+        EvaluationCache: The shared cache.
+    """
+    global evaluation_cache
+    if evaluation_cache is None:
+        evaluation_cache = EvaluationCache(maxsize)
+    else:
+        evaluation_cache.resize(maxsize)
+    return evaluation_cache
+
+def disable_cache():
+    """Turns the shared result cache off and throws its contents away."""
+    global evaluation_cache
+    evaluation_cache = None
+
+class ConstraintProfiler:
+    """
+    Records how often each constraint is called, how long it takes and how often its results
+    come out of the shared cache.
+
+    Latencies are kept for the most recent 'samples' calls of each constraint, which is what the
+    p99 is worked out from. Declared constraints are scored together in one pass, so each of them
+    is charged an equal share of that pass. Batched constraints score a whole tableau in one call,
+    which counts as one call per candidate at the average time per candidate.
+    """
+
+    def __init__(self, samples=10000):
+        self.samples = samples
+        self._records = {}
+        # Like the cache, the GUI records from worker threads
+        self._lock = threading.Lock()
+
+    def _record(self, name):
+        record = self._records.get(name)
+        if record is None:
+            record = self._records[name] = {'calls': 0, 'seconds': 0.0, 'hits': 0, 'misses': 0,
+                                            'latencies': deque(maxlen=self.samples)}
+        return record
+
+    def add(self, name, seconds, calls=1):
+        """Records 'calls' calls to a constraint that took 'seconds' altogether."""
+        with self._lock:
+            record = self._record(name)
+            record['calls'] += calls
+            record['seconds'] += seconds
+            record['latencies'].append(seconds / calls)
+
+    def lookup(self, name, hit):
+        """Records a cache lookup for a constraint."""
+        with self._lock:
+            record = self._record(name)
+            if hit:
+                record['hits'] += 1
+            else:
+                record['misses'] += 1
+
+    def call(self, func, args):
+        """Calls a constraint function and records how long it took."""
+        start = time.perf_counter()
+        result = func(*args)
+        self.add(func.__name__, time.perf_counter() - start)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def stats(self):
+        """
+        Returns one dict per constraint that has been called or looked up, slowest in total first.
+
+        Each has the name, calls, total and mean seconds, the p99 latency in seconds, and the
+        cache hits, misses and hit rate.
+        """
+        with self._lock:
+            records = [(name, dict(record, latencies=list(record['latencies'])))
+                       for name, record in self._records.items()]
+        stats = []
+        for name, record in records:
+            lookups = record['hits'] + record['misses']
+            latencies = record['latencies']
+            stats.append({
+                'name': name,
+                'calls': record['calls'],
+                'seconds': record['seconds'],
+                'mean': record['seconds'] / record['calls'] if record['calls'] else 0.0,
+                'p99': _percentile(latencies, 99) if latencies else 0.0,
+                'hits': record['hits'],
+                'misses': record['misses'],
+                'hit_rate': record['hits'] / lookups if lookups else 0.0,
+            })
+        stats.sort(key=lambda entry: entry['seconds'], reverse=True)
+        return stats
+
+def _percentile(values, q):
+    import numpy as np
+    return float(np.percentile(values, q))
+
+def enable_profiling(samples=10000):
+    """
+    Starts timing every constraint evaluate_tableau calls. Until this is called nothing is timed,
+    and the only cost is checking that the profiler is off.
+
+    Args:
+        samples (int): How many recent calls of each constraint the p99 latency is taken over.
+
+    Returns:
+        ConstraintProfiler: The shared profiler.
+    """
+    global profiler
+    if profiler is None:
+        profiler = ConstraintProfiler(samples)
+    return profiler
+
+def disable_profiling():
+    """Stops timing constraints and throws the numbers away."""
+    global profiler
+    profiler = None
+
+def profile_stats():
+    """Returns the numbers recorded since profiling was enabled (see ConstraintProfiler.stats()), or [] if it is off."""
+    return profiler.stats() if profiler is not None else []
+
+def format_profile(stats):
+    """Lays the output of profile_stats() out as a plain text table."""
+    header = f"{'constraint':<24}{'calls':>10}{'total ms':>12}{'mean us':>10}{'p99 us':>10}{'hit rate':>12}"
+    lines = [header]
+    for entry in stats:
+        lookups = entry['hits'] + entry['misses']
+        hit_rate = f"{entry['hit_rate']:.1%}" if lookups else '-'
+        lines.append(f"{entry['name']:<24}{entry['calls']:>10}{entry['seconds'] * 1e3:>12.2f}"
+                     f"{entry['mean'] * 1e6:>10.1f}{entry['p99'] * 1e6:>10.1f}{hit_rate:>12}")
+    return "\n".join(lines)
+
+def cached_violations(func, num_args, input_word, output_word):
+    """
+    Scores one candidate against one constraint, going through the shared cache if it is enabled.
+    """
+    if num_args == 1:
+        key = (func.__name__, None, output_word)
+        args = (output_word,)
+    else:
+        key = (func.__name__, input_word, output_word)
+        args = (input_word, output_word)
+
+    if evaluation_cache is None:
+        if profiler is not None:
+            return violation_count(profiler.call(func, args))
+        return violation_count(func(*args))
+
+    value = evaluation_cache.get(key)
+    if profiler is not None:
+        profiler.lookup(func.__name__, value is not None)
+    if value is None:
+        value = violation_count(func(*args) if profiler is None else profiler.call(func, args))
+        evaluation_cache.put(key, value)
+    return value
+
+_automata = {}
+
+def compile_patterns(patterns):
+    """
+    Compiles a group of constraint patterns into one automaton, reusing it if the same
+    group has been compiled before.
+    """
+    from automata import PatternAutomaton
+
+    patterns = tuple(patterns)
+    if patterns not in _automata:
+        _automata[patterns] = PatternAutomaton(patterns, segment_classes)
+    return _automata[patterns]
+
+def markedness(name, pattern):
+    """
+    Declares a markedness constraint as a pattern over segment classes and registers it.
+
+    The pattern is a space separated sequence of classes from segment_classes, literal
+    segments, or '#' for the edge of the word. "C C V" is violated once for every
+    two consonants before a vowel, "V V" once for every pair of adjacent vowels.
+    When several declared constraints are evaluated together they share one automaton
+    and each word is only scanned once.
+
+    Args:
+        name (str): The name the constraint is shown and looked up under.
+        pattern (str): The pattern that counts as a violation.
+
+    Returns:
+        function: The registered constraint, which returns the number of violations in a word.
+    """
+    def check(word):
+        return compile_patterns([pattern]).score(word)[0]
+
+    check.__name__ = name
+    check.__qualname__ = name
+    check.__doc__ = f"Counts the violations of the pattern '{pattern}' in the word."
+    check.pattern = pattern
+    return constraint(check)
+
 
 # Constraint Functions
 @constraint
@@ -37,18 +456,9 @@ def starCC(word):
     Returns:
         bool: True if the word passes the *CC constraint, False otherwise.
     """
-    # Loop through each character in the word until a vowel is found
-    consonant_count = 0
-    for char in word:
-        if char.lower() in vowels:
-            break
-        elif char.lower() in consonants:
-            consonant_count += 1
-        if consonant_count > 1:
-            # More than one consonant before a vowel is a violation
-            return False
-    # If the loop ends without a violation, the word passes the constraint
-    return True
+    syllables = syllabifier.syllabify(word)
+    # Only the onset of the first syllable counts here, starComplex() looks at every syllable
+    return not syllables or syllables[0].onset_skeleton().count('C') <= 1
 
 @constraint
 def noDiphthong(word):
@@ -63,20 +473,48 @@ def noDiphthong(word):
     Returns:
         bool: True if the word does not contain diphthongs, False otherwise.
     """
-    extended_vowels = vowels
-    previous_char_was_vowel = False
-    
-    for char in word:
-        if char.lower() in extended_vowels:
-            if previous_char_was_vowel:
-                # Found two vowels in a row, this is a diphthong
-                return False
-            previous_char_was_vowel = True
-        else:
-            previous_char_was_vowel = False
-    
-    # No diphthongs found in the word
-    return True
+    # Adjacent vowels always share a nucleus
+    return all(len(syllable.nucleus) < 2 for syllable in syllabifier.syllabify(word))
+
+@constraint
+def starComplex(word):
+    """Counts the complex margins in a word (*Complex): every onset or coda of any syllable with more than one consonant.
+
+    Args:
+        word (str): The word to be checked.
+
+    Returns:
+        int: The number of complex onsets and codas.
+    """
+    return sum((syllable.onset_skeleton().count('C') > 1) + (syllable.coda_skeleton().count('C') > 1)
+               for syllable in syllabifier.syllabify(word))
+
+@constraint
+def noCoda(word):
+    """Counts the syllables that end in a coda (NoCoda).
+
+    Args:
+        word (str): The word to be checked.
+
+    Returns:
+        int: The number of closed syllables.
+    """
+    return sum(1 for syllable in syllabifier.syllabify(word) if syllable.coda)
+
+@constraint
+def sonoritySequencing(word):
+    """Counts the violations of the Sonority Sequencing Principle (SSP) in every syllable.
+
+    Sonority has to rise through an onset towards the nucleus and fall through a coda after it.
+    Every pair of neighbouring margin segments that doesn't is one violation.
+
+    Args:
+        word (str): The word to be checked.
+
+    Returns:
+        int: The number of violations.
+    """
+    return sum(syllabifier.sonority_violations(syllable) for syllable in syllabifier.syllabify(word))
 
 @constraint
 def noDeleteVowel(input_word, output_word):
@@ -90,13 +528,10 @@ def noDeleteVowel(input_word, output_word):
     Returns:
         bool: True if no vowel has been deleted, False otherwise.
     """
-    input_vowels = [char for char in input_word if char.lower() in vowels]
-    output_vowels = [char for char in output_word if char.lower() in vowels]
-    
-    input_vowel_count = len(input_vowels)
-    output_vowel_count = len(output_vowels)
-    
-    return input_vowel_count == output_vowel_count
+    # Matched segments are the same on both sides, so the vowel counts only differ
+    # if different numbers of vowels were deleted and inserted
+    alignment = align(input_word, output_word)
+    return alignment.count(DELETE, vowels) == alignment.count(INSERT, vowels)
 
 
 @constraint
@@ -111,13 +546,32 @@ def noDeleteConsonant(input_word, output_word):
     Returns:
         bool: True if no consonant has been deleted, False otherwise.
     """
-    input_consonants = [char for char in input_word if char.lower() in consonants]
-    output_consonants = [char for char in output_word if char.lower() in consonants]
-    
-    input_consonant_count = len(input_consonants)
-    output_consonant_count = len(output_consonants)
-    
-    return input_consonant_count == output_consonant_count
+    alignment = align(input_word, output_word)
+    return alignment.count(DELETE, consonants) == alignment.count(INSERT, consonants)
+
+def count_changed(segment_class):
+    """
+    Makes the batched version of a constraint that checks whether the output has as many
+    segments of a class as the input.
+
+    The returned function takes two CandidateStores (the input can hold a single word shared by
+    every candidate) and counts the class in all of them at once with the alphabet's lookup tables.
+    """
+    def batch(input_store, output_store):
+        import numpy as np
+        return (input_store.count(segment_class) != output_store.count(segment_class)).astype(np.int32)
+    # Lets other code (e.g. lattice.py) see what the constraint counts
+    batch.segment_class = segment_class
+    return batch
+
+# evaluate_tableau() uses these instead of calling the constraints once per candidate
+noDeleteVowel.batch = count_changed('V')
+noDeleteConsonant.batch = count_changed('C')
+
+# Declarative constraints
+# These are written as patterns over segment classes instead of by hand (see markedness())
+starCCV = markedness('starCCV', 'C C V')
+starVV = markedness('starVV', 'V V')
 
 # @constraint
 # def noSkippingIPA(input_word, output_word): 
@@ -130,8 +584,7 @@ def noDeleteConsonant(input_word, output_word):
 #     '''
     
 #     # Convert words to their IPA representations
-#     input_ipa = e2i.convert(input_word)
-#     output_ipa = e2i.convert(output_word)
+#     input_ipa, output_ipa = ipa.words_to_ipa([input_word, output_word])
 #     print(f"Input: {input_ipa}")
 #     print(f"Output: {output_ipa}")
 
@@ -165,87 +618,104 @@ def noSkipping(input_word, output_word):
     Check if the output_word can be generated from the input_word without skipping any characters. 
     Returns True if the entire output_word is checked, otherwise False.
     """
-    i, j = 0, 0
-    while i < len(input_word) and j < len(output_word):
-        if input_word[i] == output_word[j]:
+    alignment = align(input_word, output_word)
+    if alignment.count(INSERT):
+        # The output has segments the input doesn't, so it can't be made just by leaving some out
+        return False
+
+    # Minimal alignments match as early as they can, so this walks the input the same way
+    # as matching the output greedily
+    j = 0
+    for op, i, _ in alignment:
+        if j == len(output_word):
+            # The entire output_word is checked
+            break
+        if op != DELETE:
             j += 1
         elif i > 0 and i < len(input_word) - 1 and input_word[i - 1] == output_word[j - 1] and input_word[i + 1] == output_word[j]:
             # Adjacent character found, thus violating the constraint
             return False
-        i += 1
-
-    # If the entire output_word is checked
-    return j == len(output_word)
+    return True
 
 @constraint
-def maxSonorityRise(input_word):
-    """
-    This function finds the maximum sonority rise between the onset consonant and the peak
-    (vowel) of the syllable. It compares the sonority profiles of the onset consonant-vowel (CV)
-    sequences in the output and returns the input segment that creates the greatest sonority rise
-    from the consonant directly preceding the vowel to the vowel.
-    """
-    vowels = 'aeiou'
-    max_sonority_diff = -1
-    best_consonant = ''
-    peak_vowel = ''
-
-    # Find the first vowel which is considered the peak of the syllable
-    for i, c in enumerate(input_word):
-        if c in vowels:
-            peak_vowel = c
-            break
+def maxSonorityRise(word):
+    """Checks that sonority rises from the onset to the peak of the first syllable.
 
-    if peak_vowel:
-        # Find the onset consonant with the maximum sonority rise to the peak vowel
-        for j in range(i):
-            consonant = input_word[j]
-            diff = sonority_scale(peak_vowel) - sonority_scale(consonant)
-            if diff > max_sonority_diff:
-                max_sonority_diff = diff
-                best_consonant = consonant
+    The onset and the peak (nucleus) come from the shared syllabification, like the other syllable
+    constraints. The word passes when some consonant in the first onset is less sonorous than the
+    first segment of its nucleus. A word with no vowel, or one that starts with a vowel, has no rise
+    into its first peak. Segments without a sonority are left out.
 
-    return best_consonant + peak_vowel if best_consonant else ''
+    Args:
+        word (str): The word to be checked.
+
+    Returns:
+        int: 1 if there is no sonority rise into the first peak, 0 otherwise.
+    """
+    syllables = syllabifier.syllabify(word)
+    if not syllables or not syllables[0].nucleus:
+        return 1
+    peak = sonority_scale(syllables[0].nucleus[0])
+    return 0 if any(0 <= sonority_scale(segment) < peak for segment in syllables[0].onset) else 1
 
 # Helper functions
 
+# The Modified Sonority Rating (MSR) scale
+msr_sonority_hierarchy = {
+    'a': 8, 'e': 8, 'i': 8, 'o': 8, 'u': 8,  # Vowels
+    'm': 7, 'n': 7, 'ŋ': 7,                   # Nasals
+    'l': 6, 'r': 6,                           # Liquids
+    'j': 5, 'w': 5,                           # Glides
+    'z': 4, 'v': 4, 'ð': 4,                   # Voiced fricatives
+    'b': 3, 'd': 3, 'g': 3,                   # Voiced stops
+    'p': 2, 't': 2, 'k': 2,                   # Voiceless stops
+    'f': 1, 's': 1, 'ʃ': 1, 'θ': 1, 'h': 1    # Voiceless fricatives
+}
+
 def sonority_scale(letter):
     """Assigns a sonority value to a letter according to the Modified Sonority Rating (MSR) scale."""
-    msr_sonority_hierarchy = {
-        'a': 8, 'e': 8, 'i': 8, 'o': 8, 'u': 8,  # Vowels
-        'm': 7, 'n': 7, 'ŋ': 7,                   # Nasals
-        'l': 6, 'r': 6,                           # Liquids
-        'j': 5, 'w': 5,                           # Glides
-        'z': 4, 'v': 4, 'ð': 4,                   # Voiced fricatives
-        'b': 3, 'd': 3, 'g': 3,                   # Voiced stops
-        'p': 2, 't': 2, 'k': 2,                   # Voiceless stops
-        'f': 1, 's': 1, 'ʃ': 1, 'θ': 1, 'h': 1    # Voiceless fricatives
-    }
     return msr_sonority_hierarchy.get(letter.lower(), -1)
+
+_alphabet = None
+_alphabet_lock = threading.Lock()
+
+def get_alphabet():
+    """
+    The alphabet that interns segments to small codes for CandidateStore, with class and sonority
+    tables built from the lists above. It needs NumPy, so it is only made the first time it is used.
+    """
+    global _alphabet
+    if _alphabet is None:
+        from segments import Alphabet
+        with _alphabet_lock:
+            if _alphabet is None:
+                _alphabet = Alphabet(segment_classes, sonority_scale)
+    return _alphabet
+
+def __getattr__(name):
+    # Lets constraints.alphabet be read like a module attribute even though it is made lazily
+    if name == 'alphabet':
+        return get_alphabet()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Splits words into syllables for the syllable-based constraints, caching the result per word
+syllabifier = Syllabifier(segment_classes, sonority_scale)
+
 def compare_sounds(input_word, output_word):
 
     # Convert the input and output words to IPA
-    input_ipa = word_to_ipa(input_word)
-    output_ipa = word_to_ipa(output_word)
+    input_ipa, output_ipa = ipa.words_to_ipa([input_word, output_word])
     
     # Split the IPA representation into individual sounds
-    input_sounds = input_ipa.split()
-    output_sounds = output_ipa.split()
+    input_sounds = tuple(input_ipa.split())
+    output_sounds = tuple(output_ipa.split())
 
-    output_index = 0
-    for sound in input_sounds:
-        if output_index >= len(output_sounds):
-            return False
-        try:
-            # Find the sound in the output, starting from the current index
-            output_index = output_sounds.index(sound, output_index) + 1
-        except ValueError:
-            return False  # Sound not found in output
-    
-    return True
+    # Every input sound has to turn up in the output, in order
+    return not align(input_sounds, output_sounds).deleted()
 def word_to_ipa(input_word):
     """
     Converts a word to its IPA representation.
+    Results are cached, use ipa.words_to_ipa() to convert many words at once.
     
     Args:
         input_word (str): The word to be converted.
@@ -253,38 +723,77 @@ def word_to_ipa(input_word):
     Returns:
         str: The word in IPA representation.
     """
-    return e2i.convert(input_word)
-def gen(input_word):
+    return ipa.word_to_ipa(input_word)
+def gen(input_word, depth=1, limit=None, keep=None):
     """
-    Generates a list of output candidates based on the input word, following the principles of Optimality Theory.
+    Lazily generates output candidates for the input word, following the principles of Optimality Theory.
     
     This function assumes "richness of the base", meaning it generates candidates without language-specific input restrictions.
     It handles inputs with complex clusters and generates candidates that may include epenthesis or deletion strategies.
+    A candidate can take up to 'depth' edits to reach, where an edit is inserting a vowel or deleting a consonant.
+
+    Candidates are built one segment at a time, like walking down a tree of prefixes. Along the way gen
+    keeps track of how much of the input each prefix can account for and how many edits that took.
+    Every distinct output is a single path in that tree, so no candidate comes out twice even though
+    nothing remembers the candidates already yielded. Memory use only depends on the length of the word,
+    which is what makes depth 3 or 4 on long words workable.
+
+    The tree is walked depth first, so candidates don't come out in order of how many edits they take:
+    each one is followed by the longer candidates that start with it (snow, snoww, snowa, ...), and the
+    faithful next segment is tried before any inserted vowel at every point. Use lattice.optimal_candidate()
+    rather than the first candidates when only the best one is wanted.
     
     Args:
         input_word (str): The word to generate output candidates for.
+        depth (int): The largest number of edits a candidate may take.
+        limit (int): Stop after this many candidates. No limit if left out.
+        keep (function): Called with every partial candidate (a prefix of the output) as it is built.
+                         Returning False drops that prefix along with every candidate that would start
+                         with it, so whole branches are pruned early.
         
     Returns:
-        list: A list of possible output words (candidates).
-    """
-    candidates = []
-    # Epenthesis candidates: insert a vowel after each consonant
-    for vowel in vowels:
-        for i in range(len(input_word) + 1):
-            candidate = input_word[:i] + vowel + input_word[i:]
-            candidates.append(candidate)
-    
-    # Deletion candidates: delete each consonant one by one
-    for i in range(len(input_word)):
-        if input_word[i].lower() in consonants:
-            candidate = input_word[:i] + input_word[i+1:]
-            candidates.append(candidate)
-    
-    # Allow original word as a possible candidate
-    candidates.append(input_word)
-    
-    # Remove duplicates before returning
-    return list(set(candidates))
+        iterator: Possible output words (candidates), each one once.
+    """
+    n = len(input_word)
+    deletable = [char.lower() in consonants for char in input_word]
+
+    def delete_consonants(states):
+        # Deleting a consonant doesn't add anything to the output, so those edits are followed right away.
+        # A state maps how many input segments have been used up to the fewest edits that took.
+        closed = {}
+        for i in range(n + 1):
+            if i in states and states[i] < closed.get(i, depth + 1):
+                closed[i] = states[i]
+            if i < n and i in closed and deletable[i] and closed[i] < depth:
+                closed[i + 1] = min(closed.get(i + 1, depth + 1), closed[i] + 1)
+        return closed
+
+    def walk(prefix, states):
+        if n in states:
+            # The whole input is accounted for
+            yield prefix
+
+        extensions = {}
+        # Faithful: the next input segment comes out unchanged. Its branch is walked before any
+        # epenthesis, with the states that took the fewest edits first
+        for i, edits in sorted(states.items(), key=lambda state: state[1]):
+            if i < n:
+                step = extensions.setdefault(input_word[i], {})
+                step[i + 1] = min(step.get(i + 1, depth + 1), edits)
+        # Epenthesis: a vowel comes out without using up any of the input
+        for vowel in vowels:
+            for i, edits in states.items():
+                if edits < depth:
+                    step = extensions.setdefault(vowel, {})
+                    step[i] = min(step.get(i, depth + 1), edits + 1)
+
+        for char, step in extensions.items():
+            extended = prefix + char
+            if keep is None or keep(extended):
+                yield from walk(extended, delete_consonants(step))
+
+    return islice(walk('', delete_consonants({0: 0})), limit)
+
 def gather_input_words():
     """
     Gathers multiple words from the user to generate a list for constraint testing.
@@ -306,83 +815,320 @@ def gather_input_words():
     
     return input_words
 
-def recursive_constraint_demotion(candidates, constraints, stratum_count=2):
+def violation_count(result):
     """
-    Applies Recursive Constraint Demotion (RCD) algorithm to determine the rankings of constraints.
-    The constraints are placed into stratums based on their ranking.
+    Turns the return value of a constraint function into a number of violations.
+
+    Constraint functions return True when the word passes and False when it fails,
+    which counts as 0 and 1 violations. Functions that already return an int are
+    treated as a violation count. Anything else is read by its truthiness.
+    """
+    import numpy as np
+
+    if isinstance(result, bool):
+        return 0 if result else 1
+    if isinstance(result, (int, np.integer)):
+        return int(result)
+    return 0 if result else 1
+
+def _score_declared(automaton, names, word):
+    if profiler is None:
+        return automaton.score(word)
+    start = time.perf_counter()
+    scores = automaton.score(word)
+    share = (time.perf_counter() - start) / len(names)
+    for name in names:
+        profiler.add(name, share)
+    return scores
+
+def evaluate_tableau(inputs, candidates, constraint_set):
+    """
+    Builds the violation matrix for a tableau in one batched pass.
+
+    Each constraint is looked up and inspected once for the whole tableau instead of once
+    per cell, and each distinct output (or input/output pair) is only scored once per constraint.
 
     Args:
-        candidates (list of tuples): A list of candidate outputs for a given input. Each tuple
-                                     consists of the input word and its candidate output.
-        constraints (list of functions): A list of constraint functions that evaluate each candidate.
-        stratum_count (int): The total number of stratums to distribute constraints into.
+        inputs (str or list of str): The input word shared by every candidate, or one input per candidate.
+        candidates (list of str): The output candidates, one per row.
+        constraint_set (list): Constraint functions or their names, one per column.
 
     Returns:
-        list of lists: A list containing 'stratum_count' number of lists, each representing a stratum
-                       and containing the constraints ranked at that level.
+        numpy.ndarray: An int matrix with one row per candidate and one column per constraint
+                       holding the number of violations.
     """
-    def violates(constraint, candidate):
-        """
-        Check if the candidate violates the constraint, considering the expected number of parameters of the constraint.
-        """
-        input_word, output_word = candidate
-        params = inspect.signature(constraint).parameters
-        if len(params) == 1:
-            # Constraint expects only the output word
-            return constraint(output_word)
-        elif len(params) == 2:
-            # Constraint expects both the input and output words
-            return constraint(input_word, output_word)
+    import numpy as np
+    from segments import CandidateStore
+
+    candidates = list(candidates)
+    if isinstance(inputs, str):
+        inputs = [inputs] * len(candidates)
+    else:
+        inputs = list(inputs)
+        if len(inputs) != len(candidates):
+            raise ValueError("There must be one input word per candidate.")
+
+    functions = [get_constraint(c) if isinstance(c, str) else c for c in constraint_set]
+    matrix = np.zeros((len(candidates), len(functions)), dtype=np.int32)
+
+    # Declared constraints are compiled together so each output is scanned only once
+    declared = [j for j, func in enumerate(functions) if hasattr(func, 'pattern')]
+    if declared:
+        automaton = compile_patterns([functions[j].pattern for j in declared])
+        names = [functions[j].__name__ for j in declared]
+        scores = {}
+        for output_word in candidates:
+            if output_word in scores:
+                continue
+            if evaluation_cache is None:
+                scores[output_word] = _score_declared(automaton, names, output_word)
+                continue
+            cached = [evaluation_cache.get((name, None, output_word)) for name in names]
+            if profiler is not None:
+                for name, value in zip(names, cached):
+                    profiler.lookup(name, value is not None)
+            if None in cached:
+                cached = _score_declared(automaton, names, output_word)
+                for name, value in zip(names, cached):
+                    evaluation_cache.put((name, None, output_word), value)
+            scores[output_word] = cached
+        matrix[:, declared] = np.array([scores[output_word] for output_word in candidates],
+                                       dtype=np.int32).reshape(len(candidates), len(declared))
+
+    # Constraints with a batched version score every candidate at once from the encoded segments.
+    # That is cheaper than looking them up one by one, so they skip the cache
+    batched = [j for j, func in enumerate(functions) if hasattr(func, 'batch')]
+    if batched:
+        shared_input = len(set(inputs)) == 1
+        try:
+            alphabet = get_alphabet()
+            input_store = CandidateStore(alphabet, inputs[:1] if shared_input else inputs)
+            output_store = CandidateStore(alphabet, candidates)
+        except ValueError:
+            # The shared alphabet is full, so these are scored one by one like any other constraint
+            batched = []
+        for j in batched:
+            if profiler is None:
+                matrix[:, j] = functions[j].batch(input_store, output_store)
+                continue
+            start = time.perf_counter()
+            matrix[:, j] = functions[j].batch(input_store, output_store)
+            if candidates:
+                profiler.add(functions[j].__name__, time.perf_counter() - start, len(candidates))
+
+    for j, func in enumerate(functions):
+        if hasattr(func, 'pattern') or j in batched:
+            continue
+        num_args = constraint_arity.get(func)
+        if num_args is None:
+            num_args = _arity(func)
+
+        if num_args == 1:
+            # Markedness constraints only look at the output
+            scores = {}
+            for output_word in candidates:
+                if output_word not in scores:
+                    scores[output_word] = cached_violations(func, 1, None, output_word)
+            column = [scores[output_word] for output_word in candidates]
+        elif num_args == 2:
+            # Faithfulness constraints compare the input with the output
+            scores = {}
+            for pair in zip(inputs, candidates):
+                if pair not in scores:
+                    scores[pair] = cached_violations(func, 2, *pair)
+            column = [scores[pair] for pair in zip(inputs, candidates)]
         else:
-            raise ValueError("Constraint function must take either 1 or 2 arguments.")
+            raise ValueError(f"Constraint function {func.__name__} must take either 1 or 2 arguments.")
 
-    def is_dominated(constraint, candidates, undominated_constraints):
-        """
-        Check if the constraint is dominated by checking if there is any candidate that
-        does not violate any of the other undominated constraints but violates this one.
-        """
-        for candidate in candidates:
-            if not any(violates(uc, candidate) for uc in undominated_constraints) and violates(constraint, candidate):
-                return True
-        return False
+        matrix[:, j] = column
+
+    return matrix
+
+# Values in an ERC (Elementary Ranking Condition) matrix
+ERC_W = 1   # The constraint prefers the winner
+ERC_L = -1  # The constraint prefers the loser
+ERC_E = 0   # The constraint doesn't tell them apart
 
-    # Initialize list of stratums
-    stratums = [[] for _ in range(stratum_count)]
-    undominated_constraints = set(constraints)
-    current_stratum = 0
+RCDResult = namedtuple('RCDResult', ['strata', 'consistent', 'unranked', 'unexplained'])
 
-    # Perform RCD algorithm
-    while undominated_constraints and current_stratum < stratum_count:
-        for constraint in list(undominated_constraints):
-            if not is_dominated(constraint, candidates, undominated_constraints - {constraint}):
-                stratums[current_stratum].append(constraint)
-                undominated_constraints.remove(constraint)
-        current_stratum += 1
+def compare_violations(winner_violations, loser_violations):
+    """
+    Compares winner and loser violation profiles column by column.
+
+    Args:
+        winner_violations (numpy.ndarray): The violations of the winners, one row per pair
+                                           (or a single row shared by every loser).
+        loser_violations (numpy.ndarray): The violations of the losers, one row per pair.
+
+    Returns:
+        numpy.ndarray: An int8 ERC matrix holding ERC_W, ERC_L or ERC_E for every cell.
+    """
+    import numpy as np
+    return np.sign(np.asarray(loser_violations) - np.asarray(winner_violations)).astype(np.int8)
 
-    # If there are still undominated constraints left after filling all stratums, place them in the last stratum
-    if undominated_constraints:
-        stratums[-1].extend(undominated_constraints)
+def erc_matrix(pairs, constraint_set):
+    """
+    Builds the winner/loser ERC matrix for a list of winner-loser pairs.
 
-    return stratums
+    Args:
+        pairs (list of tuples): Each tuple is (input word, winner, loser).
+        constraint_set (list): Constraint functions or their names, one per column.
+
+    Returns:
+        numpy.ndarray: An int8 matrix with one row per pair and one column per constraint.
+    """
+    pairs = list(pairs)
+    inputs = [input_word for input_word, _, _ in pairs]
+    winners = evaluate_tableau(inputs, [winner for _, winner, _ in pairs], constraint_set)
+    losers = evaluate_tableau(inputs, [loser for _, _, loser in pairs], constraint_set)
+    return compare_violations(winners, losers)
+
+def contender_pairs(pairs, constraint_set, collective=False):
+    """
+    Drops the winner-loser pairs whose loser is harmonically bounded within its own tableau.
+
+    Pairs are grouped by input and winner, and each group's winner and losers are treated as one
+    candidate set. The winner is always kept.
+
+    Args:
+        pairs (list of tuples): Each tuple is (input word, winner, loser).
+        constraint_set (list): Constraint functions or their names.
+        collective (bool): Also drop losers that are collectively bounded.
+
+    Returns:
+        list of tuples: The pairs whose loser is a real contender, in their original order.
+    """
+    pairs = list(pairs)
+    inputs = [input_word for input_word, _, _ in pairs]
+    winners = evaluate_tableau(inputs, [winner for _, winner, _ in pairs], constraint_set)
+    losers = evaluate_tableau(inputs, [loser for _, _, loser in pairs], constraint_set)
+    return [pair for pair, keep in zip(pairs, contender_mask(pairs, winners, losers, collective)) if keep]
+
+def contender_mask(pairs, winner_violations, loser_violations, collective=False):
+    """
+    Works out which winner-loser pairs contender_pairs() would keep, from violations that have already been scored.
+
+    Args:
+        pairs (list of tuples): Each tuple is (input word, winner, loser).
+        winner_violations (numpy.ndarray): The violations of each pair's winner, one row per pair.
+        loser_violations (numpy.ndarray): The violations of each pair's loser, one row per pair.
+        collective (bool): Also drop losers that are collectively bounded.
+
+    Returns:
+        numpy.ndarray: True for every pair whose loser is a real contender.
+    """
+    import numpy as np
+    import bounding
+
+    groups = {}
+    for i, (input_word, winner, _) in enumerate(pairs):
+        groups.setdefault((input_word, winner), []).append(i)
+
+    keep = np.zeros(len(pairs), dtype=bool)
+    for rows in groups.values():
+        matrix = np.vstack([winner_violations[rows[0]], loser_violations[rows]])
+        mask = bounding.contenders(matrix, collective=collective, keep=[0])
+        keep[rows] = mask[1:]
+    return keep
+
+def rcd(erc):
+    """
+    Runs Recursive Constraint Demotion over an ERC matrix.
+
+    Every round, the constraints that prefer no loser among the pairs that are still
+    unexplained form the next stratum. The pairs that one of those constraints prefers
+    the winner for are then explained and dropped. If a round finds no such constraint
+    the data is inconsistent and the remaining constraints can't be ranked.
+
+    Args:
+        erc (numpy.ndarray): An ERC matrix with one row per winner-loser pair and one column per constraint.
+
+    Returns:
+        RCDResult: strata (list of lists of column indices, highest ranked first), consistent (bool),
+                   unranked (column indices that couldn't be placed) and unexplained
+                   (row indices of the pairs no ranking could account for).
+    """
+    import numpy as np
+
+    erc = np.asarray(erc)
+    prefers_winner = erc == ERC_W
+    prefers_loser = erc == ERC_L
+
+    remaining = np.ones(erc.shape[1], dtype=bool)
+    active = np.ones(erc.shape[0], dtype=bool)
+    strata = []
+
+    while remaining.any():
+        # Constraints that never prefer a loser among the pairs still left can be ranked now
+        placeable = remaining & ~prefers_loser[active].any(axis=0)
+        if not placeable.any():
+            return RCDResult(strata, False, np.flatnonzero(remaining).tolist(),
+                             np.flatnonzero(active).tolist())
+        strata.append(np.flatnonzero(placeable).tolist())
+        remaining &= ~placeable
+        # Pairs these constraints prefer the winner for are now accounted for
+        active &= ~prefers_winner[:, placeable].any(axis=1)
+
+    return RCDResult(strata, True, [], [])
+
+def recursive_constraint_demotion(pairs, constraints, stratum_count=None, contenders_only=False):
+    """
+    Applies Recursive Constraint Demotion (RCD) algorithm to determine the rankings of constraints.
+    The constraints are placed into stratums based on their ranking.
+
+    Args:
+        pairs (list of tuples): Winner-loser pairs. Each tuple is (input word, winner, loser).
+        constraints (list of functions): A list of constraint functions that evaluate each candidate.
+        stratum_count (int): If given, the stratification is padded or cut down to this many stratums,
+                             with any overflow placed in the last one.
+        contenders_only (bool or str): Drop losers that are harmonically bounded by another candidate of the
+                                       same input and winner before ranking. Pass 'collective' to also drop
+                                       losers that can't win under any ranking. A simply bounded loser's
+                                       comparison follows from the one against its bounder, so the strata
+                                       come out the same.
+
+    Returns:
+        RCDResult: strata (list of lists of constraint functions, highest ranked first), consistent (bool),
+                   unranked (the constraints that couldn't be ranked) and unexplained
+                   (the pairs no ranking could account for).
+    """
+    pairs = list(pairs)
+    constraints = [get_constraint(c) if isinstance(c, str) else c for c in constraints]
+    if contenders_only:
+        pairs = contender_pairs(pairs, constraints, collective=contenders_only == 'collective')
+    result = rcd(erc_matrix(pairs, constraints))
+
+    stratums = [[constraints[j] for j in stratum] for stratum in result.strata]
+    if stratum_count is not None:
+        stratums += [[] for _ in range(stratum_count - len(stratums))]
+        if len(stratums) > stratum_count:
+            # Place the overflow in the last stratum
+            stratums[stratum_count - 1] = [c for stratum in stratums[stratum_count - 1:] for c in stratum]
+            del stratums[stratum_count:]
+
+    return RCDResult(stratums,
+                     result.consistent,
+                     [constraints[j] for j in result.unranked],
+                     [pairs[i] for i in result.unexplained])
 
 # if run as _main_
 
+# Winner-loser pairs: (input word, winner, loser)
 test_cases = [
-    ("snow", "sno"),
-    ("snow", "sow"),
-    ("snow", "so"),
-    ("snow", "no"),
-    ("ski", "si"),
-    ("ski", "ki")
+    ("snow", "sno", "sow"),
+    ("snow", "sno", "so"),
+    ("snow", "sno", "no"),
+    ("ski", "si", "ki")
 ]
 
 if __name__ == "__main__":
 
-    # Assuming each pair in test_cases is an input word and its candidate output
-    test_candidates = [(input_word, output_word) for input_word, output_word in test_cases]
-    
-    # Test recursive constraint demotion with properly formatted candidates
-    print(recursive_constraint_demotion(test_candidates, get_constraint_functions(), 2))
+    # Test recursive constraint demotion on the winner-loser pairs
+    result = recursive_constraint_demotion(test_cases, get_constraint_functions())
+    for i, stratum in enumerate(result.strata, start=1):
+        print(f"Stratum {i}: " + ", ".join(func.__name__ for func in stratum))
+    if not result.consistent:
+        print("Inconsistent, couldn't rank: " + ", ".join(func.__name__ for func in result.unranked))
 
 
     #test get constraint functions
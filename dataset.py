@@ -0,0 +1,293 @@
+# dataset.py
+# Holds the tableaux of a whole analysis, one per input, each with its own candidates and winner.
+# Violations and ERC rows are kept sparse: most candidates don't violate most constraints, and
+# most winner-loser comparisons come out as e, so only the nonzero cells are stored. Adding or
+# removing an input only scores that input, and RCD runs straight over the sparse ERC rows of
+# every tableau together.
+
+import numpy as np
+
+import bounding
+import constraints
+import entailment
+
+
+class SparseMatrix:
+    """
+    A matrix kept as coordinate lists: the row, column and value of every nonzero cell.
+    """
+
+    def __init__(self, rows, cols, values, shape):
+        self.rows = np.asarray(rows, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.values = np.asarray(values)
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_dense(cls, matrix):
+        matrix = np.asarray(matrix)
+        rows, cols = np.nonzero(matrix)
+        return cls(rows, cols, matrix[rows, cols], matrix.shape)
+
+    def to_dense(self):
+        matrix = np.zeros(self.shape, dtype=self.values.dtype)
+        matrix[self.rows, self.cols] = self.values
+        return matrix
+
+    @property
+    def nnz(self):
+        """The number of nonzero cells."""
+        return len(self.values)
+
+    @classmethod
+    def stack(cls, matrices, width):
+        """Puts matrices with 'width' columns on top of each other, without going through a dense one."""
+        matrices = list(matrices)
+        heights = [m.shape[0] for m in matrices]
+        starts = np.concatenate([[0], np.cumsum(heights, dtype=np.int64)])
+        if not matrices:
+            return cls([], [], np.zeros(0, dtype=np.int8), (0, width))
+        return cls(np.concatenate([m.rows + start for m, start in zip(matrices, starts)]),
+                   np.concatenate([m.cols for m in matrices]),
+                   np.concatenate([m.values for m in matrices]),
+                   (int(starts[-1]), width))
+
+
+def sparse_rcd(erc):
+    """
+    Runs Recursive Constraint Demotion over a sparse ERC matrix.
+
+    Works like constraints.rcd(), but each round only looks at the W and L cells instead of
+    whole columns, so the cost follows the number of nonzero cells rather than the size of the matrix.
+
+    Args:
+        erc (SparseMatrix): ERC values (ERC_W or ERC_L) with one row per winner-loser pair.
+
+    Returns:
+        RCDResult: Column indices for the strata and unranked constraints, row indices for the unexplained pairs.
+    """
+    pair_count, constraint_count = erc.shape
+    w_rows, w_cols = erc.rows[erc.values == constraints.ERC_W], erc.cols[erc.values == constraints.ERC_W]
+    l_rows, l_cols = erc.rows[erc.values == constraints.ERC_L], erc.cols[erc.values == constraints.ERC_L]
+
+    remaining = np.ones(constraint_count, dtype=bool)
+    active = np.ones(pair_count, dtype=bool)
+    strata = []
+
+    while remaining.any():
+        # Constraints that never prefer a loser among the pairs still left can be ranked now
+        live = active[l_rows]
+        prefers_loser = np.bincount(l_cols[live], minlength=constraint_count) > 0
+        placeable = remaining & ~prefers_loser
+        if not placeable.any():
+            return constraints.RCDResult(strata, False, np.flatnonzero(remaining).tolist(),
+                                         np.flatnonzero(active).tolist())
+        strata.append(np.flatnonzero(placeable).tolist())
+        remaining &= ~placeable
+        # Pairs these constraints prefer the winner for are now accounted for
+        active[w_rows[placeable[w_cols]]] = False
+
+    return constraints.RCDResult(strata, True, [], [])
+
+
+class Tableau:
+    """One input with its candidates, the chosen winner (if any) and its sparse violations."""
+
+    def __init__(self, input_word, candidates, winner, violations):
+        self.input_word = input_word
+        self.candidates = candidates
+        self.winner = winner
+        self.violations = violations  # SparseMatrix, one row per candidate
+        self.losers = []              # Candidate rows that are compared with the winner
+        self.erc = None               # SparseMatrix, one row per loser
+
+
+class Dataset:
+    """
+    The tableaux of many inputs, scored against one set of constraints and ranked together.
+
+    Each tableau is scored once when it is added. Changing a winner only redoes that tableau's
+    comparisons from the violations already stored, and the combined ERC matrix RCD runs on is
+    put together from the per-tableau pieces without scoring anything again.
+    """
+
+    def __init__(self, constraint_set, contenders_only=False):
+        """
+        Args:
+            constraint_set (list): Constraint functions or their names, one per column.
+            contenders_only (bool or str): Leave losers that are harmonically bounded within their
+                                           tableau out of the comparisons. 'collective' also leaves out
+                                           the ones that can't win under any ranking.
+        """
+        self.constraints = [constraints.get_constraint(c) if isinstance(c, str) else c for c in constraint_set]
+        self.contenders_only = contenders_only
+        self.tableaux = {}
+        self._combined = None  # (ERC, pairs) of every tableau, put together when first needed
+
+    @classmethod
+    def from_pairs(cls, pairs, constraint_set, **kwargs):
+        """
+        Builds a dataset from (input word, winner, loser) rows, one tableau per input.
+        The candidates of a tableau are its winner followed by its losers.
+        """
+        grouped = {}
+        for input_word, winner, loser in pairs:
+            tableau = grouped.setdefault(input_word, {'winner': winner, 'candidates': [winner]})
+            if winner != tableau['winner']:
+                raise ValueError(f"The input {input_word} has more than one winner ({tableau['winner']} and {winner}).")
+            if loser not in tableau['candidates']:
+                tableau['candidates'].append(loser)
+
+        dataset = cls(constraint_set, **kwargs)
+        for input_word, tableau in grouped.items():
+            dataset.add(input_word, tableau['candidates'], tableau['winner'])
+        return dataset
+
+    def __len__(self):
+        return len(self.tableaux)
+
+    def __contains__(self, input_word):
+        return input_word in self.tableaux
+
+    def __iter__(self):
+        return iter(self.tableaux.values())
+
+    def inputs(self):
+        return list(self.tableaux)
+
+    def add(self, input_word, candidates, winner=None, violations=None):
+        """
+        Scores a tableau and adds it, replacing any earlier tableau for the same input.
+
+        Args:
+            input_word (str): The input.
+            candidates (iterable of str): Its output candidates. Duplicates are dropped.
+            winner (str): The attested output, or None to leave the tableau out of the ranking for now.
+            violations (numpy.ndarray): The candidates' violations if they have already been scored
+                                        (e.g. by parallel.evaluate_lexicon()), one row per candidate.
+        """
+        candidates = list(candidates)
+        if violations is not None:
+            matrix = np.asarray(violations)
+            if matrix.shape != (len(candidates), len(self.constraints)):
+                raise ValueError(f"The violations for {input_word} need one row per candidate and one column per constraint.")
+            if winner is not None and winner not in candidates:
+                raise ValueError(f"{winner} isn't a candidate for {input_word}.")
+            # Keep the first row of each candidate
+            first = {}
+            for i, candidate in enumerate(candidates):
+                first.setdefault(candidate, i)
+            if len(first) < len(candidates):
+                candidates = list(first)
+                matrix = matrix[list(first.values())]
+        else:
+            candidates = list(dict.fromkeys(candidates))
+            if winner is not None and winner not in candidates:
+                candidates.insert(0, winner)
+            matrix = constraints.evaluate_tableau(input_word, candidates, self.constraints)
+        tableau = Tableau(input_word, candidates, winner, SparseMatrix.from_dense(matrix))
+        self._compare(tableau, matrix)
+        self.tableaux[input_word] = tableau
+        self._combined = None
+        return tableau
+
+    def remove(self, input_word):
+        """Drops the tableau of an input. Nothing else is scored again."""
+        del self.tableaux[input_word]
+        self._combined = None
+
+    def set_winner(self, input_word, winner):
+        """Picks another winner for an input, redoing only that tableau's comparisons."""
+        tableau = self.tableaux[input_word]
+        if winner is not None and winner not in tableau.candidates:
+            raise ValueError(f"{winner} isn't a candidate for {input_word}.")
+        tableau.winner = winner
+        self._compare(tableau, tableau.violations.to_dense())
+        self._combined = None
+
+    def _compare(self, tableau, matrix):
+        if tableau.winner is None:
+            tableau.losers = []
+            tableau.erc = SparseMatrix([], [], np.zeros(0, dtype=np.int8), (0, len(self.constraints)))
+            return
+        winner_row = tableau.candidates.index(tableau.winner)
+        losers = np.array([i for i in range(len(tableau.candidates)) if i != winner_row], dtype=int)
+        if self.contenders_only and len(losers):
+            mask = bounding.contenders(matrix, collective=self.contenders_only == 'collective', keep=[winner_row])
+            losers = losers[mask[losers]]
+        tableau.losers = losers.tolist()
+        tableau.erc = SparseMatrix.from_dense(constraints.compare_violations(matrix[winner_row], matrix[losers])
+                                              .reshape(len(losers), len(self.constraints)))
+
+    def erc(self):
+        """
+        Returns the ERC rows of every tableau with a winner, stacked in one sparse matrix,
+        along with the (input word, winner, loser) pair behind each row.
+        """
+        if self._combined is None:
+            tableaux = [t for t in self.tableaux.values() if t.winner is not None]
+            pairs = [(t.input_word, t.winner, t.candidates[i]) for t in tableaux for i in t.losers]
+            self._combined = SparseMatrix.stack([t.erc for t in tableaux], len(self.constraints)), pairs
+        return self._combined
+
+    def basis(self):
+        """
+        Reduces the ERC rows of every tableau to a basis (see entailment.basis()): the rows that rule out
+        the same rankings with none following from the others. RCD over them gives the same strata.
+
+        Returns:
+            tuple: The basis as a dense int8 ERC matrix and the (input word, winner, loser) pair behind each row.
+        """
+        erc, pairs = self.erc()
+        dense = erc.to_dense()
+        keep = entailment.basis(dense)
+        return dense[keep].reshape(len(keep), erc.shape[1]), [pairs[i] for i in keep]
+
+    def rcd(self):
+        """
+        Ranks the constraints with RCD over every tableau at once.
+
+        Returns:
+            RCDResult: strata (lists of constraint functions, highest ranked first), consistent (bool),
+                       unranked (constraint functions) and unexplained ((input word, winner, loser) pairs).
+        """
+        erc, pairs = self.erc()
+        result = sparse_rcd(erc)
+        return constraints.RCDResult([[self.constraints[j] for j in stratum] for stratum in result.strata],
+                                     result.consistent,
+                                     [self.constraints[j] for j in result.unranked],
+                                     [pairs[i] for i in result.unexplained])
+
+    def save(self, path):
+        """Saves every tableau, with its violations and winner, to a binary file (see storage.py)."""
+        import storage
+        with storage.TableauWriter(path, [func.__name__ for func in self.constraints]) as writer:
+            for tableau in self.tableaux.values():
+                writer.add(tableau.input_word, tableau.candidates, tableau.violations.to_dense(), tableau.winner)
+
+    @classmethod
+    def load(cls, path, constraint_set=None, **kwargs):
+        """
+        Builds a dataset from a file written by save() (or storage.TableauWriter).
+        The stored violations are used as they are, so nothing is scored again.
+
+        Args:
+            path (str): The saved file.
+            constraint_set (list): Constraint functions or names to keep, defaults to every column
+                                   of the file. Either way they have to be registered under those names.
+        """
+        import storage
+        stored = storage.load(path)
+        names = [c if isinstance(c, str) else c.__name__ for c in constraint_set] if constraint_set else None
+        columns = stored.columns(names)
+        dataset = cls(constraint_set or stored.constraint_names, **kwargs)
+        for tableau in stored:
+            dataset.add(tableau.input_word, list(tableau.candidates), tableau.winner,
+                        np.asarray(tableau.violations)[:, columns])
+        return dataset
+
+    def density(self):
+        """The share of violation cells that are nonzero, across every tableau."""
+        cells = sum(t.violations.shape[0] for t in self.tableaux.values()) * len(self.constraints)
+        nonzero = sum(t.violations.nnz for t in self.tableaux.values())
+        return nonzero / cells if cells else 0.0
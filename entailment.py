@@ -0,0 +1,191 @@
+# entailment.py
+# ERC algebra for winner-loser comparisons.
+# An ERC row says which constraints prefer the winner (W), which prefer the loser (L) and which
+# don't care (e). Many rows of a winner-loser table follow from others: a ranking that satisfies
+# the others always satisfies them too. Fusion combines rows into the one row that holds exactly when
+# all of them hold for the top-ranked constraints, entails() checks whether a set of rows forces
+# another, and basis() reduces a set to rows none of which follow from the rest, which rule out the
+# same rankings. RCD and factorial typology only need the basis, which is usually much smaller.
+# The set operations run on rows kept as pairs of bit masks, the way typology.py works with them.
+
+import numpy as np
+
+import constraints
+
+
+def masks(erc):
+    """
+    Turns ERC rows into pairs of bit masks, one bit per constraint.
+
+    The set operations below run on very small sets of rows, millions of times over, and
+    plain int bit operations are much cheaper for that than NumPy calls.
+
+    Returns:
+        list of tuples: (constraints preferring the winner, constraints preferring the loser) per row.
+    """
+    erc = np.asarray(erc)
+    bits = _bits(erc.shape[1])
+    winner_masks = (erc == constraints.ERC_W) @ bits
+    loser_masks = (erc == constraints.ERC_L) @ bits
+    return [(int(w), int(l)) for w, l in zip(winner_masks, loser_masks)]
+
+
+def from_masks(rows, width):
+    """Turns ERC rows given as bit masks back into an int8 ERC matrix."""
+    bits = _bits(width)
+    winner_masks = np.array([w for w, _ in rows], dtype=bits.dtype).reshape(-1, 1)
+    loser_masks = np.array([l for _, l in rows], dtype=bits.dtype).reshape(-1, 1)
+    erc = np.zeros((len(rows), width), dtype=np.int8)
+    erc[(winner_masks & bits) != 0] = constraints.ERC_W
+    erc[(loser_masks & bits) != 0] = constraints.ERC_L
+    return erc
+
+
+def _bits(width):
+    # Python ints only when the masks wouldn't fit in an int64
+    return 1 << np.arange(width, dtype=np.int64 if width < 63 else object)
+
+
+def prune(rows):
+    """
+    Drops the ERC rows (given as bit masks) that follow from another row.
+
+    Row x entails row y when every W of x is also a W of y and every L of y is also an L of x:
+    whichever W of x outranks its L's does the same for y. Fewer rows make every RCD run cheaper,
+    and the rows that are left still rule out exactly the same rankings.
+    """
+    rows = sorted(set(rows), key=lambda row: (bin(row[0]).count('1'), -bin(row[1]).count('1')))
+    kept = []
+    for w, l in rows:
+        if not any(not kept_w & ~w and not l & ~kept_l for kept_w, kept_l in kept):
+            kept.append((w, l))
+    return kept
+
+
+def stratify(rows, width):
+    """
+    Runs RCD over ERC rows given as bit masks.
+
+    Args:
+        rows (list of tuples): (winner mask, loser mask) per row, as made by masks().
+        width (int): The number of constraints.
+
+    Returns:
+        list of int: The constraints of each stratum as a bit mask, highest first, or None if the rows are
+                     inconsistent. Constraints no row needed go in the last stratum.
+    """
+    remaining = (1 << width) - 1
+    active = [row for row in rows if row[1]]
+    strata = []
+    while active:
+        prefers_loser = 0
+        for _, l in active:
+            prefers_loser |= l
+        placeable = remaining & ~prefers_loser
+        if not placeable:
+            return None
+        strata.append(placeable)
+        remaining &= ~placeable
+        active = [(w, l) for w, l in active if not w & placeable]
+    if remaining:
+        strata.append(remaining)
+    return strata
+
+
+def consistent(rows, width):
+    """Checks that some ranking satisfies every ERC row (given as bit masks), the way RCD would."""
+    return stratify(rows, width) is not None
+
+
+def fuse(erc):
+    """
+    Fuses ERC rows into one: L wherever any row has an L, otherwise W wherever any row has a W,
+    otherwise e. The fusion is entailed by the rows together, so it is a single necessary condition
+    that sums them up (and an L with no W shows the rows can't all be satisfied).
+
+    Args:
+        erc (numpy.ndarray): ERC rows, one per winner-loser pair.
+
+    Returns:
+        numpy.ndarray: One int8 ERC row.
+    """
+    erc = np.asarray(erc).reshape(-1, np.shape(erc)[-1])
+    fused = np.full(erc.shape[1], constraints.ERC_E, dtype=np.int8)
+    fused[(erc == constraints.ERC_W).any(axis=0)] = constraints.ERC_W
+    fused[(erc == constraints.ERC_L).any(axis=0)] = constraints.ERC_L
+    return fused
+
+
+def entails_masks(rows, row, width):
+    """
+    Checks whether ERC rows (given as bit masks) entail another row.
+
+    The row fails under a ranking exactly when one of its L's outranks all of its W's. So it is
+    entailed when, for each of its L's, putting that L above every one of its W's is inconsistent
+    with the rows.
+    """
+    w, l = row
+    w_bits = [1 << j for j in range(width) if w >> j & 1]
+    for j in range(width):
+        if l >> j & 1 and consistent(list(rows) + [(1 << j, bit) for bit in w_bits], width):
+            return False
+    return True
+
+
+def entails(erc, row):
+    """
+    Checks whether a set of ERC rows entails another: every ranking that satisfies all the rows
+    satisfies it too.
+
+    Args:
+        erc (numpy.ndarray): The ERC rows.
+        row (numpy.ndarray): The row to check.
+
+    Returns:
+        bool: True if the rows entail it.
+    """
+    row = np.asarray(row).reshape(1, -1)
+    erc = np.asarray(erc).reshape(-1, row.shape[1])
+    return entails_masks(masks(erc), masks(row)[0], row.shape[1])
+
+
+def reduce_masks(rows, width):
+    """
+    Reduces ERC rows (given as bit masks) to a basis: rows that rule out the same rankings, none of
+    which is entailed by the others.
+
+    Rows without an L never fail and go first. Then every row the rest still entail is dropped, the
+    ones with the most L's first. Those are the fusions of other rows, so the elementary rows they
+    were fused from are the ones that stay (W L e and e W L rather than W L L and e W L). prune()
+    tidies up what is left. An inconsistent set only gets the prune(), since every row follows from
+    a set that can't be satisfied and dropping them would only hide which comparisons clash.
+    """
+    rows = list(dict.fromkeys(row for row in rows if row[1]))
+    if not consistent(rows, width):
+        return prune(rows)
+    kept = sorted(rows, key=lambda row: (-bin(row[1]).count('1'), bin(row[0]).count('1')))
+    for row in list(kept):
+        others = [other for other in kept if other != row]
+        if entails_masks(others, row, width):
+            kept = others
+    return prune(kept)
+
+
+def basis(erc):
+    """
+    Finds a basis of ERC rows: a subset that rules out exactly the same rankings and has no row
+    entailed by the others. RCD over the basis gives the same strata as over every row.
+
+    Args:
+        erc (numpy.ndarray): ERC rows, one per winner-loser pair.
+
+    Returns:
+        list of int: The indices of the rows in the basis, in their original order
+                     (the first of any identical rows).
+    """
+    erc = np.asarray(erc)
+    rows = masks(erc)
+    first = {}
+    for i, row in enumerate(rows):
+        first.setdefault(row, i)
+    return sorted(first[row] for row in reduce_masks(list(first), erc.shape[1]))
@@ -0,0 +1,167 @@
+# ipa.py
+# Batched English to IPA conversion with two cache layers.
+# eng_to_ipa opens its bundled dictionary and queries it every time convert() is called,
+# which makes converting words one at a time slow. Here words are looked up in batches,
+# first in an in-process cache, then in a local cache file that survives restarts, and
+# only the words missing from both are sent to eng_to_ipa (in one query per batch).
+# eng_to_ipa and sqlite3 are only imported once a word actually needs converting, so importing
+# this module (and constraints with it) costs next to nothing.
+#
+# The cache file can be pre-warmed from a word list (one word per line):
+#   python ipa.py wordlist.txt
+
+import os
+import sys
+import threading
+
+# Where the persistent cache lives. Set OPTIMALITY_IPA_CACHE to move it, or call set_cache_file().
+default_cache_file = os.environ.get(
+    'OPTIMALITY_IPA_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'optimality', 'ipa.sqlite3'))
+
+# How many words go into one dictionary query
+batch_size = 500
+
+_memory = {}
+_lock = threading.Lock()
+_cache_file = default_cache_file
+_connection = None
+
+
+def set_cache_file(path):
+    """
+    Points the persistent cache at another file.
+
+    Args:
+        path (str): The cache file to use, or None to only cache in memory.
+    """
+    global _cache_file, _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+        _connection = None
+        _cache_file = path
+
+
+def clear_memory_cache():
+    """Forgets the in-process cache. The cache file is left alone."""
+    with _lock:
+        _memory.clear()
+
+
+def _open():
+    global _connection
+    if _connection is None and _cache_file:
+        import sqlite3
+        directory = os.path.dirname(_cache_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _connection = sqlite3.connect(_cache_file, check_same_thread=False)
+        _connection.execute("CREATE TABLE IF NOT EXISTS ipa (word TEXT PRIMARY KEY, ipa TEXT NOT NULL)")
+    return _connection
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _load(words):
+    """Reads the words that are in the cache file."""
+    connection = _open()
+    found = {}
+    if connection is None:
+        return found
+    for chunk in _chunks(words, batch_size):
+        placeholders = ', '.join('?' * len(chunk))
+        rows = connection.execute(f"SELECT word, ipa FROM ipa WHERE word IN ({placeholders})", chunk)
+        found.update(rows)
+    return found
+
+
+def _store(converted):
+    """Writes newly converted words to the cache file."""
+    connection = _open()
+    if connection is None or not converted:
+        return
+    with connection:
+        connection.executemany("INSERT OR REPLACE INTO ipa (word, ipa) VALUES (?, ?)", converted.items())
+
+
+def _convert(words):
+    """Converts words that aren't cached anywhere, one dictionary query per batch."""
+    import eng_to_ipa as e2i
+
+    converted = {}
+    simple = []
+    for word in words:
+        if not word.strip():
+            converted[word] = ''
+        elif len(word.split()) > 1:
+            # Several words at once, leave it to eng_to_ipa to split them up
+            converted[word] = e2i.convert(word)
+        else:
+            simple.append(word)
+
+    for chunk in _chunks(simple, batch_size):
+        # ipa_list gives every transcription of each word, convert() would pick the last one
+        for word, transcriptions in zip(chunk, e2i.ipa_list(chunk)):
+            converted[word] = transcriptions[-1]
+    return converted
+
+
+def words_to_ipa(words):
+    """
+    Converts a batch of words to their IPA representations.
+
+    Args:
+        words (iterable of str): The words to be converted.
+
+    Returns:
+        list of str: The IPA representation of each word, in the same order. Words that aren't in
+                     eng_to_ipa's dictionary come back with an asterisk, just like e2i.convert().
+    """
+    words = list(words)
+    with _lock:
+        missing = list(dict.fromkeys(word for word in words if word not in _memory))
+        if missing:
+            found = _load(missing)
+            _memory.update(found)
+            converted = _convert([word for word in missing if word not in found])
+            _store(converted)
+            _memory.update(converted)
+        return [_memory[word] for word in words]
+
+
+def word_to_ipa(word):
+    """
+    Converts a single word to its IPA representation, going through the same caches as words_to_ipa.
+    """
+    return words_to_ipa([word])[0]
+
+
+def prewarm(words):
+    """
+    Converts a list of words ahead of time so they are already in the cache file.
+
+    Args:
+        words (iterable of str): The words to convert.
+
+    Returns:
+        int: The number of distinct words now cached.
+    """
+    words = list(dict.fromkeys(word.strip() for word in words if word.strip()))
+    for chunk in _chunks(words, batch_size * 20):
+        words_to_ipa(chunk)
+    return len(words)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python ipa.py wordlist.txt [more word lists...]")
+        sys.exit(1)
+    total = 0
+    for path in sys.argv[1:]:
+        with open(path, encoding='utf-8') as f:
+            total += prewarm(f)
+    print(f"{total} words cached in {_cache_file}")
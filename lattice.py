@@ -0,0 +1,142 @@
+# lattice.py
+# Finds the optimal output of an input under a fixed ranking without listing the candidates of gen().
+# Every candidate gen() can make is a path through the edit lattice of its input: at each point the
+# next input segment comes out unchanged, a consonant is deleted, or a vowel is inserted. The search
+# walks that lattice from the left, adding up violations as segments are written, and keeps only the
+# best path into each state (input position, state of the markedness automaton, faithfulness counts).
+# Violations are compared lexicographically in ranking order, so the first complete path taken off the
+# queue is optimal. Epenthesis doesn't move along the input, so paths are expanded best first
+# (Dijkstra) rather than strictly left to right; each state is still only expanded once, and edits
+# are unbounded unless a depth is given, since the number of states stays finite either way.
+#
+# Only constraints that can be scored one segment at a time take part: declared markedness patterns
+# (see constraints.markedness()) and faithfulness constraints built with constraints.count_changed().
+
+from collections import namedtuple
+import heapq
+
+import constraints
+
+# output: the optimal candidate
+# violations: its violations of every constraint, in ranking order
+# edits: the number of insertions and deletions it takes
+Optimum = namedtuple('Optimum', ['output', 'violations', 'edits'])
+
+
+def searchable(func):
+    """Whether a constraint can be scored edit by edit in the lattice."""
+    return hasattr(func, 'pattern') or hasattr(getattr(func, 'batch', None), 'segment_class')
+
+
+def optimal_candidate(input_word, ranking, depth=None):
+    """
+    Finds the best candidate gen() could make for an input under a strict ranking, without generating any.
+
+    Among candidates that tie on every constraint, the one with the fewest edits wins.
+
+    Args:
+        input_word (str): The input.
+        ranking (list): Constraint functions or their names, highest ranked first.
+        depth (int): The most edits a candidate may take, like gen()'s depth. None for no limit.
+
+    Returns:
+        Optimum: The optimal output, its violations and how many edits it takes.
+    """
+    functions = [constraints.get_constraint(c) if isinstance(c, str) else c for c in ranking]
+    unsupported = [func.__name__ for func in functions if not searchable(func)]
+    if unsupported:
+        raise ValueError("These constraints can't be scored edit by edit, so they need gen(): "
+                         + ", ".join(unsupported))
+
+    n = len(input_word)
+    width = len(functions)
+    declared = [j for j, func in enumerate(functions) if hasattr(func, 'pattern')]
+    automaton = constraints.compile_patterns([functions[j].pattern for j in declared])
+    rows, emits = automaton._rows, automaton.emits
+
+    # Faithfulness constraints compare how many segments of a class the input and output have.
+    # Only the difference so far matters, and once it can't come back to 0 any more its exact value
+    # doesn't either, so it is capped to keep the number of states finite
+    counted = [(j, constraints.get_alphabet().classes[functions[j].batch.segment_class])
+               for j, func in enumerate(functions) if not hasattr(func, 'pattern')]
+    deletable = [char.lower() in constraints.consonants for char in input_word]
+    insertable = [[vowel in members for vowel in constraints.vowels] for _, members in counted]
+    # How many more segments of each class can still be deleted after position i
+    can_delete = [[sum(1 for k in range(i, n) if deletable[k] and input_word[k].lower() in members)
+                   for i in range(n + 1)] for _, members in counted]
+
+    def clamp(i, differences):
+        capped = []
+        for c, difference in enumerate(differences):
+            if difference > can_delete[c][i]:
+                difference = can_delete[c][i] + 1
+            elif difference < 0 and not any(insertable[c]):
+                difference = -1
+            capped.append(difference)
+        return tuple(capped)
+
+    def step(state, char):
+        # The next automaton state and the violations writing 'char' adds, in ranking order.
+        # None is the edge of the word, which is symbol 1 of the automaton
+        state = rows[state][1 if char is None else automaton.symbol_of.get(char, 0)]
+        added = [0] * width
+        for p in emits[state]:
+            added[declared[p]] += 1
+        return state, added
+
+    def add(cost, added, edits):
+        return tuple(c + a for c, a in zip(cost, added + [edits]))
+
+    start_state, added = step(0, None)
+    start = (0, start_state, clamp(0, [0] * len(counted)), 0)
+    best = {start: tuple(added) + (0,)}
+    back = {start: None}
+    # Entries are (cost, counter, node), the counter only keeps nodes from being compared
+    queue = [(best[start], 0, start)]
+    order = 1
+    done = set()
+
+    while queue:
+        cost, _, node = heapq.heappop(queue)
+        if node in done:
+            continue
+        done.add(node)
+        i, state, differences, edits = node
+        if i is None:
+            # A finished candidate: nothing still queued can beat it
+            output = []
+            while back[node] is not None:
+                node, char = back[node]
+                if char:
+                    output.append(char)
+            return Optimum(''.join(reversed(output)), list(cost[:width]), cost[width])
+
+        moves = []
+        if i == n:
+            # Close the word: the edge of the word and the faithfulness counts are scored
+            final_state, added = step(state, None)
+            for c, (j, _) in enumerate(counted):
+                added[j] += differences[c] != 0
+            moves.append(((None, final_state, (), edits), None, added, 0))
+        if i < n:
+            next_state, added = step(state, input_word[i])
+            moves.append(((i + 1, next_state, clamp(i + 1, differences), edits), input_word[i], added, 0))
+        if depth is None or edits < depth:
+            if i < n and deletable[i]:
+                changed = clamp(i + 1, [d - (input_word[i].lower() in members)
+                                        for d, (_, members) in zip(differences, counted)])
+                moves.append(((i + 1, state, changed, edits + (depth is not None)), '', [0] * width, 1))
+            for v, vowel in enumerate(constraints.vowels):
+                next_state, added = step(state, vowel)
+                changed = clamp(i, [d + insertable[c][v] for c, d in enumerate(differences)])
+                moves.append(((i, next_state, changed, edits + (depth is not None)), vowel, added, 1))
+
+        for target, char, added, edit in moves:
+            target_cost = add(cost, added, edit)
+            if target not in done and (target not in best or target_cost < best[target]):
+                best[target] = target_cost
+                back[target] = (node, char)
+                heapq.heappush(queue, (target_cost, order, target))
+                order += 1
+
+    raise ValueError(f"{input_word} has no candidates within {depth} edits.")
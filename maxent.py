@@ -0,0 +1,221 @@
+# maxent.py
+# Weighted constraints: Harmonic Grammar (HG) and Maximum Entropy (MaxEnt) grammars.
+# Every candidate of every tableau is one row of a single sparse violation matrix, so a candidate's
+# harmony is one matrix-vector product with the weights, and MaxEnt probabilities are a softmax
+# over each tableau's block of rows. Weights are fitted to observed output frequencies by
+# projected gradient descent on the negative log likelihood (weights can't go below zero), where
+# each step scores every candidate at once. Only the nonzero violation cells are touched, so a
+# step costs about as much as reading the violations once, even for hundreds of thousands of candidates.
+
+from collections import namedtuple
+
+import numpy as np
+
+import constraints
+from dataset import SparseMatrix
+
+# weights: one per constraint, in column order
+# log_likelihood: of the observed frequencies under those weights (without the prior)
+# iterations: the number of gradient steps taken
+# converged: whether the weights stopped changing before running out of steps
+FitResult = namedtuple('FitResult', ['weights', 'log_likelihood', 'iterations', 'converged'])
+
+
+class WeightedTableaux:
+    """
+    The candidates of many tableaux with their violations and observed frequencies, laid out
+    so weighted grammars can score all of them at once.
+
+    The candidates of tableau t are rows starts[t] to starts[t + 1] of the violation matrix.
+    """
+
+    def __init__(self, constraint_names, inputs, candidates, starts, violations, frequencies):
+        """
+        Args:
+            constraint_names (list of str): One per column.
+            inputs (list of str): The input of every tableau.
+            candidates (list of str): Every candidate, tableau by tableau.
+            starts (list of int): Where each tableau's candidates start, plus the total at the end.
+            violations (SparseMatrix): One row per candidate.
+            frequencies (array-like): How often each candidate was observed.
+        """
+        self.constraint_names = list(constraint_names)
+        self.inputs = list(inputs)
+        self.candidates = list(candidates)
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.violations = violations
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        if np.any(np.diff(self.starts) <= 0):
+            raise ValueError("Every tableau needs at least one candidate.")
+        if self.violations.shape != (len(self.candidates), len(self.constraint_names)):
+            raise ValueError("The violations need one row per candidate and one column per constraint.")
+        if np.any(self.frequencies < 0):
+            raise ValueError("Frequencies can't be negative.")
+        # The tableau of every candidate, and how many observations each tableau has
+        self.groups = np.repeat(np.arange(len(self.inputs)), np.diff(self.starts))
+        self.totals = np.add.reduceat(self.frequencies, self.starts[:-1]) if len(self.inputs) else np.zeros(0)
+        self._values = self.violations.values.astype(float)
+
+    @classmethod
+    def from_dataset(cls, dataset, frequencies=None):
+        """
+        Takes the tableaux of a dataset.Dataset.
+
+        Args:
+            dataset (dataset.Dataset): The tableaux and their violations.
+            frequencies (dict): Observed counts keyed by (input word, output word). Without it,
+                                each tableau's winner is counted once and its other candidates never.
+        """
+        inputs, candidates, matrices, counts = [], [], [], []
+        for tableau in dataset:
+            inputs.append(tableau.input_word)
+            candidates += tableau.candidates
+            matrices.append(tableau.violations)
+            if frequencies is None:
+                counts += [float(c == tableau.winner) for c in tableau.candidates]
+            else:
+                counts += [float(frequencies.get((tableau.input_word, c), 0)) for c in tableau.candidates]
+        width = len(dataset.constraints)
+        starts = np.concatenate([[0], np.cumsum([len(t.candidates) for t in dataset], dtype=np.int64)])
+        return cls([func.__name__ for func in dataset.constraints], inputs, candidates, starts,
+                   SparseMatrix.stack(matrices, width), counts)
+
+    @classmethod
+    def from_rows(cls, rows, constraint_set, batch_size=10000):
+        """
+        Scores (input word, output word, frequency) rows, one tableau per input.
+        Rows for the same pair are added up.
+
+        Args:
+            rows (iterable): (input word, output word, frequency) tuples, the frequency as a number or a string.
+            constraint_set (list): Constraint functions or their names, one per column.
+            batch_size (int): The number of candidates scored at a time.
+        """
+        functions = [constraints.get_constraint(c) if isinstance(c, str) else c for c in constraint_set]
+        tableaux = {}
+        for input_word, output_word, frequency in rows:
+            try:
+                frequency = float(frequency)
+            except ValueError:
+                raise ValueError(f"The frequency of {input_word} -> {output_word} isn't a number ({frequency}).")
+            outputs = tableaux.setdefault(input_word, {})
+            outputs[output_word] = outputs.get(output_word, 0.0) + frequency
+
+        pairs = [(input_word, output_word) for input_word, outputs in tableaux.items() for output_word in outputs]
+        matrices = []
+        for start in range(0, len(pairs), batch_size):
+            batch = pairs[start:start + batch_size]
+            matrices.append(SparseMatrix.from_dense(
+                constraints.evaluate_tableau([p[0] for p in batch], [p[1] for p in batch], functions)))
+        starts = np.concatenate([[0], np.cumsum([len(outputs) for outputs in tableaux.values()], dtype=np.int64)])
+        return cls([func.__name__ for func in functions], list(tableaux), [p[1] for p in pairs], starts,
+                   SparseMatrix.stack(matrices, len(functions)),
+                   [frequency for outputs in tableaux.values() for frequency in outputs.values()])
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def penalties(self, weights):
+        """The weighted sum of every candidate's violations (its harmony with the sign flipped)."""
+        weights = np.asarray(weights, dtype=float)
+        return np.bincount(self.violations.rows, self._values * weights[self.violations.cols],
+                           minlength=len(self.candidates))
+
+    def harmony(self, weights):
+        """
+        The harmony of every candidate: minus the weighted sum of its violations, so the
+        best candidate of a tableau has the highest harmony.
+        """
+        return -self.penalties(weights)
+
+    def probabilities(self, weights):
+        """
+        The MaxEnt probability of every candidate within its tableau: exp(harmony), normalized per tableau.
+        """
+        harmony = self.harmony(weights)
+        # Shifting each tableau by its best harmony keeps exp() from overflowing
+        harmony -= np.maximum.reduceat(harmony, self.starts[:-1])[self.groups]
+        scores = np.exp(harmony)
+        return scores / np.add.reduceat(scores, self.starts[:-1])[self.groups]
+
+    def log_likelihood(self, weights):
+        """The log likelihood of the observed frequencies under the MaxEnt grammar with these weights."""
+        observed = self.frequencies > 0
+        return float(self.frequencies[observed] @ np.log(self.probabilities(weights)[observed]))
+
+    def optimal(self, weights):
+        """
+        The HG winners: True for every candidate with the highest harmony in its tableau
+        (more than one when they tie).
+        """
+        harmony = self.harmony(weights)
+        best = np.maximum.reduceat(harmony, self.starts[:-1])[self.groups]
+        return np.isclose(harmony, best, rtol=0, atol=1e-9)
+
+    def winners(self, weights):
+        """The HG winners of each tableau as a tuple of output words, in the order of the inputs."""
+        optimal = self.optimal(weights)
+        return [tuple(c for c, best in zip(self.candidates[start:end], optimal[start:end]) if best)
+                for start, end in zip(self.starts[:-1], self.starts[1:])]
+
+    def _objective(self, weights, sigma):
+        # Negative log likelihood (plus a Gaussian prior when sigma is given) and its gradient.
+        # The gradient for constraint k is how much more the observed candidates violate it
+        # than the grammar expects them to: sum over candidates of (frequency - total * p) * violations
+        probabilities = self.probabilities(weights)
+        observed = self.frequencies > 0
+        loss = -float(self.frequencies[observed] @ np.log(probabilities[observed]))
+        residual = self.frequencies - self.totals[self.groups] * probabilities
+        gradient = np.bincount(self.violations.cols, self._values * residual[self.violations.rows],
+                               minlength=len(self.constraint_names))
+        if sigma:
+            loss += float(weights @ weights) / (2 * sigma ** 2)
+            gradient = gradient + weights / sigma ** 2
+        return loss, gradient
+
+    def fit(self, weights=None, sigma=None, max_iterations=1000, tolerance=1e-6):
+        """
+        Finds the non-negative weights that make the observed frequencies most likely under a MaxEnt grammar.
+
+        Each step moves every weight against the gradient at once, with the step size set from the
+        last two steps (Barzilai-Borwein) and halved until the objective actually goes down.
+        Weights that would go below zero are set to zero.
+
+        Args:
+            weights (array-like): Where to start, defaults to every weight at 0.
+            sigma (float): The standard deviation of a Gaussian prior centred on 0, which keeps
+                           weights from growing without bound when some candidate can be ruled out
+                           completely. None for no prior.
+            max_iterations (int): The most gradient steps to take.
+            tolerance (float): Stop when no weight moves more than this in a step.
+
+        Returns:
+            FitResult: The weights, the log likelihood they give, the steps taken and whether they converged.
+        """
+        width = len(self.constraint_names)
+        weights = np.zeros(width) if weights is None else np.maximum(np.asarray(weights, dtype=float), 0)
+        if width == 0 or not len(self.inputs):
+            return FitResult(weights, self.log_likelihood(weights) if len(self.inputs) else 0.0, 0, True)
+
+        loss, gradient = self._objective(weights, sigma)
+        step = 1.0 / max(self.frequencies.sum(), 1.0)
+        converged = False
+        iteration = 0
+        for iteration in range(1, max_iterations + 1):
+            # Backtracking: halve the step until the loss drops by enough (Armijo condition)
+            while True:
+                candidate = np.maximum(weights - step * gradient, 0)
+                candidate_loss, candidate_gradient = self._objective(candidate, sigma)
+                if candidate_loss <= loss + 1e-4 * gradient @ (candidate - weights) or step < 1e-12:
+                    break
+                step /= 2
+            moved = candidate - weights
+            change = candidate_gradient - gradient
+            weights, loss, gradient = candidate, candidate_loss, candidate_gradient
+            if np.abs(moved).max() < tolerance:
+                converged = True
+                break
+            curvature = moved @ change
+            step = float(moved @ moved / curvature) if curvature > 0 else step * 2
+
+        return FitResult(weights, self.log_likelihood(weights), iteration, converged)
@@ -0,0 +1,553 @@
+# opti_cli.py
+# Command-line mode for scoring large corpora of word pairs without the GUI.
+# Pairs are streamed from CSV or JSONL (a file or stdin), scored in fixed-size batches
+# and written straight back out, so memory use doesn't grow with the size of the input.
+#
+# Examples:
+#   python opti_cli.py pairs.csv --constraints starCC,noDeleteVowel > violations.csv
+#   cat pairs.jsonl | python opti_cli.py --format jsonl
+#   python opti_cli.py winner_loser.csv --rcd
+#   python opti_cli.py lexicon.csv --gen --workers 8
+#   python opti_cli.py lexicon.csv --typology --constraints starCC,noDeleteVowel,noDeleteConsonant
+#   python opti_cli.py lexicon.csv --gen --save lexicon.otab
+#   python opti_cli.py --load lexicon.otab --typology
+#   python opti_cli.py frequencies.csv --maxent --sigma 10
+#   python opti_cli.py frequencies.csv --gla --steps 100000 --seed 1
+#   python opti_cli.py words.txt --optimize --constraints starCCV,noDeleteConsonant,starVV,noDeleteVowel
+
+import argparse
+import csv
+import json
+import sys
+from itertools import islice
+
+# Everything else (NumPy included) is imported by the mode that needs it, so plain scoring
+# and --list don't pay for the rest at startup
+import constraints
+
+
+def detect_format(path):
+    """Guesses the format of a file from its extension, defaulting to CSV."""
+    if path and path.lower().endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return 'csv'
+
+
+def read_rows(stream, fmt, fields):
+    """
+    Lazily reads rows from a CSV or JSONL stream.
+
+    CSV rows are read by position and a header row starting with the first field name is skipped.
+    JSONL records are read by key.
+
+    Args:
+        stream (file): The stream to read from.
+        fmt (str): Either 'csv' or 'jsonl'.
+        fields (list of str): The names of the fields to read, e.g. ['input', 'output'].
+
+    Yields:
+        tuple: One tuple of strings per row.
+    """
+    if fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            try:
+                yield tuple(str(record[field]) for field in fields)
+            except KeyError as e:
+                raise ValueError(f"Line {line_number} is missing the field {e}.")
+    else:
+        for line_number, row in enumerate(csv.reader(stream), start=1):
+            if not row:
+                continue
+            if line_number == 1 and row[0].strip().lower() == fields[0]:
+                continue
+            if len(row) < len(fields):
+                raise ValueError(f"Line {line_number} needs {len(fields)} columns ({', '.join(fields)}).")
+            yield tuple(value.strip() for value in row[:len(fields)])
+
+
+def batches(rows, size):
+    """Splits an iterable of rows into lists of at most 'size' rows."""
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def write_violations(rows, functions, out, fmt, batch_size):
+    """
+    Scores (input, output) rows in batches and streams one violation row per pair to 'out'.
+
+    Returns:
+        int: The number of rows written.
+    """
+    names = [func.__name__ for func in functions]
+    writer = csv.writer(out) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(['input', 'output'] + names)
+
+    count = 0
+    for batch in batches(rows, batch_size):
+        matrix = constraints.evaluate_tableau([row[0] for row in batch], [row[1] for row in batch], functions)
+        for (input_word, output_word), violations in zip(batch, matrix.tolist()):
+            if writer:
+                writer.writerow([input_word, output_word] + violations)
+            else:
+                out.write(json.dumps({'input': input_word, 'output': output_word,
+                                      'violations': dict(zip(names, violations))}) + '\n')
+        count += len(batch)
+    return count
+
+
+def write_gen_violations(input_words, functions, out, fmt, workers, chunksize, depth=1):
+    """
+    Runs gen() on every input word across a process pool and streams a violation row
+    for every candidate to 'out', in the order the input words were read.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import parallel
+    names = [func.__name__ for func in functions]
+    writer = csv.writer(out) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(['input', 'output'] + names)
+
+    count = 0
+    for input_word, candidates, matrix in parallel.evaluate_lexicon(input_words, functions, workers, chunksize, depth):
+        for output_word, violations in zip(candidates, matrix.tolist()):
+            if writer:
+                writer.writerow([input_word, output_word] + violations)
+            else:
+                out.write(json.dumps({'input': input_word, 'output': output_word,
+                                      'violations': dict(zip(names, violations))}) + '\n')
+        count += len(candidates)
+    return count
+
+
+def write_optimal(input_words, functions, out, fmt, depth=None):
+    """
+    Finds the optimal output of every input word under the ranking 'functions' (highest first)
+    with lattice.optimal_candidate() and streams it to 'out' with its violations.
+
+    Returns:
+        int: The number of rows written.
+    """
+    import lattice
+    names = [func.__name__ for func in functions]
+    writer = csv.writer(out) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(['input', 'output'] + names)
+
+    count = 0
+    for input_word in input_words:
+        optimum = lattice.optimal_candidate(input_word, functions, depth)
+        if writer:
+            writer.writerow([input_word, optimum.output] + optimum.violations)
+        else:
+            out.write(json.dumps({'input': input_word, 'output': optimum.output,
+                                  'violations': dict(zip(names, optimum.violations))}) + '\n')
+        count += 1
+    return count
+
+
+def save_violations(rows, functions, path, batch_size):
+    """
+    Scores (input, output) rows in batches and saves them to a binary tableau file.
+    Consecutive rows with the same input make up one tableau.
+
+    Returns:
+        int: The number of rows saved.
+    """
+    import storage
+    count = 0
+    tableau = None  # [input word, candidates, violation rows] of the tableau being gathered
+    with storage.TableauWriter(path, [func.__name__ for func in functions]) as writer:
+        for batch in batches(rows, batch_size):
+            matrix = constraints.evaluate_tableau([row[0] for row in batch], [row[1] for row in batch], functions)
+            for (input_word, output_word), violations in zip(batch, matrix):
+                if tableau is None or tableau[0] != input_word:
+                    if tableau is not None:
+                        writer.add(*tableau)
+                    tableau = [input_word, [], []]
+                tableau[1].append(output_word)
+                tableau[2].append(violations)
+            count += len(batch)
+        if tableau is not None:
+            writer.add(*tableau)
+    return count
+
+
+def save_gen_violations(input_words, functions, path, workers, chunksize, depth=1):
+    """
+    Runs gen() on every input word across a process pool and saves every tableau to a binary tableau file.
+
+    Returns:
+        int: The number of candidates saved.
+    """
+    import parallel
+    import storage
+    count = 0
+    with storage.TableauWriter(path, [func.__name__ for func in functions]) as writer:
+        for input_word, candidates, matrix in parallel.evaluate_lexicon(input_words, functions, workers, chunksize, depth):
+            writer.add(input_word, candidates, matrix)
+            count += len(candidates)
+    return count
+
+
+def write_stored_violations(stored, names, out, fmt, batch_size):
+    """
+    Streams the violations saved in a file to 'out', the same way write_violations() would have written them.
+
+    Returns:
+        int: The number of rows written.
+    """
+    columns = stored.columns(names)
+    names = [stored.constraint_names[j] for j in columns]
+    writer = csv.writer(out) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(['input', 'output'] + names)
+
+    count = 0
+    for input_word, output_word, row in stored.rows(batch_size):
+        violations = [row[j] for j in columns]
+        if writer:
+            writer.writerow([input_word, output_word] + violations)
+        else:
+            out.write(json.dumps({'input': input_word, 'output': output_word,
+                                  'violations': dict(zip(names, violations))}) + '\n')
+        count += 1
+    return count
+
+
+def stored_rcd(stored, names):
+    """
+    Runs RCD over the ERC rows saved in a file, without scoring anything.
+
+    Returns:
+        tuple: The RCDResult over the distinct ERC rows, the names of its columns, the number of pairs
+               and the distinct ERC rows.
+    """
+    import numpy as np
+    columns = stored.columns(names)
+    erc = np.asarray(stored.array('erc'))[:, columns]
+    unique_rows = np.unique(erc, axis=0).reshape(-1, len(columns))
+    return constraints.rcd(unique_rows), [stored.constraint_names[j] for j in columns], len(erc), unique_rows
+
+
+def stream_rcd(rows, functions, batch_size):
+    """
+    Runs RCD over a stream of (input, winner, loser) rows.
+
+    Only the distinct ERC rows are kept, and there can be at most 3 to the power of the
+    number of constraints of those, so memory stays bounded however long the stream is.
+
+    Returns:
+        tuple: The RCDResult over the distinct ERC rows, the number of pairs read and the distinct ERC rows.
+    """
+    import numpy as np
+    seen = set()
+    unique_rows = []
+    count = 0
+    for batch in batches(rows, batch_size):
+        erc = constraints.erc_matrix(batch, functions)
+        for erc_row in np.unique(erc, axis=0):
+            key = erc_row.tobytes()
+            if key not in seen:
+                seen.add(key)
+                unique_rows.append(erc_row)
+        count += len(batch)
+
+    erc = np.array(unique_rows, dtype=np.int8).reshape(len(unique_rows), len(functions))
+    return constraints.rcd(erc), count, erc
+
+
+def print_rcd(result, names, count, out):
+    """Writes the stratification found by RCD in a readable form."""
+    out.write(f"RCD over {count} winner-loser pairs\n")
+    for i, stratum in enumerate(result.strata, start=1):
+        out.write(f"Stratum {i}: " + ", ".join(names[j] for j in stratum) + "\n")
+    if not result.consistent:
+        out.write("Inconsistent, couldn't rank: " + ", ".join(names[j] for j in result.unranked) + "\n")
+        out.write(f"{len(result.unexplained)} distinct winner-loser comparisons are left unexplained\n")
+
+
+def print_maxent(result, data, out):
+    """Writes the weights fitted by WeightedTableaux.fit(), heaviest first."""
+    import numpy as np
+    out.write(f"MaxEnt weights over {len(data)} tableaux and {len(data.candidates)} candidates\n")
+    for j in np.argsort(-result.weights, kind='stable'):
+        out.write(f"{data.constraint_names[j]}: {result.weights[j]:.4f}\n")
+    out.write(f"Log likelihood: {result.log_likelihood:.4f}\n")
+    if not result.converged:
+        out.write(f"Stopped after {result.iterations} steps without converging\n")
+
+
+def print_gla(result, distribution, data, out):
+    """Writes the ranking values learned by the GLA, its learning curve and the outputs they produce."""
+    import numpy as np
+    out.write(f"GLA ranking values over {len(data)} tableaux\n")
+    for j in np.argsort(-result.ranking, kind='stable'):
+        out.write(f"{data.constraint_names[j]}: {result.ranking[j]:.3f}\n")
+    out.write("\nLearning curve (data seen, error rate)\n")
+    for point in result.curve:
+        out.write(f"{point.step}: {point.error_rate:.4f}\n")
+    out.write("\n")
+    writer = csv.writer(out)
+    writer.writerow(['input', 'output', 'observed', 'predicted'])
+    observed = data.frequencies / np.maximum(data.totals, 1e-12)[data.groups]
+    for t, input_word in enumerate(data.inputs):
+        for i in range(data.starts[t], data.starts[t + 1]):
+            writer.writerow([input_word, data.candidates[i], f"{observed[i]:.4f}", f"{distribution[i]:.4f}"])
+
+
+def print_basis(erc, names, out):
+    """Writes the ERC basis of some distinct ERC rows (see entailment.basis()), one row per line."""
+    import numpy as np
+    import entailment
+    keep = entailment.basis(erc)
+    out.write(f"\nBasis of {len(keep)} ERCs out of {len(erc)} distinct ones\n")
+    for i in keep:
+        row = erc[i]
+        out.write("W: " + ", ".join(names[j] for j in np.flatnonzero(row == constraints.ERC_W))
+                  + "  L: " + ", ".join(names[j] for j in np.flatnonzero(row == constraints.ERC_L)) + "\n")
+
+
+def build_typology(input_words, functions, workers, chunksize, depth=1):
+    """
+    Runs gen() on every input word and works out the factorial typology of the candidates.
+
+    Returns:
+        tuple: The list of typology.Language and the number of inputs.
+    """
+    from dataset import Dataset
+    import parallel
+    import typology
+    data = Dataset(functions)
+    for input_word, candidates, matrix in parallel.evaluate_lexicon(input_words, functions, workers, chunksize, depth):
+        data.add(input_word, candidates, violations=matrix)
+    return typology.factorial_typology(data, workers), len(data)
+
+
+def print_typology(languages, count, out):
+    """Writes every language of a factorial typology with a ranking that produces it."""
+    out.write(f"{len(languages)} languages over {count} inputs\n")
+    for i, language in enumerate(languages, start=1):
+        out.write(f"\nLanguage {i}: " + ", ".join("/".join(winners) for winners in language.winners) + "\n")
+        out.write("  Ranking: " + " >> ".join("{" + ", ".join(func.__name__ for func in stratum) + "}"
+                                            for stratum in language.strata) + "\n")
+
+
+def positive_int(value):
+    """An argparse type for ints of at least 1."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} isn't 1 or more")
+    return number
+
+
+def non_negative_int(value):
+    """An argparse type for ints of at least 0."""
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"{value} is negative")
+    return number
+
+
+def positive_float(value):
+    """An argparse type for numbers above 0."""
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(f"{value} isn't above 0")
+    return number
+
+
+def non_negative_float(value):
+    """An argparse type for numbers of at least 0."""
+    number = float(value)
+    if not number >= 0:
+        raise argparse.ArgumentTypeError(f"{value} is negative")
+    return number
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score (input, output) word pairs against Optimality Theory constraints.")
+    parser.add_argument('file', nargs='?', help="CSV or JSONL file to read pairs from (defaults to stdin)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'],
+                        help="input and output format (guessed from the file extension if left out)")
+    parser.add_argument('--constraints', help="comma separated constraint names (defaults to all of them)")
+    parser.add_argument('--rcd', action='store_true',
+                        help="read (input, winner, loser) rows and run Recursive Constraint Demotion over the whole stream")
+    parser.add_argument('--basis', action='store_true',
+                        help="with --rcd, also list the ERC basis: the comparisons none of the others entail")
+    parser.add_argument('--gen', action='store_true',
+                        help="read input words only and score every candidate gen() makes for them")
+    parser.add_argument('--typology', action='store_true',
+                        help="read input words only and list every language the constraints can produce (factorial typology)")
+    parser.add_argument('--maxent', action='store_true',
+                        help="read (input, output, frequency) rows and fit MaxEnt constraint weights to the frequencies")
+    parser.add_argument('--sigma', type=float, default=None,
+                        help="standard deviation of the Gaussian prior on --maxent weights (no prior by default)")
+    parser.add_argument('--gla', action='store_true',
+                        help="read (input, output, frequency) rows, learn Stochastic OT ranking values with the "
+                             "Gradual Learning Algorithm and show the output distribution they produce")
+    parser.add_argument('--steps', type=non_negative_int, default=100000, help="learning data the GLA goes through")
+    parser.add_argument('--plasticity', type=positive_float, default=0.1, help="how far the GLA moves a constraint on each error")
+    parser.add_argument('--noise', type=non_negative_float, default=2.0, help="standard deviation of the Stochastic OT evaluation noise")
+    parser.add_argument('--update-batch', type=positive_int, default=1,
+                        help="GLA learning data evaluated between ranking updates (1 is the classic GLA)")
+    parser.add_argument('--trials', type=positive_int, default=10000, help="evaluations of each tableau when simulating the GLA grammar")
+    parser.add_argument('--seed', type=int, default=None, help="seed for the GLA so runs can be repeated")
+    parser.add_argument('--save', metavar='FILE',
+                        help="save the scored tableaux to a binary FILE instead of writing them out (with --gen or plain pairs)")
+    parser.add_argument('--load', metavar='FILE',
+                        help="read tableaux saved with --save instead of scoring anything (works with --rcd, --typology, --maxent and --gla too)")
+    parser.add_argument('--optimize', action='store_true',
+                        help="read input words only and find each one's optimal output under the --constraints ranking "
+                             "(highest first) without generating the candidates")
+    parser.add_argument('--depth', type=non_negative_int, default=None,
+                        help="largest number of edits in a candidate (defaults to 1 with --gen, no limit with --optimize)")
+    parser.add_argument('--workers', type=positive_int, default=None,
+                        help="number of worker processes for --gen and --typology (defaults to the number of CPUs)")
+    parser.add_argument('--chunk-size', type=positive_int, default=32, help="input words sent to a --gen worker at a time")
+    parser.add_argument('--batch-size', type=positive_int, default=10000, help="number of rows scored at a time")
+    parser.add_argument('--cache', type=int, default=0, metavar='SIZE',
+                        help="keep up to SIZE results in the shared constraint cache (off by default)")
+    parser.add_argument('--profile', action='store_true',
+                        help="time every constraint and print a report to stderr at the end "
+                             "(only scoring done in this process counts, so use --workers 1 with --gen and --typology)")
+    parser.add_argument('--list', action='store_true', help="list the available constraints and exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    out = sys.stdout
+
+    if args.list:
+        for name in constraints.available_constraints():
+            out.write(name + "\n")
+        return 0
+
+    names = [name.strip() for name in args.constraints.split(',') if name.strip()] if args.constraints else None
+
+    if args.profile:
+        constraints.enable_profiling()
+    try:
+        return run(args, names, out)
+    finally:
+        if args.profile:
+            print(constraints.format_profile(constraints.profile_stats()), file=sys.stderr)
+
+
+def run_gla(data, args, out):
+    """Learns ranking values with the GLA and simulates the grammar they make, with the options given."""
+    import stochastic
+    # The learner and the simulation get different seeds, so their noise isn't the same draws
+    result = stochastic.learn(data, plasticity=args.plasticity, noise=args.noise, steps=args.steps,
+                              batch_size=args.update_batch, seed=args.seed)
+    distribution = stochastic.simulate(data, result.ranking, args.noise, args.trials,
+                                       None if args.seed is None else args.seed + 1)
+    print_gla(result, distribution, data, out)
+
+
+def run(args, names, out):
+    """Does whatever the parsed arguments ask for, writing the results to 'out'."""
+    if args.load:
+        # Saved tableaux already have their violations, so the constraints only need to be
+        # registered when a dataset is built from them
+        import numpy as np
+        from dataset import Dataset
+        import storage
+        stored = storage.load(args.load)
+        fmt = args.format or 'csv'
+        if (args.rcd or args.maxent) and not np.any(np.asarray(stored.array('winners')) >= 0):
+            # Without winners there are no winner-loser pairs and nothing observed to fit
+            mode = '--rcd' if args.rcd else '--maxent'
+            raise ValueError(f"{args.load} has no winners, so there is nothing for {mode} to learn from.")
+        if args.rcd:
+            result, stored_names, count, erc = stored_rcd(stored, names)
+            print_rcd(result, stored_names, count, out)
+            if args.basis:
+                print_basis(erc, stored_names, out)
+        elif args.typology:
+            import typology
+            data = Dataset.load(args.load, names)
+            print_typology(typology.factorial_typology(data, args.workers), len(data), out)
+        elif args.maxent:
+            # Each saved winner counts as one observation
+            from maxent import WeightedTableaux
+            data = WeightedTableaux.from_dataset(Dataset.load(args.load, names))
+            print_maxent(data.fit(sigma=args.sigma), data, out)
+        elif args.gla:
+            from maxent import WeightedTableaux
+            run_gla(WeightedTableaux.from_dataset(Dataset.load(args.load, names)), args, out)
+        else:
+            write_stored_violations(stored, names, out, fmt, args.batch_size)
+        return 0
+
+    # Constraints from plugins are loaded as they are looked up
+    functions = [constraints.get_constraint(name) for name in names or constraints.available_constraints()]
+
+    if args.cache:
+        constraints.enable_cache(args.cache)
+
+    if args.optimize and not names:
+        raise ValueError("--optimize needs a ranking: give --constraints, highest ranked first.")
+    depth = 1 if args.depth is None else args.depth
+
+    fmt = args.format or detect_format(args.file)
+    stream = open(args.file, newline='', encoding='utf-8') if args.file else sys.stdin
+    try:
+        if args.rcd:
+            rows = read_rows(stream, fmt, ['input', 'winner', 'loser'])
+            result, count, erc = stream_rcd(rows, functions, args.batch_size)
+            print_rcd(result, [func.__name__ for func in functions], count, out)
+            if args.basis:
+                print_basis(erc, [func.__name__ for func in functions], out)
+        elif args.typology:
+            input_words = (row[0] for row in read_rows(stream, fmt, ['input']))
+            languages, count = build_typology(input_words, functions, args.workers, args.chunk_size, depth)
+            print_typology(languages, count, out)
+        elif args.maxent:
+            from maxent import WeightedTableaux
+            rows = read_rows(stream, fmt, ['input', 'output', 'frequency'])
+            data = WeightedTableaux.from_rows(rows, functions, args.batch_size)
+            print_maxent(data.fit(sigma=args.sigma), data, out)
+        elif args.gla:
+            from maxent import WeightedTableaux
+            rows = read_rows(stream, fmt, ['input', 'output', 'frequency'])
+            data = WeightedTableaux.from_rows(rows, functions, args.batch_size)
+            run_gla(data, args, out)
+        elif args.optimize:
+            input_words = (row[0] for row in read_rows(stream, fmt, ['input']))
+            write_optimal(input_words, functions, out, fmt, args.depth)
+        elif args.gen:
+            input_words = (row[0] for row in read_rows(stream, fmt, ['input']))
+            if args.save:
+                save_gen_violations(input_words, functions, args.save, args.workers, args.chunk_size, depth)
+            else:
+                write_gen_violations(input_words, functions, out, fmt, args.workers, args.chunk_size, depth)
+        elif args.save:
+            rows = read_rows(stream, fmt, ['input', 'output'])
+            save_violations(rows, functions, args.save, args.batch_size)
+        else:
+            rows = read_rows(stream, fmt, ['input', 'output'])
+            write_violations(rows, functions, out, fmt, args.batch_size)
+    finally:
+        if args.file:
+            stream.close()
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except (ValueError, KeyError) as e:
+        print(f"An error occurred: {e}", file=sys.stderr)
+        sys.exit(1)
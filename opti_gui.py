@@ -1,14 +1,13 @@
 import sys
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QTableWidget, QTableWidgetItem, 
+from PyQt5.QtWidgets import (QApplication, QMainWindow, QTableView, 
                              QPushButton, QLineEdit, QVBoxLayout, QWidget, 
                              QLabel, QCheckBox, QHBoxLayout, QComboBox, 
-                             QGridLayout, QRadioButton, QSizePolicy, QSpacerItem
+                             QGridLayout, QRadioButton, QSizePolicy, QSpacerItem,
+                             QProgressBar, QFileDialog, QInputDialog
                             )
-from PyQt5 import QtGui
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThreadPool
 import constraints
-import inspect
-import qdarkstyle
+from table_models import ViolationTableModel, WinnerLoserTableModel, WordListModel, ProfileTableModel
 
 default_input = 'snow'
 default_output = ['snow', 'sno', 'sow', 'so', 'no']
@@ -17,12 +16,15 @@ class OTTableWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         
-        
-        self.constraints = [func.__name__ for func in constraints.get_constraint_functions()]
+        # Share one result cache between both tables so refreshes and winner changes reuse earlier scores
+        constraints.enable_cache()
+        # Only the names, plugin constraints get loaded once their checkbox is ticked
+        self.constraints = constraints.available_constraints()
         self.words = []  # To store input-output word pairs
         self.selected_constraints = []  # To store selected constraints
         self.inputWords = default_input
         self.outputWords = default_output
+        self.contendersOnly = False  # Hide candidates that are harmonically bounded
         self.initUI()
 
 
@@ -54,12 +56,24 @@ class OTTableWindow(QMainWindow):
         inputLayout.addWidget(addWordButton)
         addWordButton.setFixedWidth(200)
 
+        # Contenders only checkbox
+        contendersCheckBox = QCheckBox("Contenders only", self)
+        contendersCheckBox.stateChanged.connect(self.toggleContenders)
+        inputLayout.addWidget(contendersCheckBox)
+
+        # Profile checkbox, times every constraint and shows the numbers under the tables
+        profileCheckBox = QCheckBox("Profile constraints", self)
+        profileCheckBox.stateChanged.connect(self.toggleProfiling)
+        inputLayout.addWidget(profileCheckBox)
+
         row, col = 0, 0
         max_cols = 2
         max_rows = 6
         # Constraint checkboxes. Start activated.
+        self.constraintBoxes = {}
         for i, constraint_name in enumerate(self.constraints):
             checkBox = QCheckBox(constraint_name, self)
+            self.constraintBoxes[constraint_name] = checkBox
             checkBox.stateChanged.connect(self.updateSelectedConstraints)
             checkBox.setMaximumWidth(115)
             # set alignment to left
@@ -87,19 +101,35 @@ class OTTableWindow(QMainWindow):
         spacerItem = QSpacerItem(40, 20, QSizePolicy.Expanding, QSizePolicy.Minimum)
         topLayout.addItem(spacerItem)
 
-        # Table for showing data
-        self.tableWidget = QTableWidget(self)
+        # Table for showing data. The models hold the violation matrix and the views only draw what's on screen.
+        # Scoring runs on the global thread pool so the window stays responsive while big tables fill in
+        self.tableModel = ViolationTableModel(self, QThreadPool.globalInstance())
+        self.tableModel.progress.connect(self.showProgress)
+        self.tableModel.evaluationFailed.connect(self.showError)
+        self.wlModel = WinnerLoserTableModel(self.tableModel, self)
+        self.tableView = QTableView(self)
+        self.tableView.setModel(self.tableModel)
         self.updateTable()
 
-        # Winner Selection Dropdown
+        # Winner Selection Dropdown. It reads the candidates from a model so a loaded table's
+        # words are only decoded as the list shows them, and it isn't sized to fit all of them
+        self.winnerModel = WordListModel(self)
+        self.winnerModel.setWords(self.outputWords)
         self.winnerSelection = QComboBox(self)
-        self.winnerSelection.addItems(self.outputWords)
+        self.winnerSelection.setModel(self.winnerModel)
+        self.winnerSelection.setSizeAdjustPolicy(QComboBox.AdjustToMinimumContentsLengthWithIcon)
+        self.winnerSelection.view().setUniformItemSizes(True)
         self.winnerSelection.currentIndexChanged.connect(self.updateWLTable)
         # Change size of dropdown
         self.winnerSelection.setFixedWidth(200)
 
+        # Only show the Winner-Loser rows that don't follow from the others
+        reducedCheckBox = QCheckBox("Reduced Winner-Loser table", self)
+        reducedCheckBox.stateChanged.connect(self.toggleReduced)
+
         # Table for Winners/Losers table
-        self.tableWidget_WL = QTableWidget(self)
+        self.tableView_WL = QTableView(self)
+        self.tableView_WL.setModel(self.wlModel)
         self.updateWLTable()
 
         # Update Table button
@@ -112,14 +142,41 @@ class OTTableWindow(QMainWindow):
         clearTableButton.clicked.connect(self.clearTable)
         clearTableButton.setFixedWidth(200)
 
+        # Save and Load buttons, for tableaux in the binary format of storage.py
+        saveTableButton = QPushButton("Save Table", self)
+        saveTableButton.clicked.connect(self.saveTable)
+        saveTableButton.setFixedWidth(200)
+        loadTableButton = QPushButton("Load Table", self)
+        loadTableButton.clicked.connect(self.loadTable)
+        loadTableButton.setFixedWidth(200)
+        fileLayout = QHBoxLayout()
+        fileLayout.addWidget(saveTableButton)
+        fileLayout.addWidget(loadTableButton)
+        fileLayout.addStretch()
+
+        # Profiling panel, hidden until profiling is switched on
+        self.profileModel = ProfileTableModel(self)
+        self.profileView = QTableView(self)
+        self.profileView.setModel(self.profileModel)
+        self.profileView.setVisible(False)
+        self.tableModel.evaluationFinished.connect(self.profileModel.refresh)
+
+        # Progress of the tables being scored, hidden when there is nothing to do
+        self.progressBar = QProgressBar(self)
+        self.progressBar.setVisible(False)
+
         # Add widgets to layout
         mainLayout.addLayout(topLayout)
         mainLayout.addWidget(updateTableButton)
         mainLayout.addWidget(clearTableButton)
-        mainLayout.addWidget(self.tableWidget)
+        mainLayout.addLayout(fileLayout)
+        mainLayout.addWidget(self.progressBar)
+        mainLayout.addWidget(self.tableView)
         mainLayout.addWidget(QLabel("Select Winner:"))
         mainLayout.addWidget(self.winnerSelection)
-        mainLayout.addWidget(self.tableWidget_WL)
+        mainLayout.addWidget(reducedCheckBox)
+        mainLayout.addWidget(self.tableView_WL)
+        mainLayout.addWidget(self.profileView)
 
         # Set the layout
         container = QWidget()
@@ -129,119 +186,136 @@ class OTTableWindow(QMainWindow):
     def addWordPair(self):
         input_word = self.inputWord.text()
         output_word = self.outputWord.text()
-        if input_word:
-            self.inputWords = input_word
+        if not input_word or not output_word:
+            self.statusBar().showMessage("Type both an input and an output word to add them.")
+            return
+        # A loaded table's words are read from its file, so take a copy before changing them
+        self.outputWords = list(self.outputWords)
+        self.inputWords = input_word
         #check if input word is in output word list. If not, add it to first index
         if input_word not in self.outputWords:
             self.outputWords.insert(0, input_word)
 
-        if output_word:
-            self.outputWords.append(output_word)  # Use the correct variable name
-            self.outputWord.clear()
-            self.winnerSelection.clear()
-            self.winnerSelection.addItems(self.outputWords)
+        self.outputWords.append(output_word)  # Use the correct variable name
+        self.outputWord.clear()
+        self.winnerModel.setWords(self.outputWords)
+        self.winnerSelection.setCurrentIndex(0)
         self.updateTable()
         self.updateWLTable()
 
     def updateSelectedConstraints(self, state):
+        # Only the constraint that was toggled gets scored, the other columns stay as they are
         sender = self.sender()
         if state == 2:  # Checked
             if sender.text() not in self.selected_constraints:
                 self.selected_constraints.append(sender.text())
+                self.tableModel.addConstraint(sender.text())
         elif state == 0:  # Unchecked
             if sender.text() in self.selected_constraints:
                 self.selected_constraints.remove(sender.text())
-        self.updateTable()
-        self.updateWLTable()
+                self.tableModel.removeConstraint(sender.text())
+
+    def showProgress(self, done, total):
+        self.progressBar.setVisible(done < total)
+        self.progressBar.setMaximum(max(total, 1))
+        self.progressBar.setValue(done)
+
+    def showError(self, message):
+        self.statusBar().showMessage(f"An error occurred: {message}")
+
+    def toggleContenders(self, state):
+        self.contendersOnly = state == 2
+        self.tableModel.setContendersOnly(self.contendersOnly)
+
+    def toggleReduced(self, state):
+        self.wlModel.setReduced(state == 2)
+
+    def toggleProfiling(self, state):
+        # Switching it off throws the numbers away, so switching it back on starts afresh
+        if state == 2:
+            constraints.enable_profiling()
+        else:
+            constraints.disable_profiling()
+        self.profileView.setVisible(state == 2)
+        self.profileModel.refresh()
 
     def clearTable(self):
         #clear default words
         self.inputWords = ''
         self.outputWords = []
+        self.winnerModel.setWords([])
+        self.updateTable()
+        self.updateWLTable()
 
-        self.tableWidget.clearContents()
-        self.tableWidget.setRowCount(0)
-        self.tableWidget_WL.clearContents()
-        self.tableWidget_WL.setRowCount(0)
-    
+    def saveTable(self):
+        if self.tableModel.isBusy():
+            self.statusBar().showMessage("The table is still being scored, save it once it has finished.")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Table", "", "Tableaux (*.otab);;All Files (*)")
+        if not path:
+            return
+        import storage
+        model = self.tableModel
+        winner = self.winnerSelection.currentText()
+        try:
+            storage.save(path, [(model.inputWord, model.outputWords, model.matrix,
+                                 winner if winner in model.outputWords else None)], model.constraintNames)
+        except (OSError, ValueError) as e:
+            self.showError(str(e))
+            return
+        self.statusBar().showMessage(f"Saved {path}")
+
+    def loadTable(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Table", "", "Tableaux (*.otab);;All Files (*)")
+        if not path:
+            return
+        import storage
+        try:
+            stored = storage.load(path)
+        except (OSError, ValueError) as e:
+            self.showError(str(e))
+            return
+        if not len(stored):
+            self.showError(f"{path} has no tableaux in it.")
+            return
+        index = 0
+        if len(stored) > 1:
+            # The table shows one input at a time, so ask which one
+            inputs = list(stored.inputs())
+            chosen, ok = QInputDialog.getItem(self, "Load Table", "Input:", inputs, 0, False)
+            if not ok:
+                return
+            index = inputs.index(chosen)
+        tableau = stored[index]
+
+        # The stored violations are shown as they are, nothing gets scored again
+        self.inputWords = tableau.input_word
+        self.outputWords = tableau.candidates
+        self.selected_constraints = list(stored.constraint_names)
+        for name, checkBox in self.constraintBoxes.items():
+            checkBox.blockSignals(True)
+            checkBox.setChecked(name in self.selected_constraints)
+            checkBox.blockSignals(False)
+        self.tableModel.contendersOnly = self.contendersOnly
+        self.tableModel.loadTableau(tableau.input_word, tableau.candidates, stored.constraint_names, tableau.violations)
+
+        self.winnerSelection.blockSignals(True)
+        self.winnerModel.setWords(tableau.candidates)
+        winnerRow = self.winnerModel.row(tableau.winner) if tableau.winner is not None else -1
+        self.winnerSelection.setCurrentIndex(max(winnerRow, 0))
+        self.winnerSelection.blockSignals(False)
+        self.updateWLTable()
+        self.statusBar().showMessage(f"Loaded {path}")
 
     def updateWLTable(self):
-        # Set table dimensions
-        self.tableWidget_WL.setRowCount(len(self.outputWords) - 1)  # Exclude the winner word
-        self.tableWidget_WL.setColumnCount(len(self.selected_constraints) + 2)  # Additional columns for Winner and Loser
-
-        # Set table headers
-        headers = ["Selected Winner", "Loser"] + self.selected_constraints
-        self.tableWidget_WL.setHorizontalHeaderLabels(headers)
-
-        selected_winner = self.winnerSelection.currentText()
-        loser_words = [word for word in self.outputWords if word != selected_winner]
-
-        row = 0
-        for loser_word in loser_words:
-            # Set Winner and Loser words in each row
-            self.tableWidget_WL.setItem(row, 0, QTableWidgetItem(selected_winner))
-            self.tableWidget_WL.setItem(row, 1, QTableWidgetItem(loser_word))
-
-            # Compare each constraint against Winner and Loser
-            for j, constraint_name in enumerate(self.selected_constraints, start=2):
-                constraint_func = getattr(constraints, constraint_name)
-                num_args = len(inspect.signature(constraint_func).parameters)
-
-                if num_args == 1:
-                    favours_winner = constraint_func(selected_winner)
-                    favours_loser = constraint_func(loser_word)
-                elif num_args == 2:
-                    favours_winner = constraint_func(self.inputWords, selected_winner)
-                    favours_loser = constraint_func(self.inputWords, loser_word)
-                else:
-                    raise ValueError(f"Constraint function {constraint_name} has an unexpected number of arguments.")
-
-                if favours_winner and not favours_loser:
-                    self.tableWidget_WL.setItem(row, j, QTableWidgetItem("Winner"))
-                    self.tableWidget_WL.item(row, j).setBackground(QtGui.QColor(0, 255, 0))  # Green for Winner
-                elif not favours_winner and favours_loser:
-                    self.tableWidget_WL.setItem(row, j, QTableWidgetItem("Loser"))
-                    self.tableWidget_WL.item(row, j).setBackground(QtGui.QColor(255, 0, 0))  # Red for Loser
-                else:
-                    self.tableWidget_WL.setItem(row, j, QTableWidgetItem("E"))
-
-
-            row += 1
-
+        # The Winner-Loser table follows the violation table, so a new winner only redoes the comparisons
+        self.wlModel.setWinner(self.winnerSelection.currentText())
 
     def updateTable(self):
-        # Set table dimensions
-        self.tableWidget.setRowCount(len(self.outputWords))
-        self.tableWidget.setColumnCount(len(self.selected_constraints) + 2)  # Additional columns for input and output words
-
-        # Set table headers
-        headers = ["Input", "Output"] + self.selected_constraints
-        self.tableWidget.setHorizontalHeaderLabels(headers)
-
-        # Populate the table
-        for i, output_word in enumerate(self.outputWords):
-            self.tableWidget.setItem(i, 0, QTableWidgetItem(self.inputWords))
-            self.tableWidget.setItem(i, 1, QTableWidgetItem(output_word))
-
-            # Calculate constraint violations
-            for j, constraint_name in enumerate(self.selected_constraints, start=2):
-                # Retrieve the function object using its name
-                constraint_func = getattr(constraints, constraint_name)
-                
-                # Check the number of arguments the constraint function expects
-                num_args = len(inspect.signature(constraint_func).parameters)
-                
-                # Call the constraint function with the correct number of arguments
-                if num_args == 1:
-                    violation_count = constraint_func(output_word)
-                elif num_args == 2:
-                    violation_count = constraint_func(self.inputWords, output_word)
-                else:
-                    raise ValueError(f"Constraint function {constraint_name} has an unexpected number of arguments.")
-                
-                # Set the item in the table (assuming you want to display the violation count)
-                self.tableWidget.setItem(i, j, QTableWidgetItem(str(violation_count)))
+        # Score the whole table again, cancelling whatever was still being scored.
+        # The Winner-Loser table updates along with it.
+        self.tableModel.contendersOnly = self.contendersOnly
+        self.tableModel.setTableau(self.inputWords, self.outputWords, self.selected_constraints)
 
 custom_stylesheet = """
 QWidget {
@@ -292,17 +366,17 @@ QCheckBox::indicator:checked {
     image: url(:/checkbox_checked.svg); /* Custom image for checked state */
 }
 
-QTableWidget {
+QTableView {
     gridline-color: #444; /* Color of grid lines in tables */
     border: 1px solid #222; /* Table border */
 }
 
-QTableWidget::item {
+QTableView::item {
     padding: 5px; /* Padding for table items */
     border: 1px solid #222; /* Table item border */
 }
 
-QTableWidget::item:selected {
+QTableView::item:selected {
     background-color: #404040; /* Selected item background color */
     color: #D3D7CF; /* Selected item text color */
     border: 1px solid #222; /* Selected item border */
@@ -330,7 +404,7 @@ QScrollBar::handle:vertical:hover, QScrollBar::handle:horizontal:hover {
 if __name__ == '__main__':
     try:
         app = QApplication(sys.argv)
-        #app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5() + custom_stylesheet)
+        # import qdarkstyle; app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5() + custom_stylesheet)
 
         mainWin = OTTableWindow()
         mainWin.show()
@@ -0,0 +1,70 @@
+# parallel.py
+# Runs GEN and EVAL for many input forms across a pool of worker processes.
+# gen() and the constraint functions are plain Python, so a single process only ever
+# uses one core. Splitting the lexicon over a process pool lets every core work on it.
+
+from functools import partial
+from itertools import islice
+import os
+
+import constraints
+
+
+def gen_and_evaluate(input_word, constraint_names, depth=1):
+    """
+    Generates the candidates for one input and scores them.
+
+    Args:
+        input_word (str): The input form.
+        constraint_names (list of str): The names of the constraints to score against.
+        depth (int): The largest number of edits gen() may make.
+
+    Returns:
+        tuple: (input word, list of candidates, violation matrix).
+    """
+    candidates = list(constraints.gen(input_word, depth))
+    return input_word, candidates, constraints.evaluate_tableau(input_word, candidates, constraint_names)
+
+
+def evaluate_lexicon(input_words, constraint_set, workers=None, chunksize=32, depth=1):
+    """
+    Runs gen() and evaluate_tableau() on every input word, spread over a process pool.
+
+    Results come back in the same order as the input words no matter which worker
+    finished first, so the output is exactly what the serial path produces.
+    Constraints are sent to the workers by name, so they need to be registered when
+    the constraints module is imported (as everything in constraints.py is).
+
+    Args:
+        input_words (iterable of str): The input forms to evaluate.
+        constraint_set (list): Constraint functions or their names.
+        workers (int): The number of worker processes. Defaults to the number of CPUs.
+                       With 1 worker everything runs in this process.
+        chunksize (int): How many input words are sent to a worker at a time.
+        depth (int): The largest number of edits gen() may make.
+
+    Yields:
+        tuple: (input word, list of candidates, violation matrix) for each input word, in order.
+    """
+    names = [c if isinstance(c, str) else c.__name__ for c in constraint_set]
+    work = partial(gen_and_evaluate, constraint_names=names, depth=depth)
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    if workers <= 1:
+        yield from map(work, input_words)
+        return
+
+    # Only pulled in here, starting the process machinery up costs time that serial runs don't need to pay
+    from concurrent.futures import ProcessPoolExecutor
+
+    # executor.map() would queue the whole input up front, so hand it a window at a time
+    # to keep memory bounded when the input words are streamed in
+    window = chunksize * workers * 4
+    input_words = iter(input_words)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            batch = list(islice(input_words, window))
+            if not batch:
+                return
+            yield from executor.map(work, batch, chunksize=chunksize)
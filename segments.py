@@ -0,0 +1,196 @@
+# segments.py
+# Compact storage for large numbers of candidates.
+# Every distinct character is interned to a small integer code, and a batch of words is kept
+# as one contiguous uint16 array of codes plus the offset where each word starts. That takes
+# two bytes per segment instead of a whole Python str per candidate, and lets per-class questions
+# (how many vowels does each candidate have?) be answered with array lookups instead of
+# checking every character against a list.
+
+import threading
+
+import numpy as np
+
+# Codes fit in a uint16. The alphabet is shared by the whole process and only ever grows, so
+# a uint8 (256 segments) ran out after a few non-Latin inputs
+code_dtype = np.uint16
+max_segments = 1 << 16
+
+
+class Alphabet:
+    """
+    Interns characters to small integer codes and keeps lookup tables indexed by code.
+
+    The tables say which class each code belongs to and what its sonority is, so a whole
+    array of codes can be classified at once with table[codes]. Upper and lower case get
+    their own codes but share the classes and sonority of the lower case segment.
+    """
+
+    def __init__(self, classes, sonority=None):
+        """
+        Args:
+            classes (dict): Maps a class name such as 'C' to the segments it contains.
+            sonority (function): Gives the sonority of a segment, -1 if it has none.
+        """
+        self.classes = {name: {seg.lower() for seg in segments} for name, segments in classes.items()}
+        self.sonority = sonority
+        self.segments = []   # Code -> character
+        self.codes = {}      # Character -> code
+        self._tables = {}    # Lookup tables, rebuilt when new segments come in
+        self._table_size = 0
+        self._lock = threading.Lock()  # The GUI and the server encode from worker threads
+
+    def __len__(self):
+        return len(self.segments)
+
+    def code(self, char):
+        """Returns the code of a character, giving it a new one if it hasn't been seen yet."""
+        code = self.codes.get(char)
+        if code is None:
+            with self._lock:
+                code = self.codes.get(char)
+                if code is None:
+                    if len(self.segments) >= max_segments:
+                        raise ValueError(f"More than {max_segments} distinct segments, they don't fit in a uint16.")
+                    code = len(self.segments)
+                    self.segments.append(char)
+                    self.codes[char] = code
+        return code
+
+    def encode(self, text):
+        """
+        Turns a string into an array of codes.
+
+        Args:
+            text (str): The characters to encode, usually several words joined together.
+
+        Returns:
+            numpy.ndarray: One code per character.
+        """
+        if not text:
+            return np.zeros(0, dtype=code_dtype)
+        if text.isascii():
+            # The usual case. Bytes are code points here, so one 128 entry table does the mapping
+            points = np.frombuffer(text.encode('ascii'), dtype=np.uint8)
+            lookup = np.zeros(128, dtype=code_dtype)
+            for point in np.flatnonzero(np.bincount(points, minlength=128)):
+                lookup[point] = self.code(chr(point))
+            return lookup[points]
+        # Otherwise work on the code points so each distinct character is only looked up once
+        points = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        distinct, inverse = np.unique(points, return_inverse=True)
+        lookup = np.array([self.code(chr(point)) for point in distinct], dtype=code_dtype)
+        return lookup[inverse.reshape(-1)]
+
+    def decode(self, codes):
+        """Turns an array of codes back into a string."""
+        return ''.join(self.segments[code] for code in codes)
+
+    def table(self, name):
+        """
+        Returns the lookup table for a class name or 'sonority'.
+
+        A class table holds True for the codes in that class. The sonority table holds the
+        sonority of each code. Both are indexed by code.
+        """
+        # Other threads can add segments while a table is being built, so the size check and the
+        # build happen under the same lock as code(). A table then always covers every code handed out
+        # before it was asked for
+        with self._lock:
+            if self._table_size != len(self.segments):
+                self._tables = {}
+                self._table_size = len(self.segments)
+            if name not in self._tables:
+                self._tables[name] = self._build_table(name, [seg.lower() for seg in self.segments])
+            return self._tables[name]
+
+    def _build_table(self, name, lowered):
+        if name == 'sonority':
+            rank = self.sonority or (lambda seg: -1)
+            values = np.array([rank(seg) for seg in lowered], dtype=np.int8)
+        elif name in self.classes:
+            values = np.array([seg in self.classes[name] for seg in lowered], dtype=bool)
+        else:
+            raise KeyError(f"No segment class named {name}.")
+        # Pad to the full code range so any code can be looked up
+        table = np.zeros(max_segments, dtype=values.dtype)
+        table[:len(values)] = values
+        if name == 'sonority':
+            table[len(values):] = -1
+        return table
+
+
+class CandidateStore:
+    """
+    A batch of words held as one array of segment codes with offsets.
+
+    Word i is codes[offsets[i]:offsets[i + 1]]. Words can be added one at a time or in bulk,
+    and indexing the store gives the word back as a str.
+    """
+
+    def __init__(self, alphabet, words=()):
+        """
+        Args:
+            alphabet (Alphabet): Interns the characters. Stores that share one can be compared code for code.
+            words (iterable of str): Words to start with.
+        """
+        self.alphabet = alphabet
+        self.codes = np.zeros(0, dtype=code_dtype)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.extend(words)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Candidate index out of range.")
+        return self.alphabet.decode(self.word_codes(i))
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def word_codes(self, i):
+        """Returns the codes of word i, as a view into the store."""
+        return self.codes[self.offsets[i]:self.offsets[i + 1]]
+
+    def lengths(self):
+        """Returns the number of segments in every word."""
+        return np.diff(self.offsets)
+
+    def extend(self, words):
+        """Adds words to the end of the store, encoding them all in one go."""
+        words = list(words)
+        if not words:
+            return
+        lengths = np.fromiter(map(len, words), dtype=np.int64, count=len(words))
+        self.codes = np.concatenate([self.codes, self.alphabet.encode(''.join(words))])
+        self.offsets = np.concatenate([self.offsets, self.offsets[-1] + np.cumsum(lengths)])
+
+    def append(self, word):
+        self.extend([word])
+
+    def nbytes(self):
+        """The memory taken by the codes and offsets."""
+        return self.codes.nbytes + self.offsets.nbytes
+
+    def count(self, name):
+        """
+        Counts the segments of a class in every word at once.
+
+        Args:
+            name (str): A class name of the alphabet, e.g. 'V' or 'C'.
+
+        Returns:
+            numpy.ndarray: The number of segments of that class in each word.
+        """
+        in_class = self.alphabet.table(name)[self.codes]
+        # Running totals, so each word's count is a difference of two of them
+        totals = np.concatenate([[0], np.cumsum(in_class, dtype=np.int64)])
+        return totals[self.offsets[1:]] - totals[self.offsets[:-1]]
+
+    def sonority(self):
+        """Returns the sonority of every segment in the store, in the same layout as codes."""
+        return self.alphabet.table('sonority')[self.codes]
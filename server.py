@@ -0,0 +1,391 @@
+# server.py
+# A local HTTP and WebSocket service for scoring tableaux, so several people (or scripts) can share
+# one warm process instead of each starting Python, importing everything and filling a cache of
+# their own. Every evaluation goes through one Batcher: requests that arrive within a few
+# milliseconds of each other are joined into a single evaluate_tableau() call, and every call
+# goes through the shared constraint cache, which stays warm for as long as the server runs.
+#
+# Endpoints (JSON in and out):
+#   GET  /constraints   the constraints that can be used
+#   POST /evaluate      {"input": "snow", "candidates": ["sno", "so"], "constraints": [...]}
+#                       or {"pairs": [["snow", "sno"], ["ski", "si"]], ...}
+#   POST /gen           {"input": "snow", "depth": 1, "limit": 100, "constraints": [...]}
+#                       (depth and limit are capped by --max-depth and --max-candidates)
+#   POST /rcd           {"pairs": [["snow", "sno", "so"], ...], "constraints": [...], "contenders_only": false}
+#   GET  /stats         cache, batching and (with --profile) per-constraint numbers
+#   WS   /stream        one JSON job per message, results come back a piece at a time (see stream())
+#
+# "constraints" can be left out to use all of them.
+#
+# Example:
+#   python server.py --port 5000 --cache 500000
+
+import argparse
+from concurrent.futures import Future
+import json
+import queue
+import sys
+import threading
+import time
+
+from flask import Flask, jsonify, request
+from flask_sock import Sock
+
+import constraints
+
+# gen() grows exponentially with depth and every request shares this process, so a request
+# can't ask for more than this (see --max-depth and --max-candidates)
+max_depth = 3
+max_candidates = 100000
+
+
+class Batcher:
+    """
+    Scores evaluation jobs on one background thread, joining jobs that arrive close together.
+
+    After taking a job off the queue the thread waits up to 'window' seconds for more (or until
+    'max_rows' candidates have piled up). Jobs that use the same constraints are then scored in one
+    evaluate_tableau() call and the result is split back up between them. Scoring on a single
+    thread also means the constraint code never runs on two request threads at once.
+    """
+
+    def __init__(self, window=0.005, max_rows=20000):
+        self.window = window
+        self.max_rows = max_rows
+        self.batches = 0
+        self.jobs = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, inputs, candidates, constraint_names):
+        """
+        Queues a tableau for scoring.
+
+        Args:
+            inputs (str or list of str): The input shared by every candidate, or one input per candidate.
+            candidates (list of str): The output candidates.
+            constraint_names (list of str): The constraints to score against.
+
+        Returns:
+            concurrent.futures.Future: Resolves to the violation matrix, one row per candidate.
+        """
+        candidates = list(candidates)
+        inputs = [inputs] * len(candidates) if isinstance(inputs, str) else list(inputs)
+        if len(inputs) != len(candidates):
+            raise ValueError("There must be one input word per candidate.")
+        future = Future()
+        self._queue.put((inputs, candidates, tuple(constraint_names), future))
+        return future
+
+    def evaluate(self, inputs, candidates, constraint_names):
+        """Scores a tableau and waits for the result."""
+        return self.submit(inputs, candidates, constraint_names).result()
+
+    def close(self):
+        """Stops the thread once the jobs already queued are done."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'jobs': self.jobs,
+            'rows': self.rows,
+            'jobs_per_batch': self.jobs / self.batches if self.batches else 0.0,
+        }
+
+    def _run(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            jobs = [job]
+            rows = len(job[1])
+            deadline = time.monotonic() + self.window
+            stopping = False
+            while rows < self.max_rows:
+                try:
+                    job = self._queue.get(timeout=max(deadline - time.monotonic(), 0)) if self.window \
+                        else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    stopping = True
+                    break
+                jobs.append(job)
+                rows += len(job[1])
+            self._score(jobs)
+            if stopping:
+                return
+
+    def _score(self, jobs):
+        groups = {}
+        for job in jobs:
+            groups.setdefault(job[2], []).append(job)
+        for names, group in groups.items():
+            self.batches += 1
+            self.jobs += len(group)
+            inputs = [word for job in group for word in job[0]]
+            candidates = [word for job in group for word in job[1]]
+            self.rows += len(candidates)
+            try:
+                matrix = constraints.evaluate_tableau(inputs, candidates, names)
+            except Exception:
+                # Score the jobs one by one so only the one that caused it gets the error
+                for job_inputs, job_candidates, _, future in group:
+                    try:
+                        future.set_result(constraints.evaluate_tableau(job_inputs, job_candidates, names))
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+            start = 0
+            for _, job_candidates, _, future in group:
+                future.set_result(matrix[start:start + len(job_candidates)])
+                start += len(job_candidates)
+
+
+def _words(value, field):
+    if not isinstance(value, list) or not all(isinstance(word, str) for word in value):
+        raise ValueError(f"'{field}' needs to be a list of strings.")
+    return value
+
+
+def _word(value, field):
+    if not isinstance(value, str):
+        raise ValueError(f"'{field}' needs to be a string.")
+    return value
+
+
+def _rows(value, field, width):
+    if not isinstance(value, list) or not all(isinstance(row, (list, tuple)) and len(row) == width
+                                              and all(isinstance(word, str) for word in row) for row in value):
+        raise ValueError(f"'{field}' needs to be a list of {width}-string lists.")
+    return [tuple(row) for row in value]
+
+
+def _constraint_names(job):
+    """The constraints a job asks for, checked (and loaded if they come from a plugin) up front."""
+    names = job.get('constraints')
+    if names is None:
+        return constraints.available_constraints()
+    names = _words(names, 'constraints')
+    for name in names:
+        constraints.get_constraint(name)
+    return names
+
+
+def _tableau(job):
+    """Reads the inputs and candidates of an evaluation job, as either input + candidates or pairs."""
+    if 'pairs' in job:
+        pairs = _rows(job['pairs'], 'pairs', 2)
+        return [input_word for input_word, _ in pairs], [output_word for _, output_word in pairs]
+    return _word(job.get('input'), 'input'), _words(job.get('candidates'), 'candidates')
+
+
+def _count(value, field, default):
+    # A non-negative int field of a job, or 'default' when it's left out or null
+    if value is None:
+        return default
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"'{field}' needs to be a non-negative integer.")
+    return value
+
+
+def _candidates(job, input_word):
+    """Runs gen() for a job, within the server's limits on depth and number of candidates."""
+    depth = _count(job.get('depth'), 'depth', 1)
+    if depth > max_depth:
+        raise ValueError(f"'depth' can be at most {max_depth} here.")
+    limit = min(_count(job.get('limit'), 'limit', max_candidates), max_candidates)
+    return list(constraints.gen(input_word, depth, limit))
+
+
+def rank(batcher, pairs, names, contenders_only=False):
+    """
+    Runs RCD over winner-loser pairs, with the winners and losers scored by the batcher.
+
+    Returns:
+        dict: strata (lists of constraint names), consistent, unranked (constraint names)
+              and unexplained ((input, winner, loser) lists).
+    """
+    inputs = [input_word for input_word, _, _ in pairs]
+    # Both halves go in together, so the batcher scores them in one call
+    winners = batcher.submit(inputs, [winner for _, winner, _ in pairs], names)
+    losers = batcher.submit(inputs, [loser for _, _, loser in pairs], names)
+    winners, losers = winners.result(), losers.result()
+    if contenders_only:
+        keep = constraints.contender_mask(pairs, winners, losers, collective=contenders_only == 'collective')
+        pairs = [pair for pair, kept in zip(pairs, keep) if kept]
+        winners, losers = winners[keep], losers[keep]
+    result = constraints.rcd(constraints.compare_violations(winners, losers).reshape(len(pairs), len(names)))
+    return {
+        'strata': [[names[j] for j in stratum] for stratum in result.strata],
+        'consistent': result.consistent,
+        'unranked': [names[j] for j in result.unranked],
+        'unexplained': [list(pairs[i]) for i in result.unexplained],
+    }
+
+
+def stream(batcher, job, window=16):
+    """
+    Works through a big job a piece at a time, for the WebSocket endpoint.
+
+    Jobs are either {"type": "gen", "inputs": [...], "depth": 1, "limit": null} or
+    {"type": "evaluate", ...} with the same fields as POST /evaluate plus "chunk" (rows per reply).
+    Up to 'window' pieces are queued at once so the batcher always has work to join up.
+    Any "id" in the job is sent back with every reply.
+
+    Yields:
+        dict: One reply per input (gen) or per chunk of rows (evaluate), then {"done": true, "rows": n}.
+    """
+    names = _constraint_names(job)
+    extra = {'id': job['id']} if 'id' in job else {}
+    kind = job.get('type', 'evaluate')
+
+    if kind == 'gen':
+        def pieces():
+            for input_word in _words(job.get('inputs'), 'inputs'):
+                candidates = _candidates(job, input_word)
+                yield {'input': input_word, 'candidates': candidates}, (input_word, candidates)
+    elif kind == 'evaluate':
+        inputs, candidates = _tableau(job)
+        chunk = max(_count(job.get('chunk'), 'chunk', 1000), 1)
+
+        def pieces():
+            for start in range(0, len(candidates), chunk):
+                part = inputs if isinstance(inputs, str) else inputs[start:start + chunk]
+                yield {'start': start}, (part, candidates[start:start + chunk])
+    else:
+        raise ValueError(f"Unknown job type {kind}, use 'gen' or 'evaluate'.")
+
+    rows = 0
+    pending = []
+    for reply, (part_inputs, part_candidates) in pieces():
+        pending.append((reply, batcher.submit(part_inputs, part_candidates, names)))
+        if len(pending) >= window:
+            reply, future = pending.pop(0)
+            matrix = future.result()
+            rows += len(matrix)
+            yield dict(reply, constraints=names, violations=matrix.tolist(), **extra)
+    for reply, future in pending:
+        matrix = future.result()
+        rows += len(matrix)
+        yield dict(reply, constraints=names, violations=matrix.tolist(), **extra)
+    yield dict(done=True, rows=rows, **extra)
+
+
+def create_app(cache_size=100000, window=0.005, max_rows=20000):
+    """
+    Builds the Flask app along with its batcher and turns the shared constraint cache on.
+
+    Args:
+        cache_size (int): The largest number of results the shared cache keeps.
+        window (float): How long, in seconds, the batcher waits for more jobs to join a batch.
+        max_rows (int): The most candidates scored in one batch.
+
+    Returns:
+        flask.Flask: The app. Its batcher is app.config['BATCHER'].
+    """
+    constraints.enable_cache(cache_size)
+    batcher = Batcher(window, max_rows)
+    app = Flask(__name__)
+    app.config['BATCHER'] = batcher
+    sock = Sock(app)
+
+    @app.errorhandler(ValueError)
+    @app.errorhandler(KeyError)
+    def bad_request(e):
+        message = e.args[0] if isinstance(e, KeyError) and e.args else str(e)
+        return jsonify(error=message), 400
+
+    def body():
+        job = request.get_json(silent=True)
+        if not isinstance(job, dict):
+            raise ValueError("The request body needs to be a JSON object.")
+        return job
+
+    @app.get('/constraints')
+    def list_constraints():
+        return jsonify(constraints=constraints.available_constraints())
+
+    @app.post('/evaluate')
+    def evaluate():
+        job = body()
+        names = _constraint_names(job)
+        inputs, candidates = _tableau(job)
+        matrix = batcher.evaluate(inputs, candidates, names)
+        return jsonify(constraints=names, violations=matrix.tolist())
+
+    @app.post('/gen')
+    def generate():
+        job = body()
+        input_word = _word(job.get('input'), 'input')
+        candidates = _candidates(job, input_word)
+        if 'constraints' not in job:
+            return jsonify(input=input_word, candidates=candidates)
+        names = _constraint_names(job)
+        matrix = batcher.evaluate(input_word, candidates, names)
+        return jsonify(input=input_word, candidates=candidates, constraints=names, violations=matrix.tolist())
+
+    @app.post('/rcd')
+    def ranking():
+        job = body()
+        pairs = _rows(job.get('pairs'), 'pairs', 3)
+        return jsonify(rank(batcher, pairs, _constraint_names(job), job.get('contenders_only', False)))
+
+    @app.get('/stats')
+    def stats():
+        cache = constraints.evaluation_cache
+        return jsonify(cache=cache.stats() if cache is not None else None,
+                       batching=batcher.stats(),
+                       profile=constraints.profile_stats())
+
+    @sock.route('/stream')
+    def stream_jobs(ws):
+        while True:
+            message = ws.receive()
+            if message is None:
+                return
+            try:
+                job = json.loads(message)
+                if not isinstance(job, dict):
+                    raise ValueError("Every message needs to be a JSON object.")
+                for reply in stream(batcher, job):
+                    ws.send(json.dumps(reply))
+            except (ValueError, KeyError) as e:
+                ws.send(json.dumps({'error': e.args[0] if isinstance(e, KeyError) and e.args else str(e)}))
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve tableau evaluation, gen() and RCD over HTTP and WebSocket.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (defaults to this machine only)")
+    parser.add_argument('--port', type=int, default=5000, help="port to listen on")
+    parser.add_argument('--cache', type=int, default=500000, metavar='SIZE',
+                        help="largest number of results kept in the shared constraint cache")
+    parser.add_argument('--batch-window', type=float, default=5.0, metavar='MS',
+                        help="milliseconds to wait for more requests to join a batch")
+    parser.add_argument('--max-batch', type=int, default=20000, help="most candidates scored in one batch")
+    parser.add_argument('--max-depth', type=int, default=max_depth, help="deepest gen() a request can ask for")
+    parser.add_argument('--max-candidates', type=int, default=max_candidates,
+                        help="most candidates gen() makes for one input (also the default limit)")
+    parser.add_argument('--profile', action='store_true', help="time every constraint, see GET /stats")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global max_depth, max_candidates
+    args = parse_args(argv)
+    max_depth, max_candidates = args.max_depth, args.max_candidates
+    if args.profile:
+        constraints.enable_profiling()
+    app = create_app(args.cache, args.batch_window / 1000, args.max_batch)
+    app.run(host=args.host, port=args.port, threaded=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
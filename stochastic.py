@@ -0,0 +1,180 @@
+# stochastic.py
+# Stochastic OT: every constraint has a ranking value, and each evaluation adds normal noise to
+# those values and ranks the constraints by the result, so variable outputs come out with
+# frequencies instead of one fixed winner.
+# Nothing here calls a constraint: the violations are scored once into a WeightedTableaux and every
+# noisy evaluation is a lexicographic comparison over rows of that matrix. Many evaluations, each with
+# its own sampled ranking, are done together as segments of one flat array, and the noise for them
+# is drawn in one go. The Gradual Learning Algorithm (GLA) learns ranking values from observed
+# frequencies, and simulate() reports the output distribution a set of ranking values produces.
+
+from collections import namedtuple
+
+import numpy as np
+
+# ranking: the learned ranking value of every constraint, in column order
+# curve: a CurvePoint for every checkpoint
+GLAResult = namedtuple('GLAResult', ['ranking', 'curve'])
+# step: how many learning data had been seen
+# error_rate: the share of the data since the last checkpoint the learner got wrong
+# ranking: the ranking values at that point
+CurvePoint = namedtuple('CurvePoint', ['step', 'error_rate', 'ranking'])
+
+# Ranking values start here unless given (Boersma & Hayes' usual starting point)
+initial_ranking = 100.0
+# Roughly how many candidate rows are compared at a time
+chunk_rows = 2000000
+
+
+def sample_orders(ranking, noise, count, rng):
+    """
+    Draws 'count' noisy rankings at once.
+
+    Returns:
+        numpy.ndarray: One row per ranking with the constraint columns from highest to lowest ranked.
+    """
+    ranking = np.asarray(ranking, dtype=float)
+    values = ranking + rng.normal(0.0, noise, (count, len(ranking)))
+    return np.argsort(-values, axis=1, kind='stable')
+
+
+def select(violations, rows, segment_starts, orders):
+    """
+    Finds the optimal candidate of many tableaux, each under its own strict ranking.
+
+    The candidates of segment s are rows[segment_starts[s]:segment_starts[s + 1]] of the violation
+    matrix. Going down the rankings one constraint at a time, every candidate that does worse on
+    it than the best one still left in its segment is dropped. All segments take each step together.
+
+    Args:
+        violations (numpy.ndarray): Dense violations, one row per candidate.
+        rows (numpy.ndarray): The violation row of every candidate in every segment.
+        segment_starts (numpy.ndarray): Where each segment starts in 'rows', plus the total at the end.
+        orders (numpy.ndarray): The ranking of every segment, as from sample_orders().
+
+    Returns:
+        numpy.ndarray: The position in 'rows' of each segment's winner (the first one when several tie).
+    """
+    segment_count = len(segment_starts) - 1
+    segments = np.repeat(np.arange(segment_count), np.diff(segment_starts))
+    alive = np.ones(len(rows), dtype=bool)
+    dropped = violations.max(initial=0) + 1
+    for rank in range(orders.shape[1]):
+        values = np.where(alive, violations[rows, orders[segments, rank]], dropped)
+        best = np.minimum.reduceat(values, segment_starts[:-1])
+        alive &= values == best[segments]
+        # Lower constraints don't matter once every segment is down to one candidate
+        if np.count_nonzero(alive) == segment_count:
+            break
+    positions = np.flatnonzero(alive)
+    return positions[np.searchsorted(segments[positions], np.arange(segment_count))]
+
+
+def _tableau_rows(data, tableaux):
+    # The candidate rows of each tableau in turn, and where each tableau starts among them
+    sizes = np.diff(data.starts)[tableaux]
+    segment_starts = np.concatenate([[0], np.cumsum(sizes)])
+    rows = np.arange(segment_starts[-1]) - np.repeat(segment_starts[:-1] - data.starts[tableaux], sizes)
+    return rows, segment_starts
+
+
+def simulate(data, ranking, noise=2.0, trials=10000, seed=None):
+    """
+    Evaluates every tableau 'trials' times, each time under freshly sampled noise.
+
+    Args:
+        data (maxent.WeightedTableaux): The tableaux, only their violations are used.
+        ranking (array-like): The ranking value of every constraint.
+        noise (float): The standard deviation of the evaluation noise.
+        trials (int): How many times to evaluate each tableau.
+        seed (int): Seeds the noise so runs can be repeated.
+
+    Returns:
+        numpy.ndarray: For every candidate, the share of its tableau's trials it won.
+    """
+    if noise < 0:
+        raise ValueError("The evaluation noise can't be negative.")
+    if trials < 1:
+        raise ValueError("The simulation needs at least 1 trial.")
+    rng = np.random.default_rng(seed)
+    violations = data.violations.to_dense()
+    counts = np.zeros(len(data.candidates), dtype=np.int64)
+    if not len(data):
+        return counts.astype(float)
+    per_trial = max(1, chunk_rows // len(data.candidates))
+    tableaux = np.arange(len(data))
+    for done in range(0, trials, per_trial):
+        batch = min(per_trial, trials - done)
+        # Every tableau once per trial, all of a trial's tableaux under the same ranking
+        rows, segment_starts = _tableau_rows(data, np.tile(tableaux, batch))
+        orders = np.repeat(sample_orders(ranking, noise, batch, rng), len(data), axis=0)
+        counts += np.bincount(rows[select(violations, rows, segment_starts, orders)], minlength=len(counts))
+    return counts / trials
+
+
+def learn(data, ranking=None, plasticity=0.1, noise=2.0, steps=100000, batch_size=1, checkpoints=20, seed=None):
+    """
+    Learns ranking values from observed frequencies with the Gradual Learning Algorithm.
+
+    Each learning datum is an observed output drawn with its frequency. The learner evaluates
+    its input under a noisy ranking, and when it gets a different output, every constraint that
+    prefers the observed output is raised by 'plasticity' and every one that prefers the learner's
+    output is lowered by it. With 'batch_size' above 1, that many data are evaluated under the same
+    ranking values before their updates are added up, which is much faster and about as good
+    as long as plasticity times batch size stays small compared with the noise.
+
+    Args:
+        data (maxent.WeightedTableaux): The tableaux and observed frequencies to learn from.
+        ranking (array-like): Where to start, defaults to every constraint at 100.
+        plasticity (float): How far a constraint moves on each error.
+        noise (float): The standard deviation of the evaluation noise.
+        steps (int): How many learning data to go through.
+        batch_size (int): How many data are evaluated between updates.
+        checkpoints (int): How many points to record on the learning curve.
+        seed (int): Seeds the data and the noise so runs can be repeated.
+
+    Returns:
+        GLAResult: The ranking values learned and the learning curve.
+    """
+    if batch_size < 1:
+        raise ValueError("The GLA needs a batch size of at least 1.")
+    if steps < 0:
+        raise ValueError("The number of learning steps can't be negative.")
+    if noise < 0:
+        raise ValueError("The evaluation noise can't be negative.")
+    if plasticity <= 0:
+        raise ValueError("The plasticity needs to be above 0.")
+    width = len(data.constraint_names)
+    ranking = np.full(width, initial_ranking) if ranking is None else np.array(ranking, dtype=float)
+    total = data.frequencies.sum()
+    if total <= 0:
+        raise ValueError("The GLA needs at least one observed output to learn from.")
+
+    rng = np.random.default_rng(seed)
+    violations = data.violations.to_dense()
+    probabilities = data.frequencies / total
+    every = max(1, steps // max(checkpoints, 1))
+    curve = []
+    errors = seen = 0
+    # Data and noise are drawn for many batches at a time
+    block = batch_size * max(1, 4096 // batch_size)
+    step = 0
+    while step < steps:
+        observed_block = rng.choice(len(probabilities), size=min(block, steps - step), p=probabilities)
+        noise_block = rng.normal(0.0, noise, (len(observed_block), width))
+        for start in range(0, len(observed_block), batch_size):
+            observed = observed_block[start:start + batch_size]
+            orders = np.argsort(-(ranking + noise_block[start:start + batch_size]), axis=1, kind='stable')
+            rows, segment_starts = _tableau_rows(data, data.groups[observed])
+            produced = rows[select(violations, rows, segment_starts, orders)]
+            wrong = produced != observed
+            if wrong.any():
+                # Positive where the learner's output does worse than the observed one, so raise those
+                ranking += plasticity * np.sign(violations[produced[wrong]] - violations[observed[wrong]]).sum(axis=0)
+            errors += int(wrong.sum())
+            seen += len(observed)
+            step += len(observed)
+            if step // every > (step - len(observed)) // every or step >= steps:
+                curve.append(CurvePoint(step, errors / seen, ranking.copy()))
+                errors = seen = 0
+    return GLAResult(ranking, curve)
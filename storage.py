@@ -0,0 +1,389 @@
+# storage.py
+# Saving and loading tableaux in a binary, column by column format.
+# A file holds every distinct word once (inputs and candidates are stored as numbers into that
+# table), the violation matrix of every candidate and the ERC rows of every tableau with a winner.
+# Each column is a plain array at a fixed place in the file, so opening a file only reads its
+# header and NumPy memory-maps the arrays. Rows are read from disk when they are first looked at,
+# which lets a big precomputed dataset open straight away without running gen() or any constraint.
+#
+# Layout: the magic bytes, the length of the JSON header as a uint64, the header itself, then
+# every array, each starting on an 'alignment' byte boundary. The header lists the constraint
+# names and the dtype, shape and offset of every array.
+
+import json
+import struct
+
+import numpy as np
+
+import constraints
+
+magic = b'OTTABLE1'
+alignment = 64
+
+# The arrays of a file, with their dtypes. Everything with 'offsets' in the name has one more
+# entry than there are items, item i running from offsets[i] to offsets[i + 1]
+columns = {
+    'string_bytes': np.uint8,      # Every distinct word in UTF-8, one after the other
+    'string_offsets': np.int64,    # Where each word starts in string_bytes
+    'inputs': np.int32,            # The input word of each tableau
+    'winners': np.int64,           # The row of each tableau's winner, -1 if it has none
+    'tableau_offsets': np.int64,   # The candidate rows of each tableau
+    'outputs': np.int32,           # The word of each candidate row
+    'violations': np.int32,        # One row per candidate, one column per constraint
+    'erc_offsets': np.int64,       # The ERC rows of each tableau
+    'erc_losers': np.int64,        # The candidate row each ERC row compares the winner with
+    'erc': np.int8,                # One row per winner-loser pair, one column per constraint
+}
+
+
+class Strings:
+    """
+    The interned word table of a file. Words are decoded when they are first asked for.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+        self._decoded = {}
+        self._ids = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        word = self._decoded.get(i)
+        if word is None:
+            word = bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode('utf-8')
+            self._decoded[i] = word
+        return word
+
+    def find(self, word):
+        """
+        The number of a word, or -1 when the file doesn't have it.
+        The first lookup hashes the encoded words once, nothing gets decoded.
+        """
+        if self._ids is None:
+            data = bytes(self.data)
+            bounds = self.offsets.tolist()
+            self._ids = {data[start:end]: i for i, (start, end) in enumerate(zip(bounds[:-1], bounds[1:]))}
+        return self._ids.get(word.encode('utf-8'), -1)
+
+
+class WordList:
+    """
+    A read-only list of words given as numbers into a Strings table.
+
+    Behaves enough like a list of str for the tables and the dataset, without decoding
+    (or even reading) any word before it is needed.
+    """
+
+    def __init__(self, strings, ids):
+        self.strings = strings
+        self.ids = ids
+        self._positions = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.strings[int(k)] for k in self.ids[i]]
+        return self.strings[int(self.ids[i])]
+
+    def __iter__(self):
+        for k in self.ids:
+            yield self.strings[int(k)]
+
+    def __contains__(self, word):
+        return self._position(word) >= 0
+
+    def index(self, word):
+        position = self._position(word)
+        if position < 0:
+            raise ValueError(f"{word} isn't in the list.")
+        return position
+
+    def _position(self, word):
+        # Words are looked up by their number, and the first position of every number is found once
+        if not isinstance(word, str):
+            return -1
+        if self._positions is None:
+            ids, first = np.unique(self.ids, return_index=True)
+            self._positions = dict(zip(ids.tolist(), first.tolist()))
+        return self._positions.get(self.strings.find(word), -1)
+
+
+class StoredTableau:
+    """One tableau of a file. Its violations and ERC rows are views into the memory-mapped arrays."""
+
+    def __init__(self, input_word, candidates, winner, violations, losers, erc):
+        self.input_word = input_word
+        self.candidates = candidates  # WordList
+        self.winner = winner          # The winning candidate, or None
+        self.violations = violations  # One row per candidate
+        self.losers = losers          # The candidate row of each ERC row
+        self.erc = erc                # One row per loser
+
+
+class TableauWriter:
+    """
+    Writes tableaux to a file one at a time.
+
+    Every column is spooled to its own temporary file as tableaux come in and the pieces are
+    put together when the writer is closed, so memory doesn't grow with the number of candidates
+    (only with the number of distinct words). Use it as a context manager, or call close().
+    """
+
+    def __init__(self, path, constraint_names):
+        """
+        Args:
+            path (str): The file to write.
+            constraint_names (list of str): The name of every violation column.
+        """
+        # Only writing needs temporary files, so opening a file doesn't pay for importing tempfile
+        import tempfile
+
+        self.path = path
+        self.constraint_names = list(constraint_names)
+        self._ids = {}
+        self._counts = {'tableaux': 0, 'rows': 0, 'erc': 0}
+        self._spools = {name: tempfile.TemporaryFile() for name in columns if not name.endswith('offsets')}
+        self._lengths = tempfile.TemporaryFile()      # Byte length of each word
+        self._candidates = tempfile.TemporaryFile()   # Candidate count of each tableau
+        self._erc_counts = tempfile.TemporaryFile()   # ERC row count of each tableau
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _intern(self, words):
+        ids = np.empty(len(words), dtype=np.int32)
+        for i, word in enumerate(words):
+            k = self._ids.get(word)
+            if k is None:
+                k = self._ids[word] = len(self._ids)
+                data = word.encode('utf-8')
+                self._spools['string_bytes'].write(data)
+                self._lengths.write(np.int64(len(data)).tobytes())
+            ids[i] = k
+        return ids
+
+    def add(self, input_word, candidates, violations, winner=None):
+        """
+        Adds one tableau. The ERC rows are worked out here when it has a winner.
+
+        Args:
+            input_word (str): The input.
+            candidates (list of str): Its candidates, one per violation row.
+            violations (numpy.ndarray): The violation matrix, one row per candidate.
+            winner (str): The winning candidate, or None.
+        """
+        candidates = list(candidates)
+        matrix = np.asarray(violations, dtype=np.int32).reshape(len(candidates), len(self.constraint_names))
+        if winner is not None and winner not in candidates:
+            raise ValueError(f"{winner} isn't a candidate for {input_word}.")
+
+        start = self._counts['rows']
+        self._spools['inputs'].write(self._intern([input_word]).tobytes())
+        self._spools['outputs'].write(self._intern(candidates).tobytes())
+        self._spools['violations'].write(matrix.tobytes())
+        self._candidates.write(np.int64(len(candidates)).tobytes())
+
+        losers = np.zeros(0, dtype=np.int64)
+        if winner is None:
+            self._spools['winners'].write(np.int64(-1).tobytes())
+        else:
+            winner_row = candidates.index(winner)
+            self._spools['winners'].write(np.int64(start + winner_row).tobytes())
+            losers = np.array([i for i in range(len(candidates)) if i != winner_row], dtype=np.int64)
+            erc = constraints.compare_violations(matrix[winner_row], matrix[losers])
+            self._spools['erc'].write(erc.reshape(len(losers), len(self.constraint_names)).astype(np.int8).tobytes())
+            self._spools['erc_losers'].write((losers + start).tobytes())
+        self._erc_counts.write(np.int64(len(losers)).tobytes())
+
+        self._counts['rows'] += len(candidates)
+        self._counts['erc'] += len(losers)
+        self._counts['tableaux'] += 1
+
+    def close(self):
+        """Puts the file together and removes the temporary spools."""
+        if self._spools is None:
+            return
+        try:
+            arrays = {
+                'string_offsets': _offsets(self._lengths),
+                'tableau_offsets': _offsets(self._candidates),
+                'erc_offsets': _offsets(self._erc_counts),
+            }
+            width = len(self.constraint_names)
+            shapes = {
+                'string_bytes': (int(arrays['string_offsets'][-1]),),
+                'inputs': (self._counts['tableaux'],),
+                'winners': (self._counts['tableaux'],),
+                'outputs': (self._counts['rows'],),
+                'violations': (self._counts['rows'], width),
+                'erc_losers': (self._counts['erc'],),
+                'erc': (self._counts['erc'], width),
+            }
+            for name, array in arrays.items():
+                shapes[name] = array.shape
+
+            layout, header = _layout(self.constraint_names, shapes)
+            with open(self.path, 'wb') as f:
+                f.write(header)
+                for name in columns:
+                    f.write(b'\0' * (layout[name]['offset'] - f.tell()))
+                    if name in arrays:
+                        f.write(arrays[name].tobytes())
+                    else:
+                        spool = self._spools[name]
+                        spool.seek(0)
+                        while True:
+                            chunk = spool.read(1 << 20)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+        finally:
+            for spool in list(self._spools.values()) + [self._lengths, self._candidates, self._erc_counts]:
+                spool.close()
+            self._spools = None
+
+
+def _offsets(spool):
+    spool.seek(0)
+    counts = np.frombuffer(spool.read(), dtype=np.int64)
+    return np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+
+
+def _layout(constraint_names, shapes):
+    # The header's own length moves the arrays along, so lay them out until it stops changing
+    size = 0
+    while True:
+        offset = -(-(len(magic) + 8 + size) // alignment) * alignment
+        layout = {}
+        for name, dtype in columns.items():
+            layout[name] = {'dtype': np.dtype(dtype).str, 'shape': list(shapes[name]), 'offset': offset}
+            nbytes = int(np.prod(shapes[name], dtype=np.int64)) * np.dtype(dtype).itemsize
+            offset = -(-(offset + nbytes) // alignment) * alignment
+        text = json.dumps({'constraints': constraint_names, 'arrays': layout}).encode('utf-8')
+        if len(text) == size:
+            return layout, magic + struct.pack('<Q', size) + text
+        size = len(text)
+
+
+class TableauFile:
+    """
+    A saved file of tableaux, opened lazily.
+
+    Only the header is read when the file is opened. The arrays are memory-mapped when first
+    used, and rows come off the disk as they are looked at.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if f.read(len(magic)) != magic:
+                raise ValueError(f"{path} isn't a saved tableau file.")
+            size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(size).decode('utf-8'))
+        self.constraint_names = header['constraints']
+        self._layout = header['arrays']
+        self._arrays = {}
+        self._strings = None
+
+    def array(self, name):
+        """Returns one of the arrays of the file, memory-mapped."""
+        if name not in self._arrays:
+            spec = self._layout[name]
+            shape = tuple(spec['shape'])
+            if 0 in shape:
+                # An empty file region can't be mapped
+                self._arrays[name] = np.zeros(shape, dtype=spec['dtype'])
+            else:
+                self._arrays[name] = np.memmap(self.path, dtype=spec['dtype'], mode='r',
+                                               offset=spec['offset'], shape=shape)
+        return self._arrays[name]
+
+    @property
+    def strings(self):
+        if self._strings is None:
+            self._strings = Strings(self.array('string_bytes'), self.array('string_offsets'))
+        return self._strings
+
+    def __len__(self):
+        return len(self.array('inputs'))
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("Tableau index out of range.")
+        start, end = self.array('tableau_offsets')[i:i + 2]
+        erc_start, erc_end = self.array('erc_offsets')[i:i + 2]
+        winner_row = int(self.array('winners')[i])
+        candidates = WordList(self.strings, self.array('outputs')[start:end])
+        return StoredTableau(self.strings[int(self.array('inputs')[i])],
+                             candidates,
+                             None if winner_row < 0 else candidates[winner_row - start],
+                             self.array('violations')[start:end],
+                             self.array('erc_losers')[erc_start:erc_end] - start,
+                             self.array('erc')[erc_start:erc_end])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def columns(self, names=None):
+        """The column of each named constraint, or every column when 'names' is None."""
+        if names is None:
+            return list(range(len(self.constraint_names)))
+        missing = [name for name in names if name not in self.constraint_names]
+        if missing:
+            raise ValueError(f"{self.path} has no column for {', '.join(missing)}.")
+        return [self.constraint_names.index(name) for name in names]
+
+    def inputs(self):
+        """The input word of every tableau."""
+        return WordList(self.strings, self.array('inputs'))
+
+    def row_count(self):
+        """The number of candidate rows across every tableau."""
+        return len(self.array('outputs'))
+
+    def rows(self, batch_size=10000):
+        """
+        Reads every candidate row in order, a batch at a time.
+
+        Yields:
+            tuple: (input word, output word, violation row as a list) for every candidate.
+        """
+        offsets = self.array('tableau_offsets')
+        inputs = self.array('inputs')
+        outputs = self.array('outputs')
+        violations = self.array('violations')
+        for start in range(0, self.row_count(), batch_size):
+            end = min(start + batch_size, self.row_count())
+            tableau_of_row = np.searchsorted(offsets, np.arange(start, end), side='right') - 1
+            for k, t, row in zip(range(start, end), tableau_of_row, np.asarray(violations[start:end]).tolist()):
+                yield self.strings[int(inputs[t])], self.strings[int(outputs[k])], row
+
+
+def save(path, tableaux, constraint_names):
+    """
+    Saves tableaux in one go.
+
+    Args:
+        path (str): The file to write.
+        tableaux (iterable): (input word, candidates, violation matrix, winner or None) per tableau.
+        constraint_names (list of str): The name of every violation column.
+    """
+    with TableauWriter(path, constraint_names) as writer:
+        for input_word, candidates, violations, winner in tableaux:
+            writer.add(input_word, candidates, violations, winner)
+
+
+def load(path):
+    """Opens a saved file. Nothing past the header is read until it is used."""
+    return TableauFile(path)
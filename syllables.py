@@ -0,0 +1,110 @@
+# syllables.py
+# Syllable structure for markedness constraints.
+# Each word is split into syllables once: every run of vowels is a nucleus, the consonants before
+# the first nucleus are its onset, the ones after the last nucleus are its coda, and a cluster
+# between two nuclei gives the next syllable the longest onset that still rises in sonority
+# towards its nucleus (at least one consonant), leaving the rest as the coda before it.
+# The result is cached, so every constraint that asks about the same word reads the same structure
+# instead of scanning the word again in its own way.
+
+from collections import namedtuple
+from functools import lru_cache
+
+
+class Syllable(namedtuple('Syllable', ['onset', 'nucleus', 'coda', 'skeleton'])):
+    """
+    The segments of one syllable, and its skeleton: V for a vowel, C for a consonant and
+    . for anything in neither class. A word without vowels is one syllable that is all onset.
+    """
+    __slots__ = ()
+
+    def onset_skeleton(self):
+        return self.skeleton[:len(self.onset)]
+
+    def coda_skeleton(self):
+        return self.skeleton[len(self.skeleton) - len(self.coda):]
+
+
+# How many syllabified words are kept around
+cache_size = 100000
+
+
+class Syllabifier:
+    """
+    Splits words into syllables using a set of segment classes and a sonority scale.
+    """
+
+    def __init__(self, classes, sonority, size=cache_size):
+        """
+        Args:
+            classes (dict): Segment classes, which need a 'C' and a 'V' class.
+            sonority (function): Gives the sonority of a segment, -1 if it has none.
+            size (int): How many words to keep in the cache.
+        """
+        self.consonants = {segment.lower() for segment in classes['C']}
+        self.vowels = {segment.lower() for segment in classes['V']}
+        self.sonority = sonority
+        self.syllabify = lru_cache(maxsize=size)(self._syllabify)
+
+    def clear_cache(self):
+        self.syllabify.cache_clear()
+
+    def skeleton(self, word):
+        """The CV skeleton of a whole word."""
+        return ''.join(syllable.skeleton for syllable in self.syllabify(word))
+
+    def _syllabify(self, word):
+        """
+        Splits a word into syllables. Cached per word, call syllabify() rather than this.
+
+        Returns:
+            tuple of Syllable: The syllables from left to right, () for an empty word.
+        """
+        if not word:
+            return ()
+        skeleton = ''.join('V' if c.lower() in self.vowels else 'C' if c.lower() in self.consonants else '.'
+                           for c in word)
+
+        # Runs of vowels are the nuclei
+        nuclei = []
+        i = 0
+        while i < len(word):
+            if skeleton[i] == 'V':
+                start = i
+                while i < len(word) and skeleton[i] == 'V':
+                    i += 1
+                nuclei.append((start, i))
+            else:
+                i += 1
+        if not nuclei:
+            return (Syllable(word, '', '', skeleton),)
+
+        # Where every syllable starts. The first one takes everything before its nucleus
+        starts = [0]
+        for (_, end), (next_start, _) in zip(nuclei, nuclei[1:]):
+            onset_start = next_start - 1 if next_start > end else next_start
+            while onset_start > end and self._rises(word[onset_start - 1], word[onset_start]):
+                onset_start -= 1
+            starts.append(onset_start)
+        ends = starts[1:] + [len(word)]
+
+        return tuple(Syllable(word[start:nucleus_start], word[nucleus_start:nucleus_end],
+                              word[nucleus_end:end], skeleton[start:end])
+                     for start, end, (nucleus_start, nucleus_end) in zip(starts, ends, nuclei))
+
+    def _rises(self, first, second):
+        # Whether 'first' can go before 'second' in an onset: sonority has to go up towards the nucleus
+        return self.sonority(first) < self.sonority(second)
+
+    def sonority_violations(self, syllable):
+        """
+        Counts the places where a syllable's margins go against the sonority sequencing principle:
+        sonority has to rise through the onset up to the nucleus and fall through the coda after it.
+        Segments without a sonority are left out.
+        """
+        violations = 0
+        onset = [s for s in map(self.sonority, syllable.onset) if s >= 0]
+        coda = [s for s in map(self.sonority, syllable.coda) if s >= 0]
+        violations += sum(1 for a, b in zip(onset, onset[1:]) if a >= b)
+        violations += sum(1 for a, b in zip(coda, coda[1:]) if a <= b)
+        return violations
@@ -0,0 +1,446 @@
+# table_models.py
+# Qt models behind the two tables in the GUI.
+# Both tables read straight from a violation matrix instead of holding one QTableWidgetItem
+# per cell, so the views only ask for the cells that are actually on screen. Ticking a
+# constraint scores and inserts just that column, and picking a different winner only
+# recomputes the Winner-Loser comparisons from the matrix that is already there.
+# Scoring can run on a thread pool (see workers.py), in which case the violation table fills
+# in chunk by chunk and the Winner-Loser table catches up once everything is scored.
+
+from PyQt5 import QtGui
+from PyQt5.QtCore import (Qt, QAbstractListModel, QAbstractTableModel, QCoreApplication, QModelIndex,
+                          pyqtSignal)
+import numpy as np
+
+import bounding
+import constraints
+import entailment
+from workers import EvaluationWorker
+
+
+# Stands in for a violation count that is still being worked out
+PENDING = -1
+
+
+class ViolationTableModel(QAbstractTableModel):
+    """
+    The constraint violation table: Input, Output, then one column of violation counts
+    per selected constraint.
+
+    With a thread pool, scoring happens on worker threads and the cells fill in as chunks of
+    rows come back. Without one everything is scored straight away on the calling thread.
+    """
+
+    evaluationFinished = pyqtSignal()
+    progress = pyqtSignal(int, int)  # cells scored, cells to score
+    evaluationFailed = pyqtSignal(str)
+
+    def __init__(self, parent=None, threadPool=None):
+        super().__init__(parent)
+        self.inputWord = ''
+        self.outputWords = []
+        self.constraintNames = []
+        self.matrix = np.zeros((0, 0), dtype=np.int32)
+        self.contendersOnly = False
+        self.rows = np.zeros(0, dtype=int)  # The rows of the matrix that are shown
+
+        self.threadPool = threadPool
+        self.jobs = {}     # Jobs whose results are still wanted, by id
+        self.running = {}  # Every job that hasn't finished yet, cancelled or not
+        self.nextJobId = 0
+        self.cellsDone = 0
+        self.cellsTotal = 0
+        self.cellsLeft = {}  # Cells each wanted job still has to score, by id
+
+    def isBusy(self):
+        return bool(self.jobs)
+
+    def setTableau(self, inputWord, outputWords, constraintNames):
+        """Replaces the whole tableau and starts scoring every cell, cancelling anything still running."""
+        self.cancelJobs()
+        self.beginResetModel()
+        self.inputWord = inputWord
+        self.outputWords = list(outputWords)
+        self.constraintNames = list(constraintNames)
+        self.matrix = np.full((len(self.outputWords), len(self.constraintNames)), PENDING, dtype=np.int32)
+        self.rows = np.arange(len(self.outputWords))
+        self.endResetModel()
+        self._startJob(self.constraintNames)
+
+    def loadTableau(self, inputWord, outputWords, constraintNames, matrix):
+        """
+        Shows a tableau that has already been scored, e.g. one opened from a saved file.
+
+        Nothing is copied or scored: outputWords and matrix can be a storage.WordList and a
+        memory-mapped array, so only the rows that get drawn are ever read from disk.
+        """
+        self.cancelJobs()
+        self.beginResetModel()
+        self.inputWord = inputWord
+        self.outputWords = outputWords
+        self.constraintNames = list(constraintNames)
+        self.matrix = matrix
+        self.rows = self._visibleRows()
+        self.endResetModel()
+        self.evaluationFinished.emit()
+
+    def addConstraint(self, name):
+        """Adds a column for one more constraint and starts scoring just that column."""
+        if name in self.constraintNames:
+            return
+        position = len(self.constraintNames) + 2
+        self.beginInsertColumns(QModelIndex(), position, position)
+        self.constraintNames.append(name)
+        self.matrix = np.hstack([self.matrix, np.full((len(self.outputWords), 1), PENDING, dtype=np.int32)])
+        self.endInsertColumns()
+        self._startJob([name])
+
+    def removeConstraint(self, name):
+        """Drops one constraint's column without touching the others."""
+        if name not in self.constraintNames:
+            return
+        j = self.constraintNames.index(name)
+        self.beginRemoveColumns(QModelIndex(), j + 2, j + 2)
+        del self.constraintNames[j]
+        self.matrix = np.delete(self.matrix, j, axis=1)
+        self.endRemoveColumns()
+
+        # Jobs that were only scoring this constraint aren't needed any more
+        for jobId, worker in list(self.jobs.items()):
+            if not set(worker.constraintNames) & set(self.constraintNames):
+                worker.cancel()
+                del self.jobs[jobId]
+                # Its unscored cells won't come in, so take them out of the progress total
+                self.cellsTotal -= self.cellsLeft.pop(jobId, 0)
+        self.progress.emit(self.cellsDone, self.cellsTotal)
+        self._checkFinished()
+
+    def setContendersOnly(self, contendersOnly):
+        """Shows only the candidates that aren't harmonically bounded, or all of them again."""
+        self.contendersOnly = contendersOnly
+        if not self.isBusy():
+            self.beginResetModel()
+            self.rows = self._visibleRows()
+            self.endResetModel()
+
+    def cancelJobs(self):
+        """Stops every job that is still scoring. Results they send afterwards are ignored."""
+        for worker in self.jobs.values():
+            worker.cancel()
+        self.jobs.clear()
+        self.cellsLeft.clear()
+        self.cellsDone = 0
+        self.cellsTotal = 0
+
+    def waitForDone(self):
+        """Blocks until every job has finished and its results are in the table."""
+        while self.jobs:
+            if self.threadPool is not None:
+                self.threadPool.waitForDone(10)
+            QCoreApplication.processEvents()
+
+    def _startJob(self, constraintNames):
+        if not constraintNames or not self.outputWords:
+            self._checkFinished()
+            return
+        jobId = self.nextJobId
+        self.nextJobId += 1
+        worker = EvaluationWorker(jobId, self.inputWord, self.outputWords, constraintNames,
+                                  pause=0 if self.threadPool is None else 0.001)
+        worker.signals.chunkReady.connect(self._chunkReady)
+        worker.signals.failed.connect(self._jobFailed)
+        worker.signals.finished.connect(self._jobFinished)
+        self.jobs[jobId] = worker
+        self.running[jobId] = worker
+        self.cellsLeft[jobId] = len(self.outputWords) * len(constraintNames)
+        self.cellsTotal += self.cellsLeft[jobId]
+        self.progress.emit(self.cellsDone, self.cellsTotal)
+
+        if self.threadPool is None:
+            worker.run()
+        else:
+            self.threadPool.start(worker)
+
+    def _chunkReady(self, jobId, start, chunk):
+        worker = self.jobs.get(jobId)
+        if worker is None:
+            return  # Cancelled, the tableau has changed since
+        columns = []
+        for k, name in enumerate(worker.constraintNames):
+            if name in self.constraintNames:
+                j = self.constraintNames.index(name)
+                self.matrix[start:start + len(chunk), j] = chunk[:, k]
+                columns.append(j)
+        self.cellsDone += chunk.size
+        self.cellsLeft[jobId] -= chunk.size
+        self.progress.emit(self.cellsDone, self.cellsTotal)
+        if columns and len(self.rows):
+            self.dataChanged.emit(self.index(0, min(columns) + 2), self.index(len(self.rows) - 1, max(columns) + 2))
+
+    def _jobFailed(self, jobId, message):
+        if jobId in self.jobs:
+            self.evaluationFailed.emit(message)
+
+    def _jobFinished(self, jobId):
+        self.running.pop(jobId, None)
+        self.cellsLeft.pop(jobId, None)
+        if self.jobs.pop(jobId, None) is not None:
+            self._checkFinished()
+
+    def _checkFinished(self):
+        if self.jobs:
+            return
+        self.cellsDone = 0
+        self.cellsTotal = 0
+        self._refilter()
+        self.evaluationFinished.emit()
+
+    def _visibleRows(self):
+        if self.contendersOnly:
+            return np.flatnonzero(bounding.contenders(self.matrix))
+        return np.arange(len(self.outputWords))
+
+    def _refilter(self):
+        # Which candidates are bounded can change when a constraint comes or goes
+        rows = self._visibleRows()
+        if not np.array_equal(rows, self.rows):
+            self.beginResetModel()
+            self.rows = rows
+            self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.constraintNames) + 2
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        row = self.rows[index.row()]
+        if index.column() == 0:
+            return self.inputWord
+        if index.column() == 1:
+            return self.outputWords[row]
+        violations = self.matrix[row, index.column() - 2]
+        return '' if violations == PENDING else str(violations)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return (["Input", "Output"] + self.constraintNames)[section]
+        return str(section + 1)
+
+
+class WinnerLoserTableModel(QAbstractTableModel):
+    """
+    The Winner-Loser table: the selected winner, a loser, then Winner/Loser/E for every constraint.
+    It reads its violations from a ViolationTableModel and follows its columns as they change.
+    When reduced, only the rows of an ERC basis are shown (see entailment.basis()): the others
+    follow from them and don't tell RCD anything new.
+    """
+
+    labels = {constraints.ERC_W: "Winner", constraints.ERC_L: "Loser", constraints.ERC_E: "E"}
+    colours = {constraints.ERC_W: QtGui.QColor(0, 255, 0),  # Green for Winner
+               constraints.ERC_L: QtGui.QColor(255, 0, 0)}  # Red for Loser
+
+    def __init__(self, source, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.winner = ''
+        self.reduced = False
+        self.constraintNames = []
+        self.winnerRow = -1
+        self.loserRows = np.zeros(0, dtype=int)
+        self.erc = np.zeros((0, 0), dtype=np.int8)
+
+        # While the source is still scoring, the comparisons would be made against pending cells,
+        # so changes are picked up once it has finished
+        source.modelReset.connect(self.refresh)
+        source.columnsInserted.connect(self._sourceColumnsInserted)
+        source.columnsRemoved.connect(self._sourceColumnsRemoved)
+        source.evaluationFinished.connect(self.refresh)
+
+    def setWinner(self, winner):
+        """Picks a new winner. Only the comparisons are redone, nothing is scored again."""
+        self.winner = winner
+        self.refresh()
+
+    def setReduced(self, reduced):
+        """Switches between every loser and only the ones in the ERC basis."""
+        self.reduced = reduced
+        self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        self.constraintNames, self.winnerRow, self.loserRows, self.erc = self._compute()
+        self.endResetModel()
+
+    def _compute(self):
+        # With every loser shown, the comparisons are made cell by cell as the view asks for them
+        # (erc is None), so a tableau loaded from disk isn't compared or decoded up front.
+        # Filtering needs every comparison, so contendersOnly and reduced work them all out
+        source = self.source
+        names = list(source.constraintNames)
+        empty = names, -1, np.zeros(0, dtype=int), np.zeros((0, len(names)), dtype=np.int8)
+        if source.isBusy():
+            return empty
+        try:
+            winnerRow = source.outputWords.index(self.winner)
+        except ValueError:
+            return empty
+
+        loserRows = np.delete(np.arange(len(source.outputWords)), winnerRow)
+        if not source.contendersOnly and not self.reduced:
+            return names, winnerRow, loserRows, None
+        if source.contendersOnly and len(loserRows):
+            # Drop the losers that are harmonically bounded, but always keep the winner
+            mask = bounding.contenders(source.matrix, keep=[winnerRow])
+            loserRows = loserRows[mask[loserRows]]
+        erc = constraints.compare_violations(source.matrix[winnerRow], source.matrix[loserRows])
+        erc = erc.reshape(len(loserRows), len(names))
+        if self.reduced:
+            keep = entailment.basis(erc)
+            loserRows, erc = loserRows[keep], erc[keep]
+        return names, winnerRow, loserRows, erc
+
+    def _sourceColumnsInserted(self, parent, first, last):
+        if self.source.isBusy():
+            return
+        names, winnerRow, loserRows, erc = self._compute()
+        if winnerRow != self.winnerRow or not np.array_equal(loserRows, self.loserRows):
+            self.refresh()
+            return
+        self.beginInsertColumns(QModelIndex(), first, last)
+        self.constraintNames, self.erc = names, erc
+        self.endInsertColumns()
+
+    def _sourceColumnsRemoved(self, parent, first, last):
+        if self.source.isBusy():
+            return
+        names, winnerRow, loserRows, erc = self._compute()
+        if winnerRow != self.winnerRow or not np.array_equal(loserRows, self.loserRows):
+            self.refresh()
+            return
+        self.beginRemoveColumns(QModelIndex(), first, last)
+        self.constraintNames, self.erc = names, erc
+        self.endRemoveColumns()
+
+    def _comparison(self, row, column):
+        if self.erc is not None:
+            return self.erc[row, column]
+        matrix = self.source.matrix
+        return constraints.compare_violations(matrix[self.winnerRow, column], matrix[self.loserRows[row], column])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.loserRows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.constraintNames) + 2
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return self.winner
+            if column == 1:
+                return self.source.outputWords[self.loserRows[index.row()]]
+            return self.labels[self._comparison(index.row(), column - 2)]
+        if role == Qt.BackgroundRole and column >= 2:
+            return self.colours.get(self._comparison(index.row(), column - 2))
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return (["Selected Winner", "Loser"] + self.constraintNames)[section]
+        return str(section + 1)
+
+
+class WordListModel(QAbstractListModel):
+    """
+    A list of words for a combo box. The words can be a storage.WordList, in which case only
+    the ones the view actually shows get decoded, however many candidates a tableau has.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.words = []
+
+    def setWords(self, words):
+        self.beginResetModel()
+        self.words = words
+        self.endResetModel()
+
+    def row(self, word):
+        """The row of a word, or -1 when it isn't in the list."""
+        try:
+            return self.words.index(word)
+        except ValueError:
+            return -1
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.words)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if index.isValid() and role in (Qt.DisplayRole, Qt.EditRole):
+            return self.words[index.row()]
+        return None
+
+
+class ProfileTableModel(QAbstractTableModel):
+    """
+    The constraint profiling panel: one row per constraint with its calls, total, mean and p99
+    time and cache hit rate, as recorded by constraints.enable_profiling().
+    """
+
+    headers = ["Constraint", "Calls", "Total (ms)", "Mean (\u00b5s)", "p99 (\u00b5s)", "Cache hit rate"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.stats = []
+
+    def refresh(self):
+        """Reads the latest numbers from the profiler."""
+        self.beginResetModel()
+        self.stats = constraints.profile_stats()
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.stats)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headers)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.TextAlignmentRole and index.column() > 0:
+            return int(Qt.AlignRight | Qt.AlignVCenter)
+        if role != Qt.DisplayRole:
+            return None
+        entry = self.stats[index.row()]
+        column = index.column()
+        if column == 0:
+            return entry['name']
+        if column == 1:
+            return str(entry['calls'])
+        if column == 2:
+            return f"{entry['seconds'] * 1e3:.2f}"
+        if column == 3:
+            return f"{entry['mean'] * 1e6:.1f}"
+        if column == 4:
+            return f"{entry['p99'] * 1e6:.1f}"
+        lookups = entry['hits'] + entry['misses']
+        return f"{entry['hit_rate']:.1%}" if lookups else "-"
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self.headers[section]
+        return str(section + 1)
@@ -0,0 +1,7 @@
+# conftest.py
+# The modules live at the top of the repository, so the tests import them from there.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
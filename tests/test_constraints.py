@@ -0,0 +1,158 @@
+# test_constraints.py
+# The constraints against the plain versions they started out as, the batched and declared
+# paths of evaluate_tableau() against calling every constraint one word at a time, and RCD
+# against trying every ranking.
+
+import itertools
+import random
+
+import numpy as np
+import pytest
+
+import constraints
+import segments
+
+vowels = ['a', 'e', 'i', 'o', 'u', 'w']
+consonants = ['b', 'c', 'd', 'f', 'g', 'h', 'j', 'k', 'l', 'm',
+              'n', 'p', 'q', 'r', 's', 't', 'v', 'x', 'y', 'z']
+
+
+# The original implementations, written out simply
+
+def starCC(word):
+    consonant_count = 0
+    for char in word:
+        if char.lower() in vowels:
+            break
+        elif char.lower() in consonants:
+            consonant_count += 1
+        if consonant_count > 1:
+            return False
+    return True
+
+
+def noDiphthong(word):
+    previous_char_was_vowel = False
+    for char in word:
+        if char.lower() in vowels:
+            if previous_char_was_vowel:
+                return False
+            previous_char_was_vowel = True
+        else:
+            previous_char_was_vowel = False
+    return True
+
+
+def noDeleteVowel(input_word, output_word):
+    return (len([c for c in input_word if c.lower() in vowels])
+            == len([c for c in output_word if c.lower() in vowels]))
+
+
+def noDeleteConsonant(input_word, output_word):
+    return (len([c for c in input_word if c.lower() in consonants])
+            == len([c for c in output_word if c.lower() in consonants]))
+
+
+def noSkipping(input_word, output_word):
+    i, j = 0, 0
+    while i < len(input_word) and j < len(output_word):
+        if input_word[i] == output_word[j]:
+            j += 1
+        elif (i > 0 and i < len(input_word) - 1 and input_word[i - 1] == output_word[j - 1]
+              and input_word[i + 1] == output_word[j]):
+            return False
+        i += 1
+    return j == len(output_word)
+
+
+baseline = [starCC, noDiphthong, noDeleteVowel, noDeleteConsonant, noSkipping]
+
+
+def lexicon_pairs(count=60, seed=0):
+    # (input, candidate) pairs over made-up words, with capitals and a segment no class knows
+    rng = random.Random(seed)
+    letters = 'bsstrpkaaeiouwlnnmyAST?'
+    pairs = []
+    for _ in range(count):
+        word = ''.join(rng.choice(letters) for _ in range(rng.randint(0, 6)))
+        pairs += [(word, candidate) for candidate in constraints.gen(word, 2)]
+    return pairs
+
+
+def call(func, arity, input_word, output_word):
+    return func(output_word) if arity == 1 else func(input_word, output_word)
+
+
+def test_constraints_match_the_original_versions():
+    pairs = lexicon_pairs()
+    inputs = [i for i, _ in pairs]
+    outputs = [o for _, o in pairs]
+    for reference in baseline:
+        func = constraints.get_constraint(reference.__name__)
+        arity = constraints.constraint_arity[func]
+        expected = [constraints.violation_count(call(reference, arity, i, o)) for i, o in pairs]
+        direct = [constraints.violation_count(call(func, arity, i, o)) for i, o in pairs]
+        assert direct == expected, reference.__name__
+        batched = constraints.evaluate_tableau(inputs, outputs, [func])[:, 0].tolist()
+        assert batched == expected, reference.__name__
+
+
+def test_evaluate_tableau_matches_calling_each_constraint():
+    pairs = lexicon_pairs(40, seed=1)
+    functions = constraints.get_constraint_functions()
+    matrix = constraints.evaluate_tableau([i for i, _ in pairs], [o for _, o in pairs], functions)
+    expected = [[constraints.violation_count(call(func, constraints.constraint_arity[func], i, o))
+                 for func in functions] for i, o in pairs]
+    assert matrix.tolist() == expected
+
+
+def test_max_sonority_rise_reads_the_first_syllable():
+    words = ['snow', 'ta', 'apa', 'xyz', '', 'mwa', 'nyla']
+    assert [constraints.maxSonorityRise(word) for word in words] == [0, 0, 1, 1, 1, 1, 0]
+    for word in words:
+        syllables = constraints.syllabifier.syllabify(word)
+        # No onset to rise from exactly when the first syllable has none
+        if syllables and syllables[0].nucleus and not syllables[0].onset:
+            assert constraints.maxSonorityRise(word) == 1
+
+
+def test_alphabet_grows_past_256_segments():
+    # Used to overflow the uint8 codes, after which the batched faithfulness constraints raised
+    strange = [chr(0x4e00 + k) for k in range(400)]
+    constraints.evaluate_tableau(strange, strange, ['noDeleteVowel', 'noDeleteConsonant'])
+    matrix = constraints.evaluate_tableau('quiz', ['quiz', 'qiz'], ['noDeleteVowel', 'noDeleteConsonant'])
+    assert matrix.tolist() == [[0, 0], [1, 0]]
+
+
+def test_alphabet_refuses_more_segments_than_it_has_codes(monkeypatch):
+    monkeypatch.setattr(segments, 'max_segments', 300)
+    alphabet = segments.Alphabet(constraints.segment_classes, constraints.sonority_scale)
+    with pytest.raises(ValueError):
+        alphabet.encode(''.join(chr(0x4e00 + k) for k in range(400)))
+
+
+def test_full_alphabet_falls_back_to_scoring_word_by_word(monkeypatch):
+    monkeypatch.setattr(segments, 'max_segments', len(constraints.alphabet))
+    names = ['noDeleteVowel', 'noDeleteConsonant']
+    matrix = constraints.evaluate_tableau('quiz\u2603', ['quiz\u2603', 'qiz\u2603', 'qu'], names)
+    assert matrix.tolist() == [[0, 0], [1, 0], [1, 1]]
+
+
+def test_rcd_finds_a_ranking_whenever_one_exists():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        width = int(rng.integers(1, 5))
+        erc = rng.choice([constraints.ERC_L, constraints.ERC_E, constraints.ERC_W],
+                         size=(rng.integers(0, 6), width)).astype(np.int8)
+
+        def satisfied(order):
+            # Every row needs its highest ranked non-e constraint to prefer the winner
+            return all(next((row[j] == constraints.ERC_W for j in order if row[j] != constraints.ERC_E), True)
+                       for row in erc)
+
+        result = constraints.rcd(erc)
+        assert result.consistent == any(satisfied(order) for order in itertools.permutations(range(width)))
+        if result.consistent:
+            # Any order of the constraints within each stratum works
+            assert satisfied([j for stratum in result.strata for j in stratum])
+            assert sorted(j for stratum in result.strata for j in stratum) == list(range(width))
@@ -0,0 +1,60 @@
+# test_entailment.py
+# ERC entailment against checking every ranking, and the basis against RCD over every row.
+
+import itertools
+
+import numpy as np
+
+import constraints
+import entailment
+
+
+def satisfied(row, order):
+    # A ranking satisfies an ERC row when its highest ranked non-e constraint prefers the winner
+    for j in order:
+        if row[j] != constraints.ERC_E:
+            return row[j] == constraints.ERC_W
+    return True
+
+
+def consistent_erc(rng, pairs, width):
+    # ERC rows of random tableaux whose winners are optimal under a hidden ranking
+    order = rng.permutation(width)
+    rows = []
+    while len(rows) < pairs:
+        matrix = rng.integers(0, 3, size=(rng.integers(2, 6), width))
+        winner = min(range(len(matrix)), key=lambda r: tuple(matrix[r, order]))
+        erc = constraints.compare_violations(matrix[winner], np.delete(matrix, winner, axis=0))
+        rows += [row for row in erc if (row != constraints.ERC_E).any()]
+    return np.array(rows[:pairs], dtype=np.int8).reshape(pairs, width)
+
+
+def test_entails_matches_every_ranking():
+    rng = np.random.default_rng(0)
+    for _ in range(150):
+        width = int(rng.integers(1, 5))
+        erc = rng.choice([-1, 0, 1], size=(rng.integers(0, 4), width)).astype(np.int8)
+        row = rng.choice([-1, 0, 1], size=width).astype(np.int8)
+        orders = [order for order in itertools.permutations(range(width))
+                  if all(satisfied(r, order) for r in erc)]
+        assert entailment.entails(erc, row) == all(satisfied(row, order) for order in orders)
+
+
+def test_basis_keeps_the_rcd_strata():
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        width = int(rng.integers(1, 7))
+        erc = consistent_erc(rng, int(rng.integers(1, 25)), width)
+        keep = entailment.basis(erc)
+        assert keep == sorted(set(keep))
+        full, reduced = constraints.rcd(erc), constraints.rcd(erc[keep])
+        assert full.consistent and reduced.consistent
+        assert [sorted(s) for s in reduced.strata] == [sorted(s) for s in full.strata]
+        assert all(entailment.entails(erc[keep], row) for row in erc)
+
+
+def test_basis_drops_repeated_and_entailed_rows():
+    W, L, e = constraints.ERC_W, constraints.ERC_L, constraints.ERC_E
+    erc = np.array([[W, L, e], [W, L, e], [W, L, L], [e, W, L]], dtype=np.int8)
+    # W L L follows from W L e and e W L together
+    assert entailment.basis(erc) == [0, 3]
@@ -0,0 +1,44 @@
+# test_gen.py
+# gen() against a breadth-first search that applies one edit at a time, the way gen() used to.
+
+import random
+
+import constraints
+
+
+def one_edit(word):
+    # Every word one vowel insertion or one consonant deletion away, and the word itself
+    words = {word}
+    for vowel in constraints.vowels:
+        words.update(word[:i] + vowel + word[i:] for i in range(len(word) + 1))
+    words.update(word[:i] + word[i + 1:] for i in range(len(word)) if word[i].lower() in constraints.consonants)
+    return words
+
+
+def reference(word, depth):
+    seen = {word}
+    level = {word}
+    for _ in range(depth):
+        level = {edited for w in level for edited in one_edit(w)} - seen
+        seen |= level
+    return seen
+
+
+def test_gen_matches_breadth_first_search():
+    rng = random.Random(3)
+    for _ in range(150):
+        word = ''.join(rng.choice('bsstaaeiouwlnnK') for _ in range(rng.randint(0, 5)))
+        for depth in (0, 1, 2) if len(word) > 3 else (0, 1, 2, 3):
+            candidates = list(constraints.gen(word, depth))
+            assert len(candidates) == len(set(candidates)), (word, depth)
+            assert set(candidates) == reference(word, depth), (word, depth)
+
+
+def test_gen_limit_takes_the_first_candidates():
+    every = list(constraints.gen('snow', 2))
+    assert list(constraints.gen('snow', 2, limit=7)) == every[:7]
+
+
+def test_gen_keep_prunes_prefixes():
+    kept = list(constraints.gen('snow', 2, keep=lambda prefix: 'aa' not in prefix))
+    assert set(kept) == {word for word in constraints.gen('snow', 2) if 'aa' not in word}
@@ -0,0 +1,39 @@
+# test_lattice.py
+# The lattice search against scoring every candidate gen() makes.
+
+import random
+
+import pytest
+
+import constraints
+import lattice
+
+patterns = {'testCC': 'C C', 'testCoda': 'C #', 'testOnsetless': '# V', 'testA': 'a'}
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    # Declared for these tests only, the registry goes back to how it was afterwards
+    monkeypatch.setattr(constraints, 'constraint_functions', list(constraints.constraint_functions))
+    monkeypatch.setattr(constraints, 'constraint_arity', dict(constraints.constraint_arity))
+    for name, pattern in patterns.items():
+        constraints.markedness(name, pattern)
+    return ['starCCV', 'starVV', 'noDeleteVowel', 'noDeleteConsonant'] + list(patterns)
+
+
+def test_optimal_candidate_matches_gen(pool):
+    rng = random.Random(4)
+    for word in ['strap', 'aita', 'plan', 'abstract', 'ta', 'a', '', 'kstra', 'Tea', 'ayo'] * 4:
+        ranking = rng.sample(pool, rng.randint(1, len(pool)))
+        for depth in (0, 1, 2):
+            candidates = list(constraints.gen(word, depth))
+            best = min(map(tuple, constraints.evaluate_tableau(word, candidates, ranking).tolist()))
+            found = lattice.optimal_candidate(word, ranking, depth)
+            assert found.output in candidates
+            assert tuple(found.violations) == best
+            assert tuple(constraints.evaluate_tableau(word, [found.output], ranking)[0]) == best
+
+
+def test_optimal_candidate_refuses_constraints_it_cant_score():
+    with pytest.raises(ValueError):
+        lattice.optimal_candidate('a', ['noSkipping'])
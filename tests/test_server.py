@@ -0,0 +1,47 @@
+# test_server.py
+# Input checking of the evaluation service: bad fields are a 400, not a 500.
+
+import pytest
+
+pytest.importorskip('flask')
+pytest.importorskip('flask_sock')
+
+import constraints
+import server
+
+
+@pytest.fixture
+def client():
+    app = server.create_app()
+    yield app.test_client()
+    constraints.disable_cache()
+
+
+def test_gen_takes_defaults_for_null_fields(client):
+    response = client.post('/gen', json={'input': 'snow', 'depth': None, 'limit': None})
+    assert response.status_code == 200
+    assert set(response.get_json()['candidates']) == set(constraints.gen('snow'))
+
+
+@pytest.mark.parametrize('field, value', [('depth', 'x'), ('depth', '1'), ('depth', -1), ('depth', True),
+                                          ('depth', server.max_depth + 1), ('limit', -1), ('limit', 2.5)])
+def test_gen_rejects_bad_counts(client, field, value):
+    response = client.post('/gen', json={'input': 'snow', field: value})
+    assert response.status_code == 400
+    assert field in response.get_json()['error']
+
+
+def test_gen_caps_the_limit(client, monkeypatch):
+    monkeypatch.setattr(server, 'max_candidates', 5)
+    response = client.post('/gen', json={'input': 'snow', 'limit': 1000})
+    assert len(response.get_json()['candidates']) == 5
+
+
+def test_evaluate_after_many_new_segments(client):
+    # Used to fail once the segment codes ran out
+    strange = ''.join(chr(0x4e00 + k) for k in range(300))
+    client.post('/evaluate', json={'input': strange, 'candidates': [strange], 'constraints': ['noDeleteVowel']})
+    response = client.post('/evaluate', json={'input': 'quiz', 'candidates': ['quiz', 'qiz'],
+                                              'constraints': ['noDeleteVowel', 'noDeleteConsonant']})
+    assert response.status_code == 200
+    assert response.get_json()['violations'] == [[0, 0], [1, 0]]
@@ -0,0 +1,70 @@
+# test_typology.py
+# Harmonic bounding and the factorial typology against trying every ranking.
+
+import itertools
+
+import numpy as np
+
+import bounding
+import typology
+from dataset import Dataset
+
+
+def column(j):
+    # Stands in for a constraint, the violations are always given so it's never called
+    def check(word):
+        raise AssertionError("The violations are given, nothing should be scored")
+    check.__name__ = f"C{j}"
+    return check
+
+
+def random_dataset(rng, inputs, candidates, width):
+    data = Dataset([column(j) for j in range(width)])
+    for i in range(inputs):
+        data.add(f"in{i}", [f"in{i}c{k}" for k in range(candidates)],
+                 violations=rng.integers(0, 3, size=(candidates, width)))
+    return data
+
+
+def optimal_rows(matrix, order):
+    # The rows that win under a strict ranking (several when they tie on everything)
+    profiles = [tuple(row) for row in matrix[:, list(order)]]
+    best = min(profiles)
+    return [r for r, profile in enumerate(profiles) if profile == best]
+
+
+def test_harmonically_bounded_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        matrix = rng.integers(0, 3, size=(rng.integers(1, 8), rng.integers(1, 5)))
+        expected = [any(np.all(other <= row) and np.any(other < row) for other in matrix) for row in matrix]
+        assert bounding.harmonically_bounded(matrix).tolist() == expected
+
+
+def test_contenders_are_the_candidates_some_ranking_picks():
+    rng = np.random.default_rng(1)
+    for _ in range(100):
+        matrix = rng.integers(0, 3, size=(rng.integers(1, 7), rng.integers(1, 5)))
+        winners = {r for order in itertools.permutations(range(matrix.shape[1])) for r in optimal_rows(matrix, order)}
+        # Rows with the same violations as a winner win along with it
+        expected = [any(np.array_equal(row, matrix[w]) for w in winners) for row in matrix]
+        assert bounding.contenders(matrix, collective=True).tolist() == expected
+
+
+def test_factorial_typology_matches_every_ranking():
+    rng = np.random.default_rng(2)
+    for _ in range(30):
+        data = random_dataset(rng, rng.integers(1, 5), rng.integers(1, 6), rng.integers(1, 5))
+        expected = set()
+        for order in itertools.permutations(range(len(data.constraints))):
+            expected.add(tuple(tuple(t.candidates[r] for r in optimal_rows(t.violations.to_dense(), order))
+                               for t in data))
+        assert {language.winners for language in typology.factorial_typology(data, workers=1)} == expected
+
+
+def test_given_violations_keep_the_first_row_of_each_candidate():
+    data = Dataset([column(0), column(1)])
+    tableau = data.add("in", ["a", "b", "a"], "a", violations=[[0, 1], [1, 0], [2, 2]])
+    assert tableau.candidates == ["a", "b"]
+    assert tableau.violations.to_dense().tolist() == [[0, 1], [1, 0]]
+    assert tableau.losers == [1]
@@ -0,0 +1,260 @@
+# typology.py
+# Factorial typology: every language the constraints can produce under some ranking.
+# Instead of trying all n! rankings, languages are built one input at a time. Each step picks a
+# possible winner for the next input and checks with RCD that the winners picked so far can
+# still all be optimal together. An inconsistent choice prunes every language that would have
+# started with it. Which options of two inputs clash is worked out up front, so a choice that
+# leaves a later input without any possible winner is dropped straight away. The pairwise checks
+# and the top of the search tree are spread over worker processes.
+
+from collections import namedtuple
+import os
+
+import numpy as np
+
+import bounding
+import constraints
+from entailment import masks, from_masks, stratify, consistent, reduce_masks
+
+# winners: one tuple per input of the candidates that win (several when they tie on every constraint)
+# erc: the winner-loser comparisons the language needs, leaving out the ones that follow from others
+# strata: a ranking that produces it, as lists of constraint functions (highest ranked first)
+Language = namedtuple('Language', ['winners', 'erc', 'strata'])
+
+
+def satisfied(strata, rows):
+    """
+    Checks whether a stratified ranking already satisfies some ERC rows.
+
+    A row is satisfied when it has a W in a higher stratum than every one of its L's.
+    """
+    for w, l in rows:
+        for stratum in strata:
+            if stratum & l:
+                return False
+            if stratum & w:
+                break
+        else:
+            if l:
+                return False
+    return True
+
+
+def winner_options(matrix):
+    """
+    Works out the ways a single tableau can come out.
+
+    Candidates with the same violations always tie, so they are grouped. Each group that can win
+    under some ranking is an option, along with the ERC rows it needs: one against every other
+    group that isn't harmonically bounded. Beating a bounded group follows from beating the group
+    that bounds it, so those rows would only slow the consistency checks down.
+
+    Args:
+        matrix (numpy.ndarray): The violation matrix of the tableau, one row per candidate.
+
+    Returns:
+        list of tuples: (candidate rows of the winning group, ERC rows as an int8 matrix) per option.
+    """
+    profiles, inverse = np.unique(np.asarray(matrix), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    unbounded = np.flatnonzero(~bounding.harmonically_bounded(profiles))
+    options = []
+    for k, profile in enumerate(unbounded):
+        if not bounding.can_win(profiles[unbounded], k):
+            continue
+        others = np.delete(unbounded, k)
+        erc = constraints.compare_violations(profiles[profile], profiles[others]).reshape(len(others), profiles.shape[1])
+        # Rows without an L hold under every ranking
+        erc = erc[(erc == constraints.ERC_L).any(axis=1)]
+        options.append((np.flatnonzero(inverse == profile).tolist(), erc))
+    return options
+
+
+def fields(options):
+    """
+    Lays out one bit field per input in a single int, one bit per option plus a spare bit on top.
+
+    Which options are still allowed for every input is kept as one int laid out like this, so
+    narrowing all of them down is a single &. The spare bits let the emptiness check add a
+    constant to every field at once without carries spilling into the next field.
+
+    Returns:
+        tuple: (offset of every field, the constant that sets a field's spare bit when it isn't empty,
+                the spare bits of every field after input i for each i)
+    """
+    offsets = []
+    offset = 0
+    carry = 0
+    spare = []
+    for option in options:
+        offsets.append(offset)
+        carry |= ((1 << len(option)) - 1) << offset
+        spare.append(1 << (offset + len(option)))
+        offset += len(option) + 1
+    later = [0] * len(options)
+    for i in range(len(options) - 2, -1, -1):
+        later[i] = later[i + 1] | spare[i + 1]
+    return offsets, carry, later
+
+
+def compatibility(i):
+    """
+    Works out which options of later inputs can be picked together with each option of input i.
+    Uses the options set by _init(), so it can run in a worker process.
+
+    Returns:
+        list: One int per option a of input i, laid out like fields(). For every input j after i it has the
+              options of j that are consistent with option a, and for i itself and the inputs before it every option.
+    """
+    offsets = _fields[0]
+    allowed_before = sum(((1 << len(option)) - 1) << offset for option, offset in zip(_options[:i + 1], offsets))
+    compatible = []
+    for a, rows in enumerate(_options[i]):
+        allowed = allowed_before
+        for j in range(i + 1, len(_options)):
+            for b, other in enumerate(_options[j]):
+                # Two options go together when the ranking RCD finds for one of them already works for
+                # the other, which saves running RCD on both of them together most of the time
+                if (satisfied(_strata[i][a], other) or satisfied(_strata[j][b], rows)
+                        or consistent(set(rows) | set(other), _width)):
+                    allowed |= 1 << (offsets[j] + b)
+        compatible.append(allowed)
+    return compatible
+
+
+# The ERC rows (as bit masks) of every option of every input, the ranking RCD finds for each option,
+# which options go together, the layout of the allowed options and the number of constraints.
+# Set once per worker process by _init()
+_options = None
+_strata = None
+_compatible = None
+_fields = None
+_width = 0
+
+
+def _init(options, width, compatible=None):
+    global _options, _strata, _compatible, _fields, _width
+    _options = options
+    _width = width
+    _strata = [[stratify(rows, width) for rows in option] for option in options]
+    _compatible = compatible
+    _fields = fields(options)
+
+
+def _branches(choices, rows, strata, allowed):
+    """Yields every consistent way to pick a winner for the next input, with the rows and ranking it leads to."""
+    i = len(choices)
+    offsets, carry, later = _fields
+    for choice, option_rows in enumerate(_options[i]):
+        if not allowed >> (offsets[i] + choice) & 1:
+            continue
+        # Forward checking: every later input must still have an option that goes with everything picked so far
+        narrowed = allowed & _compatible[i][choice]
+        if (narrowed + carry) & later[i] != later[i]:
+            continue
+        new_rows = [row for row in option_rows if row not in rows]
+        extended = rows | frozenset(new_rows)
+        # Most of the time the ranking found so far already works for the new rows,
+        # and then RCD doesn't need to run again
+        if satisfied(strata, new_rows):
+            yield choices + (choice,), extended, strata, narrowed
+            continue
+        extended_strata = stratify(extended, _width)
+        if extended_strata is not None:
+            yield choices + (choice,), extended, extended_strata, narrowed
+
+
+def _start(choices):
+    rows = frozenset(row for i, choice in enumerate(choices) for row in _options[i][choice])
+    allowed = _fields[1]
+    for i, choice in enumerate(choices):
+        allowed &= _compatible[i][choice]
+    return tuple(choices), rows, stratify(rows, _width), allowed
+
+
+def _explore(choices):
+    """Finds every consistent way to finish a partial language. Runs in a worker process."""
+    found = []
+    stack = [_start(choices)]
+    while stack:
+        node = stack.pop()
+        if len(node[0]) == len(_options):
+            found.append((node[0], node[2]))
+        else:
+            stack.extend(_branches(*node))
+    return found
+
+
+def _frontier(target):
+    """Expands the top of the search tree in this process until there are enough branches to share out."""
+    frontier = [()]
+    while frontier and len(frontier) < target and len(frontier[0]) < len(_options):
+        expanded = []
+        for choices in frontier:
+            expanded += [branch[0] for branch in _branches(*_start(choices))]
+        frontier = expanded
+    return frontier
+
+
+def factorial_typology(dataset, workers=None):
+    """
+    Finds every language the constraints of a dataset can generate under some ranking.
+
+    The winners chosen in the dataset are ignored, only the candidates and their violations count.
+
+    Args:
+        dataset (dataset.Dataset): The tableaux to build languages from.
+        workers (int): The number of worker processes. Defaults to the number of CPUs.
+                       With 1 worker everything runs in this process.
+
+    Returns:
+        list of Language: Every distinct language, with the tableaux in the dataset's order.
+    """
+    tableaux = list(dataset)
+    width = len(dataset.constraints)
+    options = [winner_options(t.violations.to_dense()) for t in tableaux]
+    if any(not tableau_options for tableau_options in options):
+        return []
+
+    # Inputs whose options reduce to the same ERC basis (see entailment.py) always come out
+    # the same way, so the search only sees one of each
+    groups = {}
+    for i, tableau_options in enumerate(options):
+        key = tuple(tuple(sorted(reduce_masks(masks(erc), width))) for _, erc in tableau_options)
+        groups.setdefault(key, []).append(i)
+    # Inputs with fewer options go first, which keeps the top of the tree narrow.
+    # Inputs with only one possible outcome are just a fixed set of ERC rows
+    keys = sorted(groups, key=len)
+    ordered = [[list(rows) for rows in key] for key in keys]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    # Pairs of options that clash are found up front, so most dead ends are spotted without running RCD
+    _init(ordered, width)
+    if workers <= 1:
+        _init(ordered, width, [compatibility(i) for i in range(len(ordered))])
+        found = _explore(())
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init, initargs=(ordered, width)) as executor:
+            compatible = list(executor.map(compatibility, range(len(ordered))))
+        _init(ordered, width, compatible)
+        frontier = _frontier(workers * 8)
+        found = []
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init,
+                                 initargs=(ordered, width, compatible)) as executor:
+            for branch in executor.map(_explore, frontier):
+                found += branch
+
+    languages = []
+    for choices, strata in sorted(found):
+        winners = [None] * len(tableaux)
+        rows = set()
+        for key, choice in zip(keys, choices):
+            rows.update(key[choice])
+            for position in groups[key]:
+                winners[position] = tuple(tableaux[position].candidates[r] for r in options[position][choice][0])
+        # The ranking the search ended on already satisfies every row, so it is used as is
+        ranking = [[dataset.constraints[j] for j in range(width) if stratum >> j & 1] for stratum in strata]
+        languages.append(Language(tuple(winners), from_masks(sorted(reduce_masks(rows, width)), width), ranking))
+    return languages
@@ -0,0 +1,61 @@
+# workers.py
+# Scores tableaux for the GUI off the Qt main thread.
+# A job covers some rows and some constraints of a tableau. It is split into chunks of rows
+# and each finished chunk is sent back to the main thread straight away, so the table fills
+# in while the rest is still being worked on. Jobs check a flag between chunks so they can
+# be cancelled as soon as the input or the constraints change.
+
+import time
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+import constraints
+
+# Rows scored per chunk. Small enough that results show up quickly and a cancelled job stops
+# soon, big enough that the signal overhead doesn't matter.
+chunk_rows = 100
+
+
+class WorkerSignals(QObject):
+    """Signals of an EvaluationWorker. QRunnable isn't a QObject, so it can't have its own."""
+    chunkReady = pyqtSignal(int, int, object)  # job id, first row, violation matrix of the chunk
+    finished = pyqtSignal(int)                 # job id
+    failed = pyqtSignal(int, str)              # job id, error message
+
+
+class EvaluationWorker(QRunnable):
+    """
+    Scores rows of a tableau against some constraints on a QThreadPool thread.
+    'pause' is how long to step aside after each chunk, 0 when run on the main thread.
+    """
+
+    def __init__(self, jobId, inputWord, outputWords, constraintNames, pause=0.001):
+        super().__init__()
+        self.pause = pause
+        self.jobId = jobId
+        self.inputWord = inputWord
+        self.outputWords = outputWords
+        self.constraintNames = list(constraintNames)
+        self.cancelled = False
+        self.signals = WorkerSignals()
+
+    def cancel(self):
+        """Asks the worker to stop after the chunk it is on."""
+        self.cancelled = True
+
+    def run(self):
+        try:
+            for start in range(0, len(self.outputWords), chunk_rows):
+                if self.cancelled:
+                    return
+                chunk = constraints.evaluate_tableau(self.inputWord, self.outputWords[start:start + chunk_rows],
+                                                     self.constraintNames)
+                self.signals.chunkReady.emit(self.jobId, start, chunk)
+                # Scoring is plain Python and holds the GIL, so step aside for a moment after each
+                # chunk to let the main thread repaint and handle input
+                if self.pause:
+                    time.sleep(self.pause)
+        except Exception as e:
+            self.signals.failed.emit(self.jobId, str(e))
+        finally:
+            self.signals.finished.emit(self.jobId)